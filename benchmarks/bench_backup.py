@@ -0,0 +1,112 @@
+"""Online backup under concurrent writes, and the manifest it leaves behind.
+
+Usage: python -m benchmarks.bench_backup [--medicines 50000] [--legacy 30]
+
+Times create_backup() while a writer thread keeps committing. The first
+backup must then be the only manifest entry and must be marked verified.
+A second database starts with --legacy pre-manifest backup files, one per
+day. Its first backup must adopt them and prune them to the retention
+policy, and the manifest must list exactly the files left on disk. Runs
+against throwaway databases and exits non-zero on any mismatch.
+"""
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_backup_"))
+
+from database import backup, db_handler  # noqa: E402
+
+
+def seed(medicines):
+    db_handler.bulk_insert_medicines(
+        (f"Backup Med {i:06d}", f"B{i:06d}", "2024-01-01", "2027-01-01", 50, 9.5, 0) for i in range(medicines)
+    )
+
+
+def first_backup(medicines):
+    problems = []
+    seed(medicines)
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        while not stop.is_set():
+            with db_handler.transaction() as conn:
+                conn.execute("UPDATE medicines SET quantity = quantity + 1 WHERE id = ?",
+                             (1 + writes[0] % medicines,))
+            writes[0] += 1
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    try:
+        path = backup.create_backup()
+    finally:
+        stop.set()
+        thread.join()
+    print(f"Backup of {medicines:,} rows in {time.perf_counter() - start:.2f}s "
+          f"with {writes[0]:,} commits alongside ({os.path.getsize(path) / 1024:,.0f} KiB)")
+
+    entries = backup.load_manifest()
+    if [entry["file"] for entry in entries] != [os.path.basename(path)]:
+        problems.append(f"first backup left {len(entries)} manifest entries")
+    elif not entries[0]["verified"]:
+        problems.append("first backup passed its integrity check but is recorded as unverified")
+    return problems
+
+
+def legacy_adoption(count):
+    problems = []
+    folder = backup.backup_folder()
+    os.makedirs(folder, exist_ok=True)
+    today = datetime.datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    for days in range(1, count + 1):
+        stamp = today - datetime.timedelta(days=days)
+        shutil.copyfile(db_handler.DB_PATH, os.path.join(folder, f"{backup.BACKUP_PREFIX}{stamp:%Y%m%d_%H%M%S}.db"))
+
+    path = backup.create_backup()
+    entries = backup.load_manifest()
+    on_disk = sorted(name for name in os.listdir(folder) if name.startswith(backup.BACKUP_PREFIX))
+    listed = sorted(entry["file"] for entry in entries)
+    if on_disk != listed:
+        problems.append(f"manifest lists {len(listed)} files but {len(on_disk)} are on disk")
+    expected = len(backup.retained(entries))
+    if len(entries) != expected:
+        problems.append(f"{len(entries)} backups kept, retention allows {expected}")
+    newest = [entry for entry in entries if entry["file"] == os.path.basename(path)]
+    if not newest or not newest[0]["verified"] or newest[0].get("adopted"):
+        problems.append("new backup not recorded as a verified backup of its own")
+    print(f"Adopted {count} legacy backups, kept {len(entries)}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--medicines", type=int, default=50000)
+    parser.add_argument("--legacy", type=int, default=30, help="pre-manifest daily backups to adopt")
+    args = parser.parse_args(argv)
+
+    db_handler.set_database_path(os.path.join(tempfile.mkdtemp(prefix="meditrack_backup_"), "first.db"))
+    db_handler.create_table()
+    problems = first_backup(args.medicines)
+
+    db_handler.set_database_path(os.path.join(tempfile.mkdtemp(prefix="meditrack_backup_"), "legacy.db"))
+    db_handler.create_table()
+    problems += legacy_adoption(args.legacy)
+
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ Backups are recorded once, verified, and pruned to the retention policy")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
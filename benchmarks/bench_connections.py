@@ -0,0 +1,101 @@
+"""Per-call latency of db_handler functions: legacy connect-per-call vs pooled.
+
+Usage: python -m benchmarks.bench_connections [--rows 2000] [--calls 500]
+Runs against a throwaway database, never the real pharmacy.db.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_bench_"))
+
+from database import db_handler  # noqa: E402
+from database.normalize import to_minor  # noqa: E402
+
+
+def legacy_connection():
+    # The pre-pooling get_connection(): makedirs + connect on every call.
+    folder_path = db_handler.DATA_FOLDER
+    os.makedirs(folder_path, exist_ok=True)
+    return sqlite3.connect(os.path.join(folder_path, "pharmacy.db"))
+
+
+def legacy_fetch_all_medicines():
+    conn = legacy_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM medicines")
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_fetch_sales_by_invoice(invoice_id):
+    conn = legacy_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM sales WHERE invoice_id = ?", (invoice_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_insert_sale_record(sale):
+    medicine_id, name, qty, price, subtotal, date, invoice_id = sale
+    conn = legacy_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (medicine_id, name, qty, to_minor(price), to_minor(subtotal), date, invoice_id))
+    conn.commit()
+    conn.close()
+
+
+def time_per_call(func, args, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(*args)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def seed(rows):
+    with db_handler.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO medicines (name, batch_no, mfg_date, expiry_date, quantity, price, demand) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"Medicine {i}", f"B{i:05d}", "2024-01-01", "2027-01-01", 50, 950, 3) for i in range(rows)],
+        )
+        conn.executemany(
+            "INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(i, f"Medicine {i}", 1, 950, 950, "2025-01-01", f"INV-{i // 5}") for i in range(rows)],
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    db_handler.create_table()
+    seed(args.rows)
+    sale = (1, "Medicine 1", 1, 9.5, 9.5, "2025-01-02", "INV-BENCH")
+
+    cases = [
+        ("fetch_all_medicines", legacy_fetch_all_medicines, db_handler.fetch_all_medicines, ()),
+        ("fetch_sales_by_invoice", legacy_fetch_sales_by_invoice, db_handler.fetch_sales_by_invoice, ("INV-7",)),
+        ("insert_sale_record", legacy_insert_sale_record, db_handler.insert_sale_record, (sale,)),
+    ]
+
+    print(f"{'function':<26}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before_func, after_func, call_args in cases:
+        before = time_per_call(before_func, call_args, args.calls)
+        after = time_per_call(after_func, call_args, args.calls)
+        print(f"{name:<26}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
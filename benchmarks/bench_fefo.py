@@ -0,0 +1,212 @@
+"""First-expiry-first-out batch allocation: correctness and cost.
+
+Usage: python -m benchmarks.bench_fefo [--products 2000] [--batches 20] [--deep 5000]
+       [--threads 8] [--sales 500]
+
+Seeds --products medicines with --batches batch rows each, plus one with
+--deep batches. About a sixth of all batches are already expired. Checks
+that fetch_fefo_allocation() and the inventory cache's sorted batch lists agree
+with a plain sort of the batches. Then it times the cache lookup against
+that sort, and allocation, reservation and a product-level checkout. Finally
+--threads threads sell random products by name at the same time. No
+expired batch may be sold, no stock may go negative, and each sale must
+drain earlier expiries first. Runs against a throwaway database and exits
+non-zero on any mismatch.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_fefo_"))
+
+from database import db_handler  # noqa: E402
+from database.db_handler import InsufficientStockError  # noqa: E402
+from database.inventory_cache import get_inventory_cache  # noqa: E402
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def _timed(times, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        times.append((time.perf_counter() - start) * 1000)
+
+
+def _report(name, times):
+    times.sort()
+    print(f"{name:<44}p50 {_percentile(times, 0.5):8.3f} ms   p99 {_percentile(times, 0.99):8.3f} ms")
+
+
+def seed(products, batches, deep, rng):
+    today = datetime.date.today()
+    rows = []
+    for p in range(products + 1):
+        for b in range(deep if p == products else batches):
+            expiry = today + datetime.timedelta(days=rng.randint(-120, 600))
+            rows.append((f"Fefo Med {p:05d}", f"B{p:05d}-{b:04d}", "2024-01-01", expiry.isoformat(),
+                         rng.randint(0, 40), round(rng.uniform(5, 50), 2), "0"))
+    db_handler.bulk_insert_medicines(rows)
+    return [f"Fefo Med {p:05d}" for p in range(products)], f"Fefo Med {products:05d}"
+
+
+def reference_batches(name, today):
+    rows = db_handler.read_connection().execute(
+        "SELECT id, expiry_date, quantity FROM medicines WHERE name = ? AND expiry_date >= ? AND quantity > 0",
+        (name, today)
+    ).fetchall()
+    return [row[0] for row in sorted(rows, key=lambda row: (row[1], row[0]))], {row[0]: row[2] for row in rows}
+
+
+def check_allocations(names, rng, today):
+    problems = []
+    cache = get_inventory_cache()
+    for name in rng.sample(names, min(200, len(names))):
+        order, stock = reference_batches(name, today)
+        if [row[0] for row in cache.fefo_batches(name)] != order:
+            problems.append(f"cache order for {name} differs from the sorted batches")
+        total = sum(stock.values())
+        qty = rng.randint(1, max(1, total))
+        try:
+            lines = db_handler.fetch_fefo_allocation(name, qty)
+        except InsufficientStockError:
+            if qty <= total:
+                problems.append(f"{name}: {qty} refused with {total} sellable")
+            continue
+        taken = [line[0] for line in lines]
+        if taken != order[:len(taken)] or sum(line[5] for line in lines) != qty:
+            problems.append(f"{name}: allocation {taken} is not the FEFO prefix of {order}")
+        elif any(line[5] != stock[line[0]] for line in lines[:-1]):
+            problems.append(f"{name}: an earlier batch was not drained before the next")
+    return problems
+
+
+def _sorted_batches(cache, name, today):
+    # What a lookup without the sorted lists costs: filter and sort every batch row.
+    return sorted((row for row in cache.by_name(name) if row[4] >= today and row[5] > 0),
+                  key=lambda row: (row[4], row[0]))[:1]
+
+
+def timings(names, deep_name, rng, today):
+    cache = get_inventory_cache()
+    cache.all_rows()
+    sample = rng.sample(names, min(500, len(names)))
+    for label, targets in ((f"{len(names):,} products", sample), ("the deep product", [deep_name] * 200)):
+        cached, scan = [], []
+        for name in targets:
+            _timed(cached, cache.fefo_batches, name, 1)
+            _timed(scan, _sorted_batches, cache, name, today)
+        _report(f"next batch, cache ({label})", cached)
+        _report(f"next batch, sort ({label})", scan)
+
+    preview, reserve, sale = [], [], []
+    for name in sample:
+        try:
+            _timed(preview, db_handler.fetch_fefo_allocation, name, 5)
+            _timed(reserve, db_handler.reserve_product, f"bench-{name}", name, 5)
+            db_handler.release_stock(f"bench-{name}")
+            _timed(sale, db_handler.commit_sale, [{"name": name, "qty": 5}], 1e9, prefix="FEFO-")
+        except InsufficientStockError:
+            pass
+    _report("fetch_fefo_allocation", preview)
+    _report("reserve_product", reserve)
+    _report("commit_sale by product", sale)
+
+
+def concurrent_sales(names, threads, sales, today):
+    conn = db_handler.read_connection()
+    start_stock = conn.execute("SELECT SUM(quantity) FROM medicines").fetchone()[0]
+    start_sold = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM sales").fetchone()[0]
+    hot = names[:max(1, len(names) // 50)]   # a few products every thread competes for
+    counts = {"sold": 0, "refused": 0}
+    lock = threading.Lock()
+
+    def worker(number):
+        rng = random.Random(number)
+        for _ in range(sales):
+            cart = [{"name": rng.choice(hot), "qty": rng.randint(1, 30)}]
+            try:
+                db_handler.commit_sale(cart, 1e9, prefix=f"FEFO-T{number}-")
+                outcome = "sold"
+            except InsufficientStockError:
+                outcome = "refused"
+            with lock:
+                counts[outcome] += 1
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"Concurrent: {counts['sold']:,} product sales, {counts['refused']:,} refused "
+          f"in {elapsed:.2f}s ({threads * sales / elapsed:,.0f}/s)")
+
+    problems = []
+    if conn.execute("SELECT COUNT(*) FROM medicines WHERE quantity < 0").fetchone()[0]:
+        problems.append("negative stock")
+    expired = conn.execute('''
+        SELECT COUNT(*) FROM sales s JOIN medicines m ON m.id = s.medicine_id WHERE m.expiry_date < ?
+    ''', (today,)).fetchone()[0]
+    if expired:
+        problems.append(f"{expired} sale lines drew from expired batches")
+    stock = conn.execute("SELECT SUM(quantity) FROM medicines").fetchone()[0]
+    sold = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM sales").fetchone()[0]
+    if stock + sold != start_stock + start_sold:
+        problems.append(f"stock {stock} + sold {sold} != {start_stock + start_sold}")
+    # Within a product, a later-expiring batch may only have been sold from once
+    # every earlier unexpired batch is empty.
+    skipped = conn.execute('''
+        SELECT COUNT(*) FROM medicines early
+        WHERE early.quantity > 0 AND early.expiry_date >= :today
+          AND EXISTS (
+              SELECT 1 FROM sales s JOIN medicines late ON late.id = s.medicine_id
+              WHERE late.name = early.name
+                AND (late.expiry_date, late.id) > (early.expiry_date, early.id)
+          )
+    ''', {"today": today}).fetchone()[0]
+    if skipped:
+        problems.append(f"{skipped} batches were passed over for later expiries")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--deep", type=int, default=5000, help="batches of the one deep product")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sales", type=int, default=500, help="product sales per thread")
+    args = parser.parse_args(argv)
+
+    db_handler.set_database_path(os.path.join(tempfile.mkdtemp(prefix="meditrack_fefo_"), "fefo.db"))
+    db_handler.create_table()
+    rng = random.Random(0)
+    today = datetime.date.today().isoformat()
+    names, deep_name = seed(args.products, args.batches, args.deep, rng)
+    print(f"Seeded {args.products:,} products x {args.batches} batches and one with {args.deep:,}")
+
+    problems = check_allocations(names + [deep_name], rng, today)
+    timings(names, deep_name, rng, today)
+    problems += concurrent_sales(names, args.threads, args.sales, today)
+    problems += check_allocations(names, rng, today)
+
+    if problems:
+        for problem in problems[:20]:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ Every allocation drew the earliest unexpired batches first")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
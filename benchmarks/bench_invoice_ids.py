@@ -0,0 +1,120 @@
+"""Invoice number allocation under concurrency.
+
+Usage: python -m benchmarks.bench_invoice_ids [--threads 8] [--processes 4] [--count 2000]
+
+Allocates --count numbers per worker from threads sharing this process's
+writer, from separate processes on the same file, and through full
+checkouts, then checks the numbers for duplicates and gaps. Also times
+offline (ULID) ids. Runs against a throwaway database; exits non-zero if
+any number was handed out twice.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_invoices_"))
+
+from database import db_handler  # noqa: E402
+from utils.ulid import new_ulid  # noqa: E402
+
+TILLS = 4   # workers share these prefixes, so each sequence sees contention
+
+
+def _prefix(worker):
+    return db_handler.invoice_prefix("S1", f"T{worker % TILLS}")
+
+
+def _run_threads(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=target, args=(n, results)) for n in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [ids for worker in results for ids in worker], time.perf_counter() - start
+
+
+def _allocate_in_process(args):
+    path, worker, count = args
+    db_handler.set_database_path(path)
+    return [db_handler.allocate_invoice_id(_prefix(worker)) for _ in range(count)]
+
+
+def check(name, ids, elapsed, contiguous=True):
+    duplicates = len(ids) - len(set(ids))
+    gaps = 0
+    if contiguous:
+        by_prefix = {}
+        for invoice_id in ids:
+            prefix, _, number = invoice_id.rpartition("-")
+            by_prefix.setdefault(prefix, []).append(int(number))
+        gaps = sum(max(numbers) - len(numbers) for numbers in by_prefix.values())
+    print(f"{name:<28}{len(ids):>8,} ids {len(ids) / elapsed:>10,.0f}/s   "
+          f"duplicates {duplicates}   gaps {gaps}")
+    return duplicates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--count", type=int, default=2000, help="allocations per worker")
+    args = parser.parse_args(argv)
+    duplicates = 0
+
+    path = os.path.join(tempfile.mkdtemp(prefix="meditrack_invoices_"), "threads.db")
+    db_handler.set_database_path(path)
+    db_handler.create_table()
+
+    def allocate(worker, results):
+        results[worker] = [db_handler.allocate_invoice_id(_prefix(worker)) for _ in range(args.count)]
+
+    ids, elapsed = _run_threads(args.threads, allocate)
+    duplicates += check(f"threads x{args.threads}", ids, elapsed)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="meditrack_invoices_"), "processes.db")
+    db_handler.set_database_path(path)
+    db_handler.create_table()
+    db_handler._manager.close_all()
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        batches = pool.map(_allocate_in_process, [(path, n, args.count) for n in range(args.processes)])
+    ids = [invoice_id for batch in batches for invoice_id in batch]
+    duplicates += check(f"processes x{args.processes}", ids, time.perf_counter() - start)
+
+    db_handler.set_database_path(path)
+    db_handler.bulk_insert_medicines([("Bench Med", "B1", "2024-01-01", "2030-01-01", 10_000_000, 1.0, "0")])
+    med_id = db_handler.fetch_all_medicines()[0][0]
+    cart = [{"id": med_id, "name": "Bench Med", "price": 1.0, "qty": 1, "subtotal": 1.0}]
+
+    def checkout(worker, results):
+        prefix = f"INV-CHK{worker % TILLS}-"
+        results[worker] = [db_handler.commit_sale(cart, 1.0, prefix=prefix)[1] for _ in range(args.count // 4)]
+
+    ids, elapsed = _run_threads(args.threads, checkout)
+    duplicates += check(f"checkouts x{args.threads}", ids, elapsed)
+
+    def offline(worker, results):
+        ids = [new_ulid() for _ in range(args.count * 10)]
+        results[worker] = ids if ids == sorted(ids) and len(set(ids)) == len(ids) else []
+
+    ids, elapsed = _run_threads(args.threads, offline)
+    duplicates += check(f"offline ulid x{args.threads}", ids, elapsed, contiguous=False)
+    if len(ids) != args.threads * args.count * 10:
+        print("❌ offline ids were not strictly increasing within a thread")
+        return 1
+
+    if duplicates:
+        print(f"❌ {duplicates} duplicate invoice numbers")
+        return 1
+    print("✅ No invoice number was handed out twice")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
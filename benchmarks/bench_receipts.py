@@ -0,0 +1,129 @@
+"""Receipt journal and spooler throughput.
+
+Usage: python -m benchmarks.bench_receipts [--receipts 20000] [--files 2000]
+
+Compares what the cashier waits for per sale: the old synchronous
+receipt_<timestamp>.txt write against ReceiptSpooler.submit(). Then times
+how fast the spooler drains into the journal, reprint lookups by invoice
+with the whole journal present, and the legacy file import. The spooler
+prints to a file-backed fake ESC/POS printer, whose output must hold
+exactly one job (reset ... cut) per receipt. Runs against a throwaway
+database; exits non-zero if a receipt is missing or misprinted.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_receipts_"))
+
+from database import db_handler  # noqa: E402
+from utils.receipts import (  # noqa: E402
+    ESC_INIT, GS_CUT, EscPosPrinter, ReceiptSpooler, import_legacy_receipts, render_receipt,
+)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def _receipt(n):
+    items = [(f"Bench Med {n % 97:02d}", 1 + n % 3, 12.5), ("Paracetamol 500mg", 2, 3.0)]
+    total = sum(qty * price for _, qty, price in items)
+    return f"BENCH-{n:07d}", render_receipt(items, total, 100.0, 100.0 - total, f"BENCH-{n:07d}"), total
+
+
+def _report(name, times):
+    times.sort()
+    print(f"{name:<30}p50 {_percentile(times, 0.5):8.3f} ms   p99 {_percentile(times, 0.99):8.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--receipts", type=int, default=20000)
+    parser.add_argument("--files", type=int, default=2000, help="receipts for the file-write and import runs")
+    args = parser.parse_args(argv)
+    problems = []
+
+    folder = tempfile.mkdtemp(prefix="meditrack_receipts_")
+    db_handler.set_database_path(os.path.join(folder, "receipts.db"))
+    db_handler.create_table()
+
+    render = []
+    receipts = []
+    for n in range(args.receipts):
+        start = time.perf_counter()
+        receipts.append(_receipt(n))
+        render.append((time.perf_counter() - start) * 1000)
+    _report("render", render)
+
+    legacy = os.path.join(folder, "legacy")
+    os.makedirs(legacy)
+    writes = []
+    for n, (invoice_id, text, _) in enumerate(receipts[:args.files]):
+        start = time.perf_counter()
+        with open(os.path.join(legacy, f"receipt_{n:08d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        writes.append((time.perf_counter() - start) * 1000)
+    _report("file write (old checkout)", writes)
+
+    printer_path = os.path.join(folder, "printer.bin")
+    spooler = ReceiptSpooler(EscPosPrinter(printer_path))
+    submits = []
+    start = time.perf_counter()
+    for invoice_id, text, total in receipts:
+        began = time.perf_counter()
+        spooler.submit(invoice_id, text, total)
+        submits.append((time.perf_counter() - began) * 1000)
+    if not spooler.flush(timeout=120):
+        problems.append("spooler did not drain within 120 s")
+    drained = time.perf_counter() - start
+    _report("spooler submit (checkout)", submits)
+    print(f"{'journal + print':<30}{args.receipts:,} receipts in {drained:.2f}s "
+          f"({args.receipts / drained:,.0f}/s)")
+
+    with open(printer_path, "rb") as f:
+        output = f.read()
+    if output.count(ESC_INIT) != args.receipts or output.count(GS_CUT) != args.receipts:
+        problems.append(f"printer got {output.count(ESC_INIT)} jobs and {output.count(GS_CUT)} cuts "
+                        f"for {args.receipts} receipts")
+
+    rng = random.Random(0)
+    lookups = []
+    for invoice_id, text, _ in rng.sample(receipts, min(1000, len(receipts))):
+        began = time.perf_counter()
+        found = db_handler.fetch_receipt(invoice_id)
+        lookups.append((time.perf_counter() - began) * 1000)
+        if found != text:
+            problems.append(f"receipt {invoice_id} did not round-trip")
+            break
+    _report(f"reprint of 1 in {args.receipts:,}", lookups)
+
+    # Most of the journal is still in the WAL; fold it in, and count whatever a reader kept there.
+    db_handler.read_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    wal = db_handler.DB_PATH + "-wal"
+    size = os.path.getsize(db_handler.DB_PATH) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+    raw = sum(len(text.encode("utf-8")) for _, text, _ in receipts)
+    print(f"{'journal size':<30}{size / 1024:,.0f} KiB for {raw / 1024:,.0f} KiB of receipt text")
+
+    db_handler.set_database_path(os.path.join(folder, "import.db"))
+    db_handler.create_table()
+    start = time.perf_counter()
+    imported = import_legacy_receipts(legacy)
+    elapsed = time.perf_counter() - start
+    print(f"{'legacy import':<30}{imported:,} files in {elapsed:.2f}s")
+    if imported != args.files:
+        problems.append(f"imported {imported} of {args.files} legacy files")
+
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ Every receipt was journaled, printed once and found again")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Medicine search latency: LIKE '%q%' table scan vs the FTS5 index.
+
+Usage: python -m benchmarks.bench_search [--sizes 10000,100000,1000000]
+Each size gets its own throwaway database.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_bench_"))
+
+from database import db_handler  # noqa: E402
+
+STEMS = ["Panadol", "Amoxil", "Augmentin", "Brufen", "Disprin", "Flagyl", "Lipitor", "Nexium",
+         "Ventolin", "Zyrtec", "Arinac", "Calpol", "Softin", "Risek", "Ponstan", "Gravinate"]
+FORMS = ["Tablet", "Syrup", "Capsule", "Injection", "Drops", "Cream"]
+QUERIES = ["panadol", "syr", "amox", "B00123", "zyrtec drops", "nothing-matches"]
+
+
+def seed(rows):
+    rng = random.Random(rows)
+    data = (
+        (f"{rng.choice(STEMS)} {rng.choice(FORMS)} {rng.randint(1, 999)}mg", f"B{i:07d}",
+         "2024-01-01", "2027-01-01", rng.randint(0, 500), round(rng.uniform(5, 900), 2), "1")
+        for i in range(rows)
+    )
+    db_handler.bulk_insert_medicines(data)
+
+
+def like_search(query):
+    wildcard = f"%{query.lower()}%"
+    return db_handler.read_connection().execute(
+        "SELECT * FROM medicines WHERE LOWER(name) LIKE ? OR LOWER(batch_no) LIKE ? LIMIT ?",
+        (wildcard, wildcard, db_handler.SEARCH_LIMIT),
+    ).fetchall()
+
+
+def time_ms(func, query, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(query)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    base = tempfile.mkdtemp(prefix="meditrack_search_")
+    for size in (int(s) for s in args.sizes.split(",")):
+        db_handler.set_database_path(os.path.join(base, f"search_{size}.db"))
+        db_handler.create_table()
+        start = time.perf_counter()
+        seed(size)
+        print(f"\n{size:,} rows (seeded in {time.perf_counter() - start:.1f}s, "
+              f"tokenizer: {db_handler._search_tokenizer() or 'none'})")
+        print(f"  {'query':<18}{'LIKE (ms)':>12}{'FTS5 (ms)':>12}{'hits':>8}")
+        for query in QUERIES:
+            like_ms = time_ms(like_search, query, args.repeat)
+            fts_ms = time_ms(db_handler.search_medicine, query, args.repeat)
+            hits = len(db_handler.search_medicine(query))
+            print(f"  {query:<18}{like_ms:>12.2f}{fts_ms:>12.2f}{hits:>8}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
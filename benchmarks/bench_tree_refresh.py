@@ -0,0 +1,115 @@
+"""Tcl calls per grid refresh: delete-all/re-insert vs TreeReconciler.
+
+Usage: python -m benchmarks.bench_tree_refresh [--rows 5000]
+Headless: the Treeview is replaced by a recorder that counts the widget
+calls (each one a Tcl round trip in the real app) and keeps the item order
+so the final state can be checked against the expected one.
+"""
+import argparse
+import random
+import sys
+
+from gui.tree_sync import TreeReconciler
+
+
+class RecordingTree:
+    def __init__(self):
+        self.calls = 0
+        self.children = []
+
+    def get_children(self):
+        self.calls += 1
+        return tuple(self.children)
+
+    def delete(self, *iids):
+        self.calls += 1
+        gone = set(iids)
+        self.children = [iid for iid in self.children if iid not in gone]
+
+    def detach(self, iid):
+        self.calls += 1
+        self.children.remove(iid)
+
+    def insert(self, parent, index, iid, values=(), tags=()):
+        self.calls += 1
+        if index == "end" or index >= len(self.children):
+            self.children.append(iid)
+        else:
+            self.children.insert(index, iid)
+
+    def move(self, iid, parent, index):
+        self.calls += 1
+        if iid in self.children:
+            self.children.remove(iid)
+        if index >= len(self.children):
+            self.children.append(iid)
+        else:
+            self.children.insert(index, iid)
+
+    def index(self, iid):
+        self.calls += 1
+        return self.children.index(iid)
+
+    def item(self, iid, **kwargs):
+        self.calls += 1
+
+
+def rebuild(tree, items):
+    # What events.load_data() used to do on every refresh.
+    tree.delete(*tree.get_children())
+    for iid, values, tags in items:
+        tree.insert('', 'end', iid=str(iid), values=values, tags=tags)
+
+
+def scenarios(rows, rng):
+    base = [(i, (f"Medicine {i}", f"B{i}", 100 + i % 50), ()) for i in range(rows)]
+
+    one_changed = list(base)
+    one_changed[rows // 2] = (rows // 2, (f"Medicine {rows // 2}", "B", 1), ("low_stock",))
+
+    deleted = [item for item in base if rng.random() > 0.01]
+    added = base + [(rows + i, (f"New {i}", "N", 5), ()) for i in range(10)]
+    reversed_sort = base[::-1]
+    one_moved = base[1:rows // 2] + base[:1] + base[rows // 2:]
+
+    return base, [
+        ("unchanged refresh", base),
+        ("one row changed", one_changed),
+        ("1% rows deleted", deleted),
+        ("10 rows added", added),
+        ("one row moved", one_moved),
+        ("sort reversed", reversed_sort),
+    ]
+
+
+def measure(apply, base, items):
+    tree = RecordingTree()
+    apply(tree, base)
+    tree.calls = 0
+    apply(tree, items)
+    assert tree.children == [str(iid) for iid, _, _ in items]
+    return tree.calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    base, cases = scenarios(args.rows, random.Random(7))
+    print(f"{args.rows:,} rows")
+    print(f"{'scenario':<20}{'rebuild calls':>15}{'reconcile calls':>17}")
+    for name, items in cases:
+        rebuild_calls = measure(rebuild, base, items)
+        reconcilers = {}
+
+        def reconcile(tree, rows):
+            reconciler = reconcilers.setdefault(id(tree), TreeReconciler(tree))
+            reconciler.reconcile(rows)
+
+        reconcile_calls = measure(reconcile, base, items)
+        print(f"{name:<20}{rebuild_calls:>15,}{reconcile_calls:>17,}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Verify that the report and lookup queries are answered from indexes.
+
+Usage: python -m benchmarks.check_query_plans
+Captures the SQL each db_handler function issues, runs EXPLAIN QUERY PLAN
+on it and exits non-zero if any of them full-scans sales, returns,
+medicines, the sales_daily rollup or stock_reservations. Runs against a
+throwaway database.
+"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_plans_"))
+
+from database import db_handler  # noqa: E402
+
+CHECKED_TABLES = ("sales", "returns", "medicines", "sales_daily", "stock_reservations", "receipts")
+
+CASES = [
+    ("fetch_sales_by_date_range", lambda: db_handler.fetch_sales_by_date_range("2025-01-01", "2025-01-31")),
+    ("fetch_sales_by_invoice", lambda: db_handler.fetch_sales_by_invoice("INV-1")),
+    ("fetch_returns_by_invoice", lambda: db_handler.fetch_returns_by_invoice("INV-1")),
+    ("fetch_total_returned_by_invoice_and_medicine",
+     lambda: db_handler.fetch_total_returned_by_invoice_and_medicine("INV-1", 1)),
+    ("fetch_returnable_lines", lambda: db_handler.fetch_returnable_lines("INV-1")),
+    ("fetch_sales_report_page (first)",
+     lambda: db_handler.fetch_sales_report_page("2025-01-01", "2025-01-31")),
+    ("fetch_sales_report_page (keyset)",
+     lambda: db_handler.fetch_sales_report_page("2025-01-01", "2025-01-31", after=("2025-01-20", 100))),
+    ("fetch_sales_report_totals",
+     lambda: db_handler.fetch_sales_report_totals("2025-01-01", "2025-01-31")),
+    ("fetch_daily_sales_totals",
+     lambda: db_handler.fetch_daily_sales_totals("2025-01-01", "2025-01-31")),
+    ("fetch_top_sellers",
+     lambda: db_handler.fetch_top_sellers("2025-01-01", "2025-01-31")),
+    ("fetch_sales_with_remaining_qty (date)",
+     lambda: db_handler.fetch_sales_with_remaining_qty("2025-01-01", "2025-01-31")),
+    ("fetch_sales_with_remaining_qty (invoice)",
+     lambda: db_handler.fetch_sales_with_remaining_qty(None, invoice_id="INV-1")),
+    ("count_medicines (expired)", lambda: db_handler.count_medicines({"status": "❌"})),
+    ("fetch_inventory_alert_counts (quantity range)",
+     lambda: db_handler.fetch_inventory_alert_counts(10, {"min_quantity": 5, "max_quantity": 20})),
+    ("fetch_medicines_page (near expiry)",
+     lambda: db_handler.fetch_medicines_page("Expiry Date", filters={"status": "⚠️"})),
+    ("fetch_available_quantities", lambda: db_handler.fetch_available_quantities([1, 2, 3])),
+    # qty 0 so the empty database does not raise InsufficientStockError; the SQL is the same.
+    ("fetch_fefo_allocation", lambda: db_handler.fetch_fefo_allocation("Paracetamol", 0)),
+    ("fetch_receipt", lambda: db_handler.fetch_receipt("INV-1")),
+    ("fetch_receipts_between", lambda: db_handler.fetch_receipts_between("2025-01-01", "2025-01-31 99")),
+    ("fetch_medicines_filtered (expired by quantity)",
+     lambda: db_handler.fetch_medicines_filtered({"status": "❌"}, "Quantity")),
+]
+
+
+def capture_sql(func):
+    statements = []
+    conn = db_handler.read_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        func()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+
+def full_scans(plan):
+    return [
+        detail for detail in plan
+        if detail.startswith("SCAN ")
+        and detail.split()[1] in CHECKED_TABLES + tuple(t[0] for t in CHECKED_TABLES)
+        and "USING" not in detail
+    ]
+
+
+def main():
+    db_handler.create_table()
+    failures = 0
+    for name, func in CASES:
+        for sql in capture_sql(func):
+            plan = db_handler.explain_query_plan(sql)
+            scans = full_scans(plan)
+            print(f"{'FAIL' if scans else 'ok  '} {name}")
+            for detail in plan:
+                print(f"       {detail}")
+            failures += bool(scans)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Build a synthetic pharmacy database of configurable size.
+
+Usage: python -m benchmarks.generate_data out.db [--medicines 100000]
+       [--sale-lines 5000000] [--return-rate 0.05] [--days 1095] [--seed 1]
+
+The same arguments always produce the same database. Distributions are
+meant to look like a busy pharmacy rather than uniform noise:
+  - medicine batches: a few thousand products, several batches each; expiry
+    mostly 6-36 months out, ~5% expired, ~5% near expiry, a few unknown
+  - stock: long-tailed, with ~10% of batches under the low-stock threshold
+  - invoices: weekday-heavy daily volume, 1-6 lines each, products picked
+    with Zipf-like popularity
+  - returns: `return-rate` of sale lines, partially or fully returned
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_gen_"))
+
+from database import db_handler  # noqa: E402
+from database.migrations import SALES_DAILY_TRIGGERS, rebuild_sales_daily  # noqa: E402
+
+STEMS = ["Panadol", "Amoxil", "Augmentin", "Brufen", "Disprin", "Flagyl", "Lipitor", "Nexium",
+         "Ventolin", "Zyrtec", "Arinac", "Calpol", "Softin", "Risek", "Ponstan", "Gravinate",
+         "Glucophage", "Concor", "Losartan", "Omeprazole", "Cefspan", "Ciproxin", "Xanax", "Leflox"]
+FORMS = ["Tablet", "Syrup", "Capsule", "Injection", "Drops", "Cream", "Sachet", "Inhaler"]
+STRENGTHS = [5, 10, 20, 25, 50, 100, 125, 250, 400, 500, 625, 1000]
+BATCHES_PER_PRODUCT = 4
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 0.7]  # Monday .. Sunday
+CHUNK = 50_000
+
+
+def _products(count, rng):
+    products = set()
+    while len(products) < count:
+        products.add(f"{rng.choice(STEMS)} {rng.choice(FORMS)} {rng.choice(STRENGTHS)}mg")
+        if len(products) >= len(STEMS) * len(FORMS) * len(STRENGTHS):
+            break
+    products = sorted(products)
+    rng.shuffle(products)
+    return products
+
+
+def _expiry(rng, end_date):
+    roll = rng.random()
+    if roll < 0.005:
+        return None                           # unknown; the typed schema rejects malformed dates
+    if roll < 0.055:
+        offset = -rng.randint(1, 400)         # expired
+    elif roll < 0.105:
+        offset = rng.randint(0, 30)           # near expiry
+    else:
+        offset = rng.randint(180, 1100)
+    return (end_date + datetime.timedelta(days=offset)).isoformat()
+
+
+def medicine_rows(count, rng, end_date):
+    products = _products(max(1, count // BATCHES_PER_PRODUCT), rng)
+    for i in range(count):
+        name = products[i % len(products)]
+        expiry = _expiry(rng, end_date)
+        mfg = (end_date - datetime.timedelta(days=rng.randint(30, 700))).isoformat()
+        quantity = rng.randint(0, 9) if rng.random() < 0.1 else int(rng.paretovariate(1.2) * 20)
+        yield (name, f"B{i:07d}", mfg, expiry, min(quantity, 5000),
+               round(rng.uniform(5, 2500), 2), str(rng.randint(0, 3)))
+
+
+def _popularity(count):
+    # Cumulative Zipf-like weights over medicine ids 1..count.
+    total, cumulative = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** 0.9
+        cumulative.append(total)
+    return cumulative
+
+
+def sale_lines(count, medicines, prices, names, rng, end_date, days):
+    start = end_date - datetime.timedelta(days=days - 1)
+    dates = [start + datetime.timedelta(days=n) for n in range(days)]
+    day_weights = [WEEKDAY_WEIGHTS[d.weekday()] for d in dates]
+    ids = list(range(1, medicines + 1))
+    rng.shuffle(ids)                     # popularity independent of insertion order
+    cumulative = _popularity(medicines)
+
+    # Spread the requested line count over the days, then invoices over each day.
+    total_weight = sum(day_weights)
+    lines_on = [int(count * weight / total_weight) for weight in day_weights]
+    for n in rng.sample(range(days), count - sum(lines_on)):
+        lines_on[n] += 1
+
+    invoice = 0
+    for n, date in enumerate(dates):
+        date_str = date.isoformat()
+        remaining = lines_on[n]
+        while remaining > 0:
+            invoice += 1
+            size = min(remaining, 1 + min(5, int(rng.expovariate(0.7))))
+            remaining -= size
+            invoice_id = f"INV-{date:%Y%m%d}-{invoice:07d}"
+            picked = set()
+            for pick in rng.choices(ids, cum_weights=cumulative, k=size):
+                if pick in picked:
+                    continue
+                picked.add(pick)
+                qty = 1 + int(rng.expovariate(0.5))
+                price = prices[pick]
+                yield (pick, names[pick], qty, price, round(qty * price, 2), date_str, invoice_id)
+
+
+def _chunks(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(db_path, medicines=100_000, sale_lines_count=5_000_000, return_rate=0.05,
+             days=1095, seed=1, end_date=None, progress=print):
+    """Create db_path (which must not exist) and return a dict of row counts."""
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    end_date = end_date or datetime.date.today()
+    rng = random.Random(seed)
+    db_handler.set_database_path(db_path)
+    db_handler.create_table()
+
+    started = time.perf_counter()
+    db_handler.bulk_insert_medicines(medicine_rows(medicines, rng, end_date))
+    progress(f"  {medicines:,} medicine batches ({time.perf_counter() - started:.1f}s)")
+
+    conn = db_handler.read_connection()
+    prices, names = {}, {}   # prices in minor units, as stored, so subtotals and refunds stay integers
+    for med_id, name, price in conn.execute("SELECT id, name, price FROM medicines"):
+        prices[med_id], names[med_id] = price, name
+
+    started = time.perf_counter()
+    sales = returns = 0
+    with db_handler.transaction() as conn:
+        # The rollup is rebuilt once at the end instead of per inserted row.
+        for name in SALES_DAILY_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for chunk in _chunks(sale_lines(sale_lines_count, medicines, prices, names, rng, end_date, days)):
+            conn.executemany('''
+                INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+            returned = []
+            for med_id, name, qty, price, _, date_str, invoice_id in chunk:
+                if rng.random() < return_rate:
+                    back = qty if rng.random() < 0.6 else rng.randint(1, qty)
+                    when = datetime.date.fromisoformat(date_str) + datetime.timedelta(days=rng.randint(0, 30))
+                    returned.append((med_id, name, back, price, round(back * price, 2),
+                                     min(when, end_date).isoformat(), invoice_id))
+            conn.executemany('''
+                INSERT INTO returns (medicine_id, name, quantity, price, refund_amount, date, invoice_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', returned)
+            sales += len(chunk)
+            returns += len(returned)
+        progress(f"  {sales:,} sale lines, {returns:,} returns ({time.perf_counter() - started:.1f}s)")
+
+        started = time.perf_counter()
+        rollup = rebuild_sales_daily(conn)
+        for ddl in SALES_DAILY_TRIGGERS.values():
+            conn.execute(ddl)
+        conn.execute("ANALYZE")
+        progress(f"  {rollup:,} sales_daily rows ({time.perf_counter() - started:.1f}s)")
+
+    return {"medicines": medicines, "sales": sales, "returns": returns, "sales_daily": rollup,
+            "days": days, "end_date": end_date.isoformat(), "seed": seed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--medicines", type=int, default=100_000)
+    parser.add_argument("--sale-lines", type=int, default=5_000_000,
+                        help="target line count; repeat picks within an invoice are dropped, so ~0.5%% fewer")
+    parser.add_argument("--return-rate", type=float, default=0.05)
+    parser.add_argument("--days", type=int, default=1095, help="length of the sales history")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat,
+                        help="last day of history, YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.path}")
+    counts = generate(args.path, args.medicines, args.sale_lines, args.return_rate,
+                      args.days, args.seed, args.end_date)
+    print(f"✅ {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Drive database.service with many simulated tills and report throughput.
+
+Usage: python -m benchmarks.load_test [--tills 50] [--duration 20] [--read-workers 4]
+       [--medicines 2000] [--sale-lines 20000] [--listen 127.0.0.1:0] [--output results.json]
+
+A small database is generated, every batch is restocked so checkouts are
+not rejected for lack of stock, and the service is started as a separate
+process. Each till then loops over: search, checkout of 1-3 lines (with a
+share of them on a few hot products, so tills contend for the same rows),
+an occasional one-unit return, and an occasional report read. At the end
+the stock movement is checked against the recorded sales and returns, and
+every checkout must have its own invoice number.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_load_"))
+
+from benchmarks.generate_data import generate  # noqa: E402
+from database import db_handler  # noqa: E402
+from database.service import STREAM_LIMIT, encode, parse_address, unpack  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESTOCK = 1_000_000
+HOT_PRODUCTS = 20
+HOT_SHARE = 0.3          # cart lines that pick one of the hot products
+RETURN_EVERY = 10        # checkouts
+REPORT_EVERY = 20
+SEARCH_LIMIT = 20        # rows a till's type-ahead asks for
+
+
+class Till:
+    """One simulated counter: its own connection, one request at a time."""
+
+    def __init__(self, number, address, catalogue, words, deadline):
+        self.number = number
+        self.address = address
+        self.catalogue = catalogue
+        self.words = words
+        self.deadline = deadline
+        self.rng = random.Random(number)
+        self.ids = itertools.count(1)
+        self.latencies = {}     # op -> list of ms
+        self.rejected = 0
+        self.errors = 0
+
+    async def call(self, op, *args, **kwargs):
+        start = time.perf_counter()
+        self.writer.write(encode({"id": next(self.ids), "op": op, "args": args, "kwargs": kwargs}))
+        await self.writer.drain()
+        line = await self.reader.readline()
+        self.latencies.setdefault(op, []).append((time.perf_counter() - start) * 1000)
+        return unpack(json.loads(line))
+
+    def cart(self):
+        lines = {}
+        for _ in range(self.rng.randint(1, 3)):
+            pool = self.catalogue[:HOT_PRODUCTS] if self.rng.random() < HOT_SHARE else self.catalogue
+            med_id, name, price = self.rng.choice(pool)
+            qty = self.rng.randint(1, 2)
+            lines[med_id] = {"id": med_id, "name": name, "price": price, "qty": qty,
+                             "subtotal": round(qty * price, 2)}
+        return list(lines.values())
+
+    async def connect(self):
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            self.reader, self.writer = await asyncio.open_unix_connection(target, limit=STREAM_LIMIT)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(*target, limit=STREAM_LIMIT)
+
+    async def run(self):
+        await self.connect()
+        today = datetime.date.today().isoformat()
+        checkouts = 0
+        try:
+            while time.perf_counter() < self.deadline:
+                try:
+                    await self.call("search_medicine", self.rng.choice(self.words), SEARCH_LIMIT)
+                    cart = self.cart()
+                    total = round(sum(item["subtotal"] for item in cart), 2)
+                    try:
+                        _, invoice_id = await self.call("commit_sale", cart, total,
+                                                        prefix=f"LOAD-{self.number:03d}-")
+                    except db_handler.InsufficientStockError:
+                        self.rejected += 1
+                        continue
+                    checkouts += 1
+                    if checkouts % RETURN_EVERY == 0:
+                        line = cart[0]
+                        await self.call("commit_return", [{**line, "qty": 1, "invoice_id": invoice_id}])
+                    if checkouts % REPORT_EVERY == 0:
+                        await self.call("fetch_sales_report_totals", today, today)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"⚠️ till {self.number}: {e}", file=sys.stderr)
+        finally:
+            self.writer.close()
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarise(tills, elapsed):
+    merged = {}
+    for till in tills:
+        for op, times in till.latencies.items():
+            merged.setdefault(op, []).extend(times)
+    ops = {}
+    for op, times in sorted(merged.items()):
+        times.sort()
+        ops[op] = {"calls": len(times), "per_sec": round(len(times) / elapsed, 1),
+                   "p50_ms": round(_percentile(times, 0.5), 3), "p99_ms": round(_percentile(times, 0.99), 3),
+                   "max_ms": round(times[-1], 3)}
+    rejected = sum(till.rejected for till in tills)
+    sales = ops.get("commit_sale", {}).get("calls", 0)
+    return {
+        "checkouts": sales - rejected,
+        "checkouts_per_sec": round((sales - rejected) / elapsed, 1),
+        "checkout_p99_ms": ops.get("commit_sale", {}).get("p99_ms"),
+        "rejected": rejected,
+        "errors": sum(till.errors for till in tills),
+        "elapsed_s": round(elapsed, 2),
+        "ops": ops,
+    }
+
+
+def stock_snapshot():
+    conn = db_handler.read_connection()
+    return (conn.execute("SELECT SUM(quantity) FROM medicines").fetchone()[0],
+            conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM sales WHERE invoice_id LIKE 'LOAD-%'").fetchone()[0],
+            conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM returns WHERE invoice_id LIKE 'LOAD-%'").fetchone()[0])
+
+
+def start_service(path, listen, read_workers):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "database.service", "--listen", listen, "--db", path,
+         "--read-workers", str(read_workers), "--no-backup"],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    for line in process.stdout:
+        if "listening on" in line:
+            return process, line.split()[-1]
+    raise RuntimeError(f"service exited with code {process.wait()}")
+
+
+async def drive(address, tills_count, duration, catalogue, words):
+    deadline = time.perf_counter() + duration
+    tills = [Till(n, address, catalogue, words, deadline) for n in range(tills_count)]
+    started = time.perf_counter()
+    await asyncio.gather(*(till.run() for till in tills))
+    elapsed = time.perf_counter() - started
+    probe = Till(-1, address, catalogue, words, deadline)
+    await probe.connect()
+    stats = await probe.call("stats")
+    probe.writer.close()
+    return tills, elapsed, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tills", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--read-workers", type=int, default=4)
+    parser.add_argument("--medicines", type=int, default=2000)
+    parser.add_argument("--sale-lines", type=int, default=20_000)
+    parser.add_argument("--listen", default="127.0.0.1:0", help="service address; port 0 picks a free one")
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="meditrack_load_"), "load.db")
+    print(f"Generating {path}", file=sys.stderr)
+    generate(path, args.medicines, args.sale_lines, progress=lambda msg: print(msg, file=sys.stderr))
+    with db_handler.transaction() as conn:
+        conn.execute("UPDATE medicines SET quantity = ?", (RESTOCK,))
+        db_handler._manager.mark_changed()
+    conn = db_handler.read_connection()
+    catalogue = conn.execute("SELECT id, name, price / 100.0 FROM medicines ORDER BY id").fetchall()
+    words = sorted({name.split()[0].lower() for _, name, _ in catalogue})
+    before = stock_snapshot()
+
+    process, address = start_service(path, args.listen, args.read_workers)
+    try:
+        print(f"Running {args.tills} tills against {address} for {args.duration:g}s", file=sys.stderr)
+        tills, elapsed, stats = asyncio.run(drive(address, args.tills, args.duration, catalogue, words))
+    finally:
+        process.terminate()
+        process.wait()
+
+    results = summarise(tills, elapsed)
+    after = stock_snapshot()
+    sold, returned = after[1] - before[1], after[2] - before[2]
+    results["writes_per_commit"] = round(stats["writes"] / max(stats["groups"], 1), 2)
+    results["sweep_failures"] = stats["sweeper"]["failures"]
+    results["sweep_last_error"] = stats["sweeper"]["last_error"]
+    results["stock_consistent"] = after[0] == before[0] - sold + returned
+    invoices = db_handler.read_connection().execute(
+        "SELECT COUNT(DISTINCT invoice_id) FROM sales WHERE invoice_id LIKE 'LOAD-%'"
+    ).fetchone()[0]
+    results["invoices_unique"] = invoices == results["checkouts"]
+    results["meta"] = {"tills": args.tills, "read_workers": args.read_workers,
+                       "medicines": args.medicines, "sale_lines": args.sale_lines}
+
+    print(f"\n{'operation':<28}{'calls':>8}{'per sec':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for op, stats in results["ops"].items():
+        print(f"{op:<28}{stats['calls']:>8}{stats['per_sec']:>10.1f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.2f}")
+    print(f"\n✅ {results['checkouts']:,} checkouts, {results['checkouts_per_sec']:,.1f}/s, "
+          f"p99 {results['checkout_p99_ms']} ms ({results['rejected']} rejected, {results['errors']} errors, "
+          f"{results['writes_per_commit']} writes per commit)")
+    print("✅ Stock matches sales and returns" if results["stock_consistent"]
+          else "❌ Stock does not match sales and returns")
+    print("✅ Every checkout got its own invoice number" if results["invoices_unique"]
+          else "❌ Invoice numbers were shared between checkouts")
+    if results["sweep_failures"]:
+        print(f"⚠️ Reservation sweeper failed {results['sweep_failures']} times: {results['sweep_last_error']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if results["stock_consistent"] and results["invoices_unique"] and not results["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
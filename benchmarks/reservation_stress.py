@@ -0,0 +1,216 @@
+"""Concurrency stress test for stock reservations.
+
+Usage: python -m benchmarks.reservation_stress [--carts 200] [--medicines 20] [--stock 50]
+       [--duration 10] [--ttl 1.0] [--holds 500]
+
+Contention phase: --carts threads share a few scarce medicines. Each cart
+holds 1-3 lines, then checks out, releases or abandons them (abandoned holds
+expire after --ttl and are collected by the sweeper), while walk-in sales
+without a cart compete for the unheld stock. A monitor checks throughout
+that no medicine is ever held beyond its stock; afterwards stock, sales,
+holds and the stock_reserved counters must all agree.
+
+Scale phase: --holds live holds on distinct carts, then the cost of a
+reservation, an availability lookup and one bulk sweep with all of them
+present. Runs against a throwaway database; exits non-zero on a violation.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_reservations_"))
+
+from database import db_handler  # noqa: E402
+from database.db_handler import InsufficientStockError  # noqa: E402
+
+SWEEP_INTERVAL = 0.2
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def _timed(times, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        times.append((time.perf_counter() - start) * 1000)
+
+
+def seed(medicines, stock):
+    rows = [(f"Stress Med {n:03d}", f"S{n:05d}", "2024-01-01", "2030-01-01", stock, 10.0, "0")
+            for n in range(medicines)]
+    db_handler.bulk_insert_medicines(rows)
+    return [row[0] for row in db_handler.read_connection().execute("SELECT id FROM medicines ORDER BY id")]
+
+
+def violations():
+    conn = db_handler.read_connection()
+    problems = []
+    if conn.execute("SELECT COUNT(*) FROM medicines WHERE quantity < 0").fetchone()[0]:
+        problems.append("negative stock")
+    if conn.execute("SELECT COUNT(*) FROM stock_available WHERE available < 0").fetchone()[0]:
+        problems.append("more held than in stock")
+    drift = conn.execute('''
+        SELECT COUNT(*) FROM stock_reserved r
+        WHERE r.quantity != COALESCE((
+            SELECT SUM(h.quantity) FROM stock_reservations h WHERE h.medicine_id = r.medicine_id
+        ), 0)
+    ''').fetchone()[0]
+    if drift:
+        problems.append(f"stock_reserved out of step for {drift} medicines")
+    return problems
+
+
+def contention(args):
+    ids = seed(args.medicines, args.stock)
+    deadline = time.perf_counter() + args.duration
+    stats = {"reserve_ms": [], "sale_ms": [], "held": 0, "refused": 0, "sold": 0, "rejected": 0,
+             "released": 0, "abandoned": 0, "walk_in": 0}
+    lock = threading.Lock()
+    problems = []
+
+    def cart_worker(number):
+        rng = random.Random(number)
+        invoices = 0
+        while time.perf_counter() < deadline:
+            cart_id = f"stress-{number}-{invoices}"
+            cart = []
+            for med_id in rng.sample(ids, rng.randint(1, 3)):
+                qty = rng.randint(1, 3)
+                try:
+                    _timed(stats["reserve_ms"], db_handler.reserve_stock, cart_id, med_id, qty, args.ttl)
+                except InsufficientStockError:
+                    with lock:
+                        stats["refused"] += 1
+                    continue
+                cart.append({"id": med_id, "name": "", "price": 10.0, "qty": qty, "subtotal": 10.0 * qty})
+            with lock:
+                stats["held"] += len(cart)
+            if not cart:
+                time.sleep(0.01)   # sold out for now; let holds expire or sell
+                continue
+            time.sleep(rng.uniform(0, args.ttl / 2))
+            roll = rng.random()
+            if roll < 0.5:
+                try:
+                    _timed(stats["sale_ms"], db_handler.commit_sale, cart, 1e9,
+                           f"STRESS-{number}-{invoices}", cart_id=cart_id)
+                    outcome = "sold"
+                except InsufficientStockError:
+                    outcome = "rejected"   # only possible once the holds had expired
+            elif roll < 0.75:
+                db_handler.release_stock(cart_id)
+                outcome = "released"
+            else:
+                outcome = "abandoned"
+            with lock:
+                stats[outcome] += 1
+            invoices += 1
+
+    def walk_in_worker():
+        rng = random.Random(-1)
+        sales = 0
+        while time.perf_counter() < deadline:
+            med_id = rng.choice(ids)
+            try:
+                db_handler.commit_sale([{"id": med_id, "name": "", "price": 10.0, "qty": 1, "subtotal": 10.0}],
+                                       1e9, f"WALKIN-{sales}")
+                sales += 1
+            except InsufficientStockError:
+                pass
+            time.sleep(0.005)
+        with lock:
+            stats["walk_in"] = sales
+
+    def monitor():
+        while time.perf_counter() < deadline:
+            found = violations()
+            if found:
+                problems.extend(found)
+                return
+            time.sleep(0.05)
+
+    stop_sweeper = db_handler.start_reservation_sweeper(SWEEP_INTERVAL)
+    threads = [threading.Thread(target=cart_worker, args=(n,)) for n in range(args.carts)]
+    threads += [threading.Thread(target=walk_in_worker), threading.Thread(target=monitor)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop_sweeper.set()
+
+    db_handler.expire_reservations(now=time.time() + args.ttl + 1)
+    problems += violations()
+    conn = db_handler.read_connection()
+    stock = conn.execute("SELECT SUM(quantity) FROM medicines").fetchone()[0]
+    sold = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM sales").fetchone()[0]
+    if stock != args.medicines * args.stock - sold:
+        problems.append(f"stock {stock} != {args.medicines * args.stock} - {sold} sold")
+    if conn.execute("SELECT COUNT(*) FROM stock_reservations").fetchone()[0]:
+        problems.append("holds left after the final sweep")
+    return stats, problems
+
+
+def scale(args):
+    ids = seed(args.holds, 1000)
+    expires = time.time() + 3600
+    for n, med_id in enumerate(ids):
+        db_handler.reserve_stock(f"scale-{n}", med_id, 1, 3600)
+
+    times = []
+    for n in range(200):
+        _timed(times, db_handler.reserve_stock, f"scale-extra-{n}", ids[n % len(ids)], 1, 3600)
+    lookup = []
+    for _ in range(20):
+        _timed(lookup, db_handler.fetch_available_quantities, ids)
+    held = db_handler.read_connection().execute("SELECT COUNT(*) FROM stock_reservations").fetchone()[0]
+    sweep = []
+    expired = _timed(sweep, db_handler.expire_reservations, expires + 60)
+    return {"holds": held, "reserve_p50_ms": _percentile(sorted(times), 0.5),
+            "reserve_p99_ms": _percentile(sorted(times), 0.99),
+            "availability_ms": _percentile(sorted(lookup), 0.5), "expired": expired, "sweep_ms": sweep[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=200)
+    parser.add_argument("--medicines", type=int, default=20)
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of contention")
+    parser.add_argument("--ttl", type=float, default=1.0, help="seconds a hold lives")
+    parser.add_argument("--holds", type=int, default=500, help="live holds in the scale phase")
+    args = parser.parse_args(argv)
+
+    db_handler.set_database_path(os.path.join(tempfile.mkdtemp(prefix="meditrack_reservations_"), "stress.db"))
+    db_handler.create_table()
+    print(f"Contention: {args.carts} carts on {args.medicines} medicines x {args.stock} units for {args.duration:g}s")
+    stats, problems = contention(args)
+    reserve, sale = sorted(stats.pop("reserve_ms")), sorted(stats.pop("sale_ms"))
+    print(f"  {stats}")
+    print(f"  reserve p50 {_percentile(reserve, 0.5):.2f} ms, p99 {_percentile(reserve, 0.99):.2f} ms; "
+          f"checkout p50 {_percentile(sale, 0.5):.2f} ms, p99 {_percentile(sale, 0.99):.2f} ms")
+
+    db_handler.set_database_path(os.path.join(tempfile.mkdtemp(prefix="meditrack_reservations_"), "scale.db"))
+    db_handler.create_table()
+    result = scale(args)
+    print(f"Scale: {result['holds']} live holds")
+    print(f"  reserve p50 {result['reserve_p50_ms']:.2f} ms, p99 {result['reserve_p99_ms']:.2f} ms; "
+          f"availability of {args.holds} medicines {result['availability_ms']:.2f} ms; "
+          f"sweep of {result['expired']} holds {result['sweep_ms']:.2f} ms")
+
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        return 1
+    print("✅ No medicine was oversold or held beyond its stock")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
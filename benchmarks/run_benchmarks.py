@@ -0,0 +1,219 @@
+"""Time db_handler and the headless parts of the GUI against a synthetic database.
+
+Usage: python -m benchmarks.run_benchmarks [--db pharmacy.db | --medicines 20000 --sale-lines 300000]
+       [--repeat 5] [--only report] [--output results.json] [--compare baseline.json]
+
+Without --db a database is generated with benchmarks.generate_data (fixed
+seed; history ends today, so the expiry mix is the same from day to day).
+Results are written as JSON; --compare prints the change against an
+earlier run and exits non-zero if any case got slower than --threshold
+times its baseline median. Work on a copy when using --db: it is migrated
+if needed and the dashboard counters may be recounted.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MEDITRACK_DATA_DIR", tempfile.mkdtemp(prefix="meditrack_bench_"))
+
+from benchmarks.generate_data import generate  # noqa: E402
+from database import db_handler  # noqa: E402
+from gui import events, virtual_grid  # noqa: E402
+
+# Noise floor: sub-millisecond cases are not flagged for a change this small.
+MIN_REGRESSION_MS = 0.5
+
+
+def _consume(result):
+    # Rows returned by a call; generators (batched reads) are drained.
+    if result is None or isinstance(result, (int, float)):
+        return None
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return sum(len(batch) for batch in result)
+
+
+def dataset_facts():
+    conn = db_handler.read_connection()
+    first, last = conn.execute("SELECT MIN(date), MAX(date) FROM sales").fetchone()
+    last = last or datetime.date.today().isoformat()
+    first = first or last
+    month = (datetime.date.fromisoformat(last) - datetime.timedelta(days=29)).isoformat()
+    invoice = conn.execute('''
+        SELECT invoice_id FROM sales WHERE date = ?
+        GROUP BY invoice_id ORDER BY COUNT(*) DESC, invoice_id LIMIT 1
+    ''', (last,)).fetchone()
+    name = conn.execute("SELECT name FROM medicines ORDER BY id LIMIT 1").fetchone()
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("medicines", "sales", "returns", "sales_daily")}
+    return {
+        "first": first, "last": last, "month": month,
+        "invoice": invoice[0] if invoice else "INV-1",
+        "word": (name[0] if name else "Panadol").split()[0].lower(),
+        "counts": counts,
+    }
+
+
+def cases(facts):
+    first, last, month, invoice, word = (facts[key] for key in ("first", "last", "month", "invoice", "word"))
+    sample_rows = [row[:-1] for row in db_handler.fetch_medicines_page(limit=1000)]  # minus the sort key
+    plain_rows = [row[:events.MEDICINE_COLUMNS] for row in sample_rows]
+    deep = facts["counts"]["medicines"] // 2
+
+    return [
+        # Reports
+        ("report.page_first (month)", lambda: db_handler.fetch_sales_report_page(month, last)),
+        ("report.page_first (all)", lambda: db_handler.fetch_sales_report_page(first, last)),
+        ("report.totals (month)", lambda: db_handler.fetch_sales_report_totals(month, last)),
+        ("report.totals (all)", lambda: db_handler.fetch_sales_report_totals(first, last)),
+        ("report.daily_totals (all)", lambda: db_handler.fetch_daily_sales_totals(first, last)),
+        ("report.top_sellers (month)", lambda: db_handler.fetch_top_sellers(month, last)),
+        ("report.top_sellers (all)", lambda: db_handler.fetch_top_sellers(first, last)),
+        # Returns
+        ("returns.remaining_qty (day)", lambda: db_handler.fetch_sales_with_remaining_qty(last, last)),
+        ("returns.remaining_qty (invoice)",
+         lambda: db_handler.fetch_sales_with_remaining_qty(None, invoice_id=invoice)),
+        ("returns.returnable_lines", lambda: db_handler.fetch_returnable_lines(invoice)),
+        # Search
+        ("search.word", lambda: db_handler.search_medicine(word)),
+        ("search.prefix", lambda: db_handler.search_medicine(word[:3])),
+        ("search.batch", lambda: db_handler.search_medicine("B00012")),
+        ("search.no_match", lambda: db_handler.search_medicine("zzqx")),
+        # Inventory grid (SQL filtering and sorting)
+        ("grid.build_filter", lambda: db_handler.build_medicine_filter({"status": "⚠️", "min_quantity": 5})),
+        ("grid.count (all)", lambda: db_handler.count_medicines()),
+        ("grid.count (expired)", lambda: db_handler.count_medicines({"status": "❌"})),
+        ("grid.count (near expiry)", lambda: db_handler.count_medicines({"status": "⚠️"})),
+        ("grid.page (name)", lambda: db_handler.fetch_medicines_page("Name")),
+        ("grid.page (expiry desc)", lambda: db_handler.fetch_medicines_page("Expiry Date", True)),
+        ("grid.page (near expiry)", lambda: db_handler.fetch_medicines_page("Quantity", filters={"status": "⚠️"})),
+        ("grid.keyset_jump (middle)", lambda: db_handler.fetch_medicine_keyset_at(deep, "Price")),
+        ("grid.filtered (expired)", lambda: db_handler.fetch_medicines_filtered({"status": "❌"}, "Quantity")),
+        ("grid.filtered (all)", lambda: db_handler.fetch_medicines_filtered(sort_column="Name")),
+        ("dashboard.stats", lambda: db_handler.fetch_inventory_stats()),
+        ("dashboard.alert_counts (filtered)",
+         lambda: db_handler.fetch_inventory_alert_counts(10, {"min_quantity": 5, "max_quantity": 50})),
+        ("export.medicine_batches", lambda: db_handler.iter_medicine_batches(2000)),
+        # Headless GUI work
+        ("gui.virtual_page (first)", lambda: virtual_grid.fetch_page(0, {}, "Name", False, {}, 30)),
+        ("gui.virtual_page (jump)", lambda: virtual_grid.fetch_page(deep // 200, {}, "Name", False, {}, 30)),
+        ("gui.tree_items (1000 rows)", lambda: events.tree_items(plain_rows)),
+        ("gui.render_rows (1000 rows)", lambda: [events.tree_item(row) for row in sample_rows]),
+        ("gui.build_snapshot (full list)", events.build_snapshot),
+    ]
+
+
+def measure(func, repeat):
+    rows = _consume(func())  # warm-up: statement cache, page cache, parsed dates
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _consume(func())
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "repeat": repeat,
+        "rows": rows,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print per-case ratios against baseline; return the names that regressed."""
+    regressed = []
+    print(f"\n{'case':<38}{'base ms':>10}{'now ms':>10}{'ratio':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<38}{'-':>10}{result['median_ms']:>10.2f}{'new':>8}")
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        slower = ratio > threshold and result["median_ms"] - before["median_ms"] > MIN_REGRESSION_MS
+        flag = "  ⚠️" if slower else ""
+        print(f"{name:<38}{before['median_ms']:>10.2f}{result['median_ms']:>10.2f}{ratio:>7.2f}x{flag}")
+        if slower:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="existing database to benchmark")
+    parser.add_argument("--medicines", type=int, default=20_000)
+    parser.add_argument("--sale-lines", type=int, default=300_000)
+    parser.add_argument("--return-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression (default 1.25)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_handler.set_database_path(args.db)
+        db_handler.create_table()
+        dataset = {"path": args.db}
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="meditrack_bench_"), "bench.db")
+        print(f"Generating {path}", file=sys.stderr)
+        dataset = generate(path, args.medicines, args.sale_lines, args.return_rate, seed=args.seed,
+                           progress=lambda msg: print(msg, file=sys.stderr))
+
+    facts = dataset_facts()
+    dataset["counts"] = facts["counts"]
+    results = {}
+    for name, func in cases(facts):
+        if args.only and args.only not in name:
+            continue
+        results[name] = measure(func, args.repeat)
+        print(f"{name:<38}{results[name]['median_ms']:>10.2f} ms", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "dataset": dataset,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n⚠️ {len(regressed)} case(s) slower than {args.threshold}x baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
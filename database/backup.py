@@ -0,0 +1,251 @@
+"""Online database backups with a retention policy.
+
+Backups are taken with SQLite's backup API a batch of pages at a time, so
+they are consistent even while the app keeps writing (WAL included) and
+never hold a lock for more than one step. Each copy is integrity-checked
+before it is kept and can be gzip-compressed. A manifest.json in the backup
+folder records every backup, so checking "is one due today?" and pruning
+old copies never list the directory:
+
+    python -m database.backup [--compress] [--keep-daily 7] [--keep-weekly 4]
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+
+from database import db_handler
+
+BACKUP_PREFIX = "pharmacy_backup_"
+MANIFEST_NAME = "manifest.json"
+PAGES_PER_STEP = 256        # pages copied per backup step before yielding the lock
+STEP_SLEEP = 0.005          # seconds between steps, so writers get a turn
+KEEP_DAILY = 7              # newest backup of each of the last N days that have one
+KEEP_WEEKLY = 4             # and the newest of each of the last M weeks
+
+_lock = threading.Lock()     # one backup or prune at a time per process
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_folder():
+    return os.path.join(os.path.dirname(db_handler.DB_PATH), "Backups")
+
+# ---------------- Manifest ---------------- #
+
+def _manifest_path(folder):
+    return os.path.join(folder, MANIFEST_NAME)
+
+
+def _legacy_entries(folder):
+    # Backups made before the manifest existed; adopted once so retention covers them.
+    entries = []
+    for name in sorted(os.listdir(folder)):
+        if not (name.startswith(BACKUP_PREFIX) and name.endswith((".db", ".db.gz"))):
+            continue
+        stamp = name[len(BACKUP_PREFIX):].split(".")[0]
+        try:
+            created = datetime.datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+        except ValueError:
+            continue
+        entries.append({
+            "file": name,
+            "created": created.isoformat(timespec="seconds"),
+            "size": os.path.getsize(os.path.join(folder, name)),
+            "compressed": name.endswith(".gz"),
+            "verified": False,
+            "adopted": True,
+        })
+    return entries
+
+
+def load_manifest(folder=None):
+    """Backups recorded in the manifest, oldest first."""
+    folder = folder or backup_folder()
+    try:
+        with open(_manifest_path(folder), encoding="utf-8") as f:
+            return json.load(f)["backups"]
+    except FileNotFoundError:
+        return _legacy_entries(folder) if os.path.isdir(folder) else []
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ Backup manifest unreadable, rebuilding it: {e}")
+        return _legacy_entries(folder)
+
+
+def _save_manifest(folder, entries):
+    path = _manifest_path(folder)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump({"backups": entries}, f, indent=2)
+    os.replace(path + ".part", path)
+
+# ---------------- Backup ---------------- #
+
+def _copy_database(target, progress=None):
+    source = db_handler.get_connection()
+    dest = sqlite3.connect(target)
+    try:
+        def step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        # Pin one WAL snapshot for the whole copy. Writers carry on (WAL readers
+        # never block them), and the backup does not restart from page 1 every
+        # time another connection commits, which under steady writes it would.
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        source.backup(dest, pages=PAGES_PER_STEP, progress=step, sleep=STEP_SLEEP)
+        source.rollback()
+        # A standalone file: no -wal/-shm companions needed to open the copy.
+        dest.execute("PRAGMA journal_mode = DELETE")
+        result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"Integrity check failed: {result}")
+    finally:
+        dest.close()
+        source.close()
+
+
+def _compress(path):
+    with open(path, "rb") as src, gzip.open(path + ".gz", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(path)
+    return path + ".gz"
+
+
+def create_backup(compress=False, progress=None, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """Back up the database, record it in the manifest and prune old copies.
+
+    Returns the path of the new backup. progress(copied, total) is called with
+    page counts after every step. Raises BackupError if the copy fails its
+    integrity check; nothing is kept in that case.
+    """
+    with _lock:
+        folder = backup_folder()
+        os.makedirs(folder, exist_ok=True)
+        # Read before the copy lands, or a first run would adopt the new file as an unverified legacy backup.
+        entries = load_manifest(folder)
+        now = datetime.datetime.now()
+        name = f"{BACKUP_PREFIX}{now:%Y%m%d_%H%M%S}.db"
+        partial = os.path.join(folder, name + ".part")
+        try:
+            _copy_database(partial, progress)
+            if compress:
+                partial = _compress(partial)
+                name += ".gz"
+            path = os.path.join(folder, name)
+            os.replace(partial, path)
+        except BaseException:
+            for leftover in (partial, partial + ".gz"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+
+        entries.append({
+            "file": name,
+            "created": now.isoformat(timespec="seconds"),
+            "size": os.path.getsize(path),
+            "compressed": compress,
+            "verified": True,
+        })
+        _save_manifest(folder, _prune(folder, entries, keep_daily, keep_weekly))
+        return path
+
+# ---------------- Retention ---------------- #
+
+def retained(entries, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """The entries a keep-N-daily / keep-M-weekly policy keeps, oldest first.
+
+    Like restic's --keep-daily/--keep-weekly: the newest backup of each of the
+    last N days that have one is kept, and so is the newest of each of the
+    last M such ISO weeks; a backup picked by both counts for both.
+    """
+    keep, days, weeks = [], [], []
+    for entry in sorted(entries, key=lambda e: e["created"], reverse=True):
+        created = datetime.datetime.fromisoformat(entry["created"])
+        day, week = created.date(), created.isocalendar()[:2]
+        picked = False
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            picked = True
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            picked = True
+        if picked:
+            keep.append(entry)
+    return keep[::-1]
+
+
+def _prune(folder, entries, keep_daily, keep_weekly):
+    keep = retained(entries, keep_daily, keep_weekly)
+    kept = {entry["file"] for entry in keep}
+    for entry in entries:
+        if entry["file"] not in kept:
+            try:
+                os.remove(os.path.join(folder, entry["file"]))
+            except FileNotFoundError:
+                continue
+            origin = " (from before the manifest)" if entry.get("adopted") else ""
+            print(f"🗑️ Pruned backup {entry['file']}{origin}")
+    return keep
+
+
+def prune_backups(keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    with _lock:
+        folder = backup_folder()
+        if not os.path.isdir(folder):
+            return []
+        keep = _prune(folder, load_manifest(folder), keep_daily, keep_weekly)
+        _save_manifest(folder, keep)
+        return keep
+
+# ---------------- Daily Backup ---------------- #
+
+def backup_due(today=None):
+    entries = load_manifest()
+    today = (today or datetime.date.today()).isoformat()
+    return not entries or max(entry["created"] for entry in entries)[:10] < today
+
+
+def auto_backup_once_per_day(compress=False):
+    if not backup_due():
+        print("✅ Backup already created for today.")
+        return None
+    try:
+        path = create_backup(compress)
+    except Exception as e:
+        print(f"⚠️ Backup failed: {e}")
+        return None
+    print(f"✅ Daily backup created: {path}")
+    return path
+
+
+def start_daily_backup(compress=False):
+    """Run auto_backup_once_per_day() on a daemon thread and return the thread."""
+    thread = threading.Thread(target=auto_backup_once_per_day, args=(compress,),
+                              name="daily-backup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up the MediTrack database.")
+    parser.add_argument("--compress", action="store_true", help="gzip the backup")
+    parser.add_argument("--keep-daily", type=int, default=KEEP_DAILY)
+    parser.add_argument("--keep-weekly", type=int, default=KEEP_WEEKLY)
+    args = parser.parse_args(argv)
+
+    db_handler.create_table()
+    path = create_backup(args.compress, keep_daily=args.keep_daily, keep_weekly=args.keep_weekly)
+    print(f"✅ Backup created: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,282 +1,1253 @@
 import sqlite3
 import os
-import shutil
 import datetime
+import threading
+import time
+import weakref
+import zlib
+from contextlib import contextmanager
+
+from database.migrations import (
+    DEFAULT_LOW_STOCK_THRESHOLD,
+    INVALID_EXPIRY_SQL,
+    INVENTORY_STATS_TRIGGERS,
+    LATEST_VERSION,
+    SEARCH_INDEX_TRIGGERS,
+    VALID_EXPIRY_SQL,
+    apply_migrations,
+    rebuild_sales_daily,
+    schema_version,
+)
+from database.normalize import MONEY_SCALE, iso_date, to_int, to_minor
+from utils.ulid import new_ulid
 
 # ---------------- Database Connection ---------------- #
 
+DATA_FOLDER = os.environ.get("MEDITRACK_DATA_DIR") or os.path.expanduser("~/Documents/PharmacyData")
+DB_PATH = os.path.join(DATA_FOLDER, "pharmacy.db")
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+STATEMENT_CACHE_SIZE = 256
+
+
+class ReadOnlyDatabaseError(sqlite3.DatabaseError):
+    pass
+
+
+class _ReaderSlot:
+    # A thread's reader connection. The thread-local holding it is dropped when
+    # the thread ends, and the finalizer then closes the connection.
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionManager:
+    """Long-lived connections: one shared writer, one reader per thread."""
+
+    def __init__(self, db_path, on_commit=None, read_only=False):
+        self.db_path = db_path
+        self.on_commit = on_commit
+        self.read_only = read_only      # thin client: every write belongs to the service
+        self.write_counter = 0
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._depth = 0
+        self._changed = None
+        self.search_tokenizer = False   # resolved lazily by _search_tokenizer()
+        self.on_statement = None        # tracing: sqlite3 trace callback for every connection
+        self.on_wait = None             # tracing: seconds spent waiting for the writer
+        self._connections = []
+        self._registry_lock = threading.RLock()   # _release may run inside close_all()
+
+    def _open(self, register=True):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        if self.on_statement:
+            conn.set_trace_callback(self.on_statement)
+        if register:
+            with self._registry_lock:
+                self._connections.append(conn)
+        return conn
+
+    def reader(self):
+        # Inside a write transaction, reads must see the uncommitted changes.
+        txn_conn = getattr(self._local, "txn_conn", None)
+        if txn_conn is not None:
+            return txn_conn
+        slot = getattr(self._local, "reader", None)
+        if slot is None:
+            slot = self._local.reader = _ReaderSlot(self._open())
+            weakref.finalize(slot, self._release, slot.conn)
+        return slot.conn
+
+    def _release(self, conn):
+        # Reader of a finished thread (export, refresh or backup worker).
+        with self._registry_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def transaction(self):
+        if self.read_only:
+            # Fail before BEGIN IMMEDIATE, which would already compete for the write lock.
+            raise ReadOnlyDatabaseError("This till is read-only; writes go through the service.")
+        waiting = time.perf_counter() if self.on_wait else None
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open()
+            conn = self._writer
+            if self._depth:
+                # Nested call: join the outer transaction.
+                self._depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._depth -= 1
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            if waiting is not None and self.on_wait:
+                self.on_wait(time.perf_counter() - waiting)
+            self._depth = 1
+            self._changed = set()
+            self._local.txn_conn = conn
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                if self._changed is None or self._changed:
+                    self.write_counter += 1
+                    if self.on_commit:
+                        self.on_commit(self._changed, self.write_counter)
+            finally:
+                self._depth = 0
+                self._changed = set()
+                self._local.txn_conn = None
+
+    def mark_changed(self, med_ids=None):
+        # Record medicine rows touched by the open transaction; None means "unknown rows".
+        if med_ids is None:
+            self._changed = None
+        elif self._changed is not None:
+            self._changed.update(med_ids)
+
+    def external_data_version(self):
+        # data_version on the writer only moves when *another* connection commits,
+        # so it has to be read there. It is one statement, serialized by SQLite's
+        # own connection mutex, so it does not wait out a write transaction the
+        # way _write_lock would; the lock is only taken to open the writer.
+        conn = self._writer
+        if conn is None:
+            with self._write_lock:
+                if self._writer is None:
+                    self._writer = self._open()
+                conn = self._writer
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close_all(self):
+        with self._write_lock, self._registry_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+            self._writer = None
+            self._local = threading.local()
+
+
+_change_listeners = []
+
+
+def _notify_change(med_ids, write_counter):
+    for listener in list(_change_listeners):
+        listener(med_ids, write_counter)
+
+
+_manager = ConnectionManager(DB_PATH, on_commit=_notify_change)
+
+
+def set_database_path(db_path):
+    global _manager, DB_PATH
+    _manager.close_all()
+    DB_PATH = db_path
+    on_statement, on_wait = _manager.on_statement, _manager.on_wait
+    _manager = ConnectionManager(db_path, on_commit=_notify_change, read_only=_manager.read_only)
+    _manager.on_statement, _manager.on_wait = on_statement, on_wait
+    _notify_change(None, _manager.write_counter)
+
+
+def set_read_only(read_only=True):
+    # Reopen every connection with PRAGMA query_only, so a write that bypasses
+    # the service fails loudly instead of competing for the write lock.
+    _manager.close_all()
+    _manager.read_only = read_only
+
+
+def read_connection():
+    return _manager.reader()
+
+
+def transaction():
+    return _manager.transaction()
+
+
 def get_connection():
-    folder_path = os.path.expanduser("~/Documents/PharmacyData")
-    os.makedirs(folder_path, exist_ok=True)
-    db_path = os.path.join(folder_path, "pharmacy.db")
-    return sqlite3.connect(db_path)
+    # Standalone connection for callers that manage their own lifetime.
+    return _manager._open(register=False)
+
+
+def add_change_listener(listener):
+    # listener(med_ids, write_counter) runs after each committed write to medicines;
+    # med_ids is None when the touched rows are not known.
+    _change_listeners.append(listener)
+
+
+def remove_change_listener(listener):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+
+def data_change_token():
+    return _manager.external_data_version(), _manager.write_counter
 
 # ---------------- Table Creation ---------------- #
 
 def create_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS medicines (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            batch_no TEXT,
-            mfg_date TEXT,
-            expiry_date TEXT,
-            quantity INTEGER,
-            price REAL
-        )
-    ''')
-
-    cursor.execute("PRAGMA table_info(medicines)")
-    medicine_columns = [col[1] for col in cursor.fetchall()]
-    if "demand" not in medicine_columns:
-        cursor.execute("ALTER TABLE medicines ADD COLUMN demand TEXT")
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            medicine_id INTEGER,
-            name TEXT,
-            quantity INTEGER,
-            price REAL,
-            subtotal REAL,
-            date TEXT,
-            invoice_id TEXT
-        )
-    ''')
-
-    cursor.execute("PRAGMA table_info(sales)")
-    sales_columns = [col[1] for col in cursor.fetchall()]
-    if "invoice_id" not in sales_columns:
-        cursor.execute("ALTER TABLE sales ADD COLUMN invoice_id TEXT")
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS returns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            medicine_id INTEGER,
-            name TEXT,
-            quantity INTEGER,
-            price REAL,
-            refund_amount REAL,
-            date TEXT,
-            invoice_id TEXT
-        )
-    ''')
+    # Cheap read-only check first so an up-to-date database never takes the write lock.
+    if schema_version(read_connection()) >= LATEST_VERSION:
+        return []
+    with transaction() as conn:
+        applied = apply_migrations(conn)
+        _manager.mark_changed()
+    _manager.search_tokenizer = False
+    return applied
 
-    cursor.execute("PRAGMA table_info(returns)")
-    return_columns = [col[1] for col in cursor.fetchall()]
-    if "invoice_id" not in return_columns:
-        cursor.execute("ALTER TABLE returns ADD COLUMN invoice_id TEXT")
 
-    conn.commit()
-    conn.close()
+def explain_query_plan(sql, params=()):
+    rows = read_connection().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[-1] for row in rows]
 
 # ---------------- Medicines Operations ---------------- #
 
+def _rupees(expr, alias):
+    # Money is stored in integer minor units (migration 12); callers deal in rupees.
+    return f"({expr}) / {MONEY_SCALE}.0 AS {alias}"
+
+# Row shapes returned to callers, in the tables' column order.
+MEDICINE_COLUMNS = f"id, name, batch_no, mfg_date, expiry_date, quantity, {_rupees('price', 'price')}, demand"
+SALES_COLUMNS = (f"id, medicine_id, name, quantity, {_rupees('price', 'price')}, "
+                 f"{_rupees('subtotal', 'subtotal')}, date, invoice_id")
+RETURNS_COLUMNS = (f"id, medicine_id, name, quantity, {_rupees('price', 'price')}, "
+                   f"{_rupees('refund_amount', 'refund_amount')}, date, invoice_id")
+
+def _medicine_values(data):
+    # (name, batch_no, mfg_date, expiry_date, quantity, price, demand) as stored;
+    # raises ValueError for a malformed date or number rather than storing it.
+    name, batch_no, mfg_date, expiry_date, quantity, price, demand = data
+    return (name, batch_no, iso_date(mfg_date, "Mfg date"), iso_date(expiry_date, "Expiry date"),
+            to_int(quantity, "Quantity"), to_minor(price), to_int(demand, "Demand"))
+
 def insert_medicine(data):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO medicines (name, batch_no, mfg_date, expiry_date, quantity, price, demand)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', data)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO medicines (name, batch_no, mfg_date, expiry_date, quantity, price, demand)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', _medicine_values(data))
+        _manager.mark_changed([cursor.lastrowid])
+    return cursor.lastrowid
+
+def bulk_insert_medicines(rows):
+    # For catalogue imports: per-row FTS triggers are ~10x slower than one index rebuild,
+    # which is O(table) and therefore only worth it for large batches. The stats
+    # counters are likewise left to be recounted on their next read.
+    with transaction() as conn:
+        has_search_index = _search_tokenizer() is not None
+        if has_search_index:
+            conn.execute("DROP TRIGGER IF EXISTS medicines_fts_insert")
+        conn.execute("DROP TRIGGER IF EXISTS inventory_stats_insert")
+        conn.executemany('''
+            INSERT INTO medicines (name, batch_no, mfg_date, expiry_date, quantity, price, demand)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', map(_medicine_values, rows))
+        if has_search_index:
+            conn.execute("INSERT INTO medicines_fts(medicines_fts) VALUES ('rebuild')")
+            conn.execute(SEARCH_INDEX_TRIGGERS["medicines_fts_insert"])
+        conn.execute("UPDATE inventory_stats SET as_of = NULL WHERE id = 1")
+        conn.execute(INVENTORY_STATS_TRIGGERS["inventory_stats_insert"])
+        _manager.mark_changed()
 
 def fetch_all_medicines():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM medicines")
-    rows = cursor.fetchall()
-    conn.close()
+    return read_connection().execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines").fetchall()
+
+def fetch_medicines_by_ids(med_ids):
+    med_ids = list(med_ids)
+    rows = []
+    conn = read_connection()
+    # Stay well below SQLite's bound-parameter limit.
+    for i in range(0, len(med_ids), 500):
+        chunk = med_ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows += conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines WHERE id IN ({placeholders})",
+                             chunk).fetchall()
     return rows
 
-def delete_medicine_by_id(med_id):
+def iter_medicine_batches(batch_size=1000):
+    """Yield the medicines table in id order, batch_size rows at a time.
+
+    Uses its own connection, so one read snapshot covers the whole walk and a
+    long export does not pin a pooled reader. Memory stays at one batch.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM medicines WHERE id = ?", (med_id,))
-    affected = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return affected > 0
+    try:
+        cursor = conn.execute(f"SELECT {MEDICINE_COLUMNS} FROM medicines ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def _medicine_ids_for(conn, name, batch):
+    return [row[0] for row in conn.execute(
+        "SELECT id FROM medicines WHERE name = ? AND batch_no = ?", (name, batch)
+    )]
+
+def delete_medicine_by_id(med_id):
+    with transaction() as conn:
+        cursor = conn.execute("DELETE FROM medicines WHERE id = ?", (med_id,))
+        _manager.mark_changed([int(med_id)])
+    return cursor.rowcount > 0
 
 def update_medicine_by_id(data, med_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE medicines
-        SET name = ?, batch_no = ?, mfg_date = ?, expiry_date = ?, quantity = ?, price = ?, demand = ?
-        WHERE id = ?
-    ''', (*data, med_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE medicines
+            SET name = ?, batch_no = ?, mfg_date = ?, expiry_date = ?, quantity = ?, price = ?, demand = ?
+            WHERE id = ?
+        ''', (*_medicine_values(data), med_id))
+        _manager.mark_changed([int(med_id)])
     return cursor.rowcount > 0
 
-def search_medicine(query):
-    conn = get_connection()
-    cursor = conn.cursor()
+SEARCH_LIMIT = 200
+
+def _search_tokenizer():
+    # 'trigram', 'unicode61' or None when the FTS index is missing (no FTS5 in this build).
+    if _manager.search_tokenizer is False:
+        row = read_connection().execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'medicines_fts'"
+        ).fetchone()
+        if row is None:
+            _manager.search_tokenizer = None
+        else:
+            _manager.search_tokenizer = "trigram" if "trigram" in row[0] else "unicode61"
+    return _manager.search_tokenizer
+
+def _fts_match_expression(query, tokenizer):
+    if tokenizer == "trigram":
+        return '"' + query.replace('"', '""') + '"'
+    return " ".join('"' + token.replace('"', '""') + '"*' for token in query.split())
+
+def search_medicine(query, limit=SEARCH_LIMIT):
+    query = query.strip()
+    if not query:
+        return []
+
+    tokenizer = _search_tokenizer()
+    # Trigrams need at least three characters to match anything.
+    if tokenizer and (tokenizer != "trigram" or len(query) >= 3):
+        # FTS5 ranks every match but keeps only the best `limit` (ORDER BY rank
+        # LIMIT is a bounded sort), and only those rows are joined to medicines.
+        return read_connection().execute(f'''
+            SELECT {MEDICINE_COLUMNS} FROM (
+                SELECT rowid, rank FROM medicines_fts
+                WHERE medicines_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            ) AS hits
+            JOIN medicines m ON m.id = hits.rowid
+            ORDER BY hits.rank, m.name
+        ''', (_fts_match_expression(query, tokenizer), limit)).fetchall()
+
     wildcard = f"%{query.lower()}%"
-    cursor.execute('''
-        SELECT * FROM medicines
+    return read_connection().execute(f'''
+        SELECT {MEDICINE_COLUMNS} FROM medicines
         WHERE LOWER(name) LIKE ? OR LOWER(batch_no) LIKE ?
-    ''', (wildcard, wildcard))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+        ORDER BY name
+        LIMIT ?
+    ''', (wildcard, wildcard, limit)).fetchall()
 
 def delete_medicine(name, batch):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM medicines WHERE name = ? AND batch_no = ?", (name, batch))
-    affected = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return affected > 0
+    with transaction() as conn:
+        _manager.mark_changed(_medicine_ids_for(conn, name, batch))
+        cursor = conn.execute("DELETE FROM medicines WHERE name = ? AND batch_no = ?", (name, batch))
+    return cursor.rowcount > 0
 
 def update_medicine(data, old_name, old_batch):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE medicines
-        SET name = ?, batch_no = ?, mfg_date = ?, expiry_date = ?, quantity = ?, price = ?, demand = ?
-        WHERE name = ? AND batch_no = ?
-    ''', (*data, old_name, old_batch))
-    affected = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return affected > 0
+    with transaction() as conn:
+        _manager.mark_changed(_medicine_ids_for(conn, old_name, old_batch))
+        cursor = conn.execute('''
+            UPDATE medicines
+            SET name = ?, batch_no = ?, mfg_date = ?, expiry_date = ?, quantity = ?, price = ?, demand = ?
+            WHERE name = ? AND batch_no = ?
+        ''', (*_medicine_values(data), old_name, old_batch))
+    return cursor.rowcount > 0
+
+# ---------------- Inventory Grid Queries ---------------- #
+
+# Grid heading -> SQL sort expression; each one is backed by an index (migration 4).
+# Status follows the expiry date, which is what it is derived from.
+GRID_SORT_EXPRESSIONS = {
+    None: "id",
+    "Name": "name COLLATE NOCASE",
+    "Batch": "batch_no COLLATE NOCASE",
+    "Mfg Date": "mfg_date",
+    "Expiry Date": "expiry_date",
+    "Quantity": "quantity",
+    "Price": "medicines.price",    # qualified: the bare name is the rupee column of MEDICINE_COLUMNS
+    "Demand": "demand",
+    "Status": "expiry_date",
+}
+
+NOT_NULL_SORT_COLUMNS = {"Name"}
+
+# Expiry status is computed relative to :as_of; VALID_EXPIRY_SQL (date(x) = x)
+# rejects values that are not well-formed YYYY-MM-DD dates.
+DAYS_REMAINING_SQL = (
+    f"CASE WHEN {VALID_EXPIRY_SQL} "
+    "THEN CAST(julianday(expiry_date) - julianday(:as_of) AS INTEGER) END"
+)
+EXPIRY_STATUS_SQL = (
+    f"CASE WHEN {DAYS_REMAINING_SQL} IS NULL THEN 'invalid' "
+    f"WHEN {DAYS_REMAINING_SQL} < 0 THEN 'expired' "
+    f"WHEN {DAYS_REMAINING_SQL} <= :near_days THEN 'near_expiry' "
+    "ELSE 'valid' END"
+)
+# Every grid row is the medicines row followed by these two computed columns.
+GRID_COLUMNS = f"{MEDICINE_COLUMNS}, {DAYS_REMAINING_SQL} AS days_remaining, {EXPIRY_STATUS_SQL} AS expiry_status"
+
+# The same statuses as disjoint predicates that the expiry indexes (migration 5) answer.
+EXPIRY_STATUS_PREDICATES = {
+    "expired": f"expiry_date < :as_of AND {VALID_EXPIRY_SQL}",
+    "near_expiry": f"expiry_date BETWEEN :as_of AND :near_until AND {VALID_EXPIRY_SQL}",
+    "valid": f"expiry_date > :near_until AND {VALID_EXPIRY_SQL}",
+    "invalid": INVALID_EXPIRY_SQL,
+}
+
+# Invalid dates are rare, so ANALYZE usually records nothing for their partial
+# index and the planner would scan the whole expiry index instead of it.
+STATUS_COUNT_SOURCES = {
+    "invalid": "medicines INDEXED BY idx_medicines_invalid_expiry",
+}
+
+# Status filter as passed by the toolbar (the icon in the Status column) -> codes.
+STATUS_FILTERS = {
+    "❌": ("expired",),
+    "⚠️": ("near_expiry", "invalid"),
+    "✅": ("valid",),
+}
+
+RANGE_FILTERS = (
+    ("min_quantity", "quantity >= :min_quantity"),
+    ("max_quantity", "quantity <= :max_quantity"),
+    ("min_price", "price >= :min_price"),
+    ("max_price", "price <= :max_price"),
+)
+
+def _expiry_params(as_of, near_days):
+    if as_of is None:
+        as_of = datetime.date.today()
+    elif isinstance(as_of, str):
+        as_of = datetime.date.fromisoformat(as_of)
+    near_until = as_of + datetime.timedelta(days=near_days)
+    return {"as_of": as_of.isoformat(), "near_days": near_days, "near_until": near_until.isoformat()}
+
+def _filter_terms(filters, params):
+    # (range clauses, status codes) for the grid filters; fills in params.
+    filters = filters or {}
+    clauses = []
+    for key, clause in RANGE_FILTERS:
+        if filters.get(key) is not None:
+            clauses.append(clause)
+            params[key] = to_minor(filters[key]) if key.endswith("_price") else filters[key]
+
+    status = filters.get("status")
+    codes = STATUS_FILTERS.get(status, (status,)) if status else ()
+    if any(code not in EXPIRY_STATUS_PREDICATES for code in codes):
+        raise ValueError(f"Unknown expiry status filter: {status!r}")
+    return clauses, codes
+
+def build_medicine_filter(filters=None, as_of=None, near_days=30):
+    """Turn the grid filters into a parameterized WHERE clause.
+
+    Returns (where, params); where is "" when nothing is filtered. params also
+    carries :as_of, :near_days and :near_until for the computed expiry columns.
+    """
+    params = _expiry_params(as_of, near_days)
+    clauses, codes = _filter_terms(filters, params)
+    if codes:
+        clauses.append(" OR ".join(f"({EXPIRY_STATUS_PREDICATES[code]})" for code in codes))
+    return " AND ".join(f"({clause})" for clause in clauses), params
+
+def _count_sql(clauses, codes=()):
+    # Scalar COUNT over clauses and any of the status codes. The statuses are
+    # disjoint, so each one is counted on its own index range and summed; an
+    # OR across them would fall back to scanning every row.
+    def count(extra, source="medicines"):
+        where = " AND ".join(f"({clause})" for clause in (*clauses, *extra))
+        return f"(SELECT COUNT(*) FROM {source}{f' WHERE {where}' if where else ''})"
+    if not codes:
+        return count(())
+    return " + ".join(count((EXPIRY_STATUS_PREDICATES[code],), STATUS_COUNT_SOURCES.get(code, "medicines"))
+                      for code in codes)
+
+def _grid_order(sort_column, descending):
+    expr = GRID_SORT_EXPRESSIONS[sort_column]
+    direction = "DESC" if descending else "ASC"
+    if expr == "id":
+        return f"ORDER BY id {direction}"
+    return f"ORDER BY {expr} {direction}, id {direction}"
+
+def build_medicine_query(filters=None, sort_column=None, descending=False, as_of=None, near_days=30):
+    # (sql, params) for every matching row in grid order, with the computed columns.
+    where, params = build_medicine_filter(filters, as_of, near_days)
+    sql = f"SELECT {GRID_COLUMNS} FROM medicines"
+    if where:
+        sql += f" WHERE {where}"
+    return f"{sql} {_grid_order(sort_column, descending)}", params
+
+def fetch_medicines_filtered(filters=None, sort_column=None, descending=False, as_of=None, near_days=30):
+    sql, params = build_medicine_query(filters, sort_column, descending, as_of, near_days)
+    return read_connection().execute(sql, params).fetchall()
+
+def count_medicines(filters=None, as_of=None, near_days=30):
+    params = _expiry_params(as_of, near_days)
+    clauses, codes = _filter_terms(filters, params)
+    return read_connection().execute(f"SELECT {_count_sql(clauses, codes)}", params).fetchone()[0]
+
+def _page_segments(sort_column, descending, after, where=""):
+    # Keyset pagination in (sort key, id) order. SQLite sorts NULL keys first
+    # ascending and last descending, and row-value comparisons never match
+    # NULLs, so NULL and non-NULL keys are paged as two index-friendly segments.
+    expr = GRID_SORT_EXPRESSIONS[sort_column]
+    direction = "DESC" if descending else "ASC"
+    cmp = "<" if descending else ">"
+    select = f"SELECT {GRID_COLUMNS}, {expr} AS sort_key FROM medicines"
+
+    def segment(conditions, order, params=None):
+        clauses = [clause for clause in (where, *conditions) if clause]
+        sql = select
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return f"{sql} ORDER BY {order}", params or {}
+
+    if expr == "id":
+        if after is None:
+            return [segment((), f"id {direction}")]
+        return [segment((f"id {cmp} :after_id",), f"id {direction}", {"after_id": after[1]})]
+
+    # Collation does not affect NULL-ness, and the bare column matches the index.
+    null_expr = expr.split(" COLLATE ")[0]
+
+    def null_segment(after_id=None):
+        if after_id is None:
+            return segment((f"{null_expr} IS NULL",), f"id {direction}")
+        return segment((f"{null_expr} IS NULL", f"id {cmp} :after_id"), f"id {direction}", {"after_id": after_id})
+
+    def value_segment(keyset=None):
+        order = f"{expr} {direction}, id {direction}"
+        if keyset is None:
+            return segment((f"{null_expr} IS NOT NULL",), order)
+        # Spelled out instead of a row-value comparison, which the planner cannot
+        # turn into an index range on expressions or collated columns.
+        sort_key, med_id = keyset
+        return segment((f"{expr} {cmp}= :sort_key", f"({expr} {cmp} :sort_key OR id {cmp} :after_id)"),
+                       order, {"sort_key": sort_key, "after_id": med_id})
+
+    if sort_column in NOT_NULL_SORT_COLUMNS:
+        return [value_segment(after)]
+    if after is None:
+        segments = [null_segment(), value_segment()]
+        return segments[::-1] if descending else segments
+    if after[0] is None:
+        # The keyset sits among the NULL keys.
+        return [null_segment(after[1])] if descending else [null_segment(after[1]), value_segment()]
+    return [value_segment(after), null_segment()] if descending else [value_segment(after)]
+
+def fetch_inventory_alert_counts(low_stock_threshold, filters=None, as_of=None, near_days=30):
+    # (total, expired, near expiry, low stock) over the filtered rows, without
+    # pulling them into Python. Each count is an index range scan; unfiltered
+    # counts come straight from inventory_stats.
+    params = _expiry_params(as_of, near_days)
+    params["low_stock_threshold"] = low_stock_threshold
+    clauses, codes = _filter_terms(filters, params)
+    if not clauses and not codes:
+        return fetch_inventory_stats(low_stock_threshold, as_of, near_days)
+
+    def with_status(code):
+        if codes and code not in codes:
+            return "0"
+        return _count_sql(clauses, (code,))
+
+    row = read_connection().execute(f'''
+        SELECT
+            {_count_sql(clauses, codes)},
+            {with_status("expired")},
+            {with_status("near_expiry")},
+            {_count_sql(clauses + ["quantity < :low_stock_threshold"], codes)}
+    ''', params).fetchone()
+    return tuple(row)
+
+def fetch_medicines_page(sort_column=None, descending=False, after=None, limit=200,
+                         filters=None, as_of=None, near_days=30):
+    """Return up to limit matching rows following the keyset `after` = (sort_key, id).
+
+    Rows carry the computed days_remaining and expiry_status columns and then
+    their sort key, so the last row of a page gives the keyset for the next one.
+    """
+    where, params = build_medicine_filter(filters, as_of, near_days)
+    conn = read_connection()
+    rows = []
+    for sql, segment_params in _page_segments(sort_column, descending, after, where):
+        rows += conn.execute(f"{sql} LIMIT :limit",
+                             {**params, **segment_params, "limit": limit - len(rows)}).fetchall()
+        if len(rows) >= limit:
+            break
+    return rows
+
+def fetch_medicine_keyset_at(offset, sort_column=None, descending=False, filters=None, as_of=None, near_days=30):
+    # Keyset of the matching row at `offset`, for scrollbar jumps, found by walking the sort index.
+    where, params = build_medicine_filter(filters, as_of, near_days)
+    expr = GRID_SORT_EXPRESSIONS[sort_column]
+    sql = f"SELECT {expr}, id FROM medicines"
+    if where:
+        sql += f" WHERE {where}"
+    row = read_connection().execute(
+        f"{sql} {_grid_order(sort_column, descending)} LIMIT 1 OFFSET :offset", {**params, "offset": offset}
+    ).fetchone()
+    return tuple(row) if row else None
+
+# ---------------- Inventory Stats ---------------- #
+
+INVENTORY_STATS_SELECT = '''
+    SELECT total, expired, near_expiry, low_stock, low_stock_threshold, as_of, near_until
+    FROM inventory_stats WHERE id = 1
+'''
+
+def fetch_inventory_stats(low_stock_threshold=DEFAULT_LOW_STOCK_THRESHOLD, as_of=None, near_days=30):
+    """Return (total, expired, near expiry, low stock) from inventory_stats.
+
+    Triggers keep the counters current (migration 6), so this is a one-row
+    read. Only when the day, the expiry window or the threshold differs from
+    what the row was counted for are the counters recounted from the indexes.
+    """
+    params = _expiry_params(as_of, near_days)
+    row = read_connection().execute(INVENTORY_STATS_SELECT).fetchone()
+    if row and row[4:] == (low_stock_threshold, params["as_of"], params["near_until"]):
+        return tuple(row[:4])
+    # A till reads the counters through its own connection; only this recount goes to the service.
+    return recount_inventory_stats(low_stock_threshold, params["as_of"], near_days)
+
+def recount_inventory_stats(low_stock_threshold=DEFAULT_LOW_STOCK_THRESHOLD, as_of=None, near_days=30):
+    # Recount inventory_stats from the indexes for a new day, expiry window or threshold.
+    params = _expiry_params(as_of, near_days)
+    params["low_stock_threshold"] = low_stock_threshold
+    with transaction() as conn:
+        conn.execute(f'''
+            INSERT OR REPLACE INTO inventory_stats
+                (id, total, expired, near_expiry, low_stock, low_stock_threshold, as_of, near_until)
+            SELECT 1, {_count_sql([])}, {_count_sql([], ("expired",))}, {_count_sql([], ("near_expiry",))},
+                   {_count_sql(["quantity < :low_stock_threshold"])}, :low_stock_threshold, :as_of, :near_until
+        ''', params)
+        row = conn.execute(INVENTORY_STATS_SELECT).fetchone()
+    return tuple(row[:4])
+
+# ---------------- Invoice Numbers ---------------- #
+
+INVOICE_PREFIX = "INV"
+INVOICE_DIGITS = 6
+
+def invoice_prefix(store=None, till=None):
+    # "INV-", or "INV-<store>-<till>-" from the arguments or MEDITRACK_STORE / MEDITRACK_TILL.
+    store = store if store is not None else os.environ.get("MEDITRACK_STORE")
+    till = till if till is not None else os.environ.get("MEDITRACK_TILL")
+    return "-".join([INVOICE_PREFIX] + [part for part in (store, till) if part]) + "-"
+
+def _next_invoice_id(conn, prefix):
+    # Inside the caller's write transaction, so the number is only used if the checkout commits.
+    conn.execute('''
+        INSERT INTO invoice_sequence (prefix, last_value) VALUES (?, 1)
+        ON CONFLICT (prefix) DO UPDATE SET last_value = last_value + 1
+    ''', (prefix,))
+    number = conn.execute("SELECT last_value FROM invoice_sequence WHERE prefix = ?", (prefix,)).fetchone()[0]
+    return f"{prefix}{number:0{INVOICE_DIGITS}d}"
+
+def allocate_invoice_id(prefix=None):
+    with transaction() as conn:
+        return _next_invoice_id(conn, prefix or invoice_prefix())
+
+def offline_invoice_id(prefix=None):
+    # For a till that cannot reach the database: unique without coordination and
+    # time-ordered, but not part of the numbered sequence.
+    return (prefix or invoice_prefix()) + new_ulid()
 
 # ---------------- Sales Operations ---------------- #
 
 def insert_sale_record(sale):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', sale)
-    conn.commit()
-    conn.close()
+    medicine_id, name, qty, price, subtotal, date, invoice_id = sale
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (medicine_id, name, qty, to_minor(price), to_minor(subtotal), iso_date(date), invoice_id))
+
+class InsufficientStockError(Exception):
+    def __init__(self, medicine_id, name, requested):
+        super().__init__(f"Not enough stock for '{name}' (requested {requested}).")
+        self.medicine_id = medicine_id
+        self.name = name
+        self.requested = requested
+
+
+def _allocate_cart(conn, cart, as_of):
+    # Replace product-level items (no "id") with one item per batch drawn from.
+    products = {}
+    for item in cart:
+        if item.get("id") is None:
+            key = item["name"].lower()
+            products[key] = (item["name"], products.get(key, (None, 0))[1] + item["qty"])
+    if not products:
+        return cart
+    lines = [item for item in cart if item.get("id") is not None]
+    for name, qty in products.values():
+        _expire_product_holds(conn, name)
+        for med_id, med_name, _, _, price, take in _allocate_fefo(conn, name, qty, as_of):
+            lines.append({"id": med_id, "name": med_name, "price": price, "qty": take,
+                          "subtotal": round(take * price, 2)})
+    return lines
+
+def commit_sale(cart, cash, invoice_id=None, cart_id=None, prefix=None):
+    """Sell a cart in one transaction; returns (change, invoice_id).
+
+    Stock decrement, sale lines and the invoice number succeed or fail
+    together. Without an invoice_id the next number for prefix (default
+    invoice_prefix()) is allocated. Stock held by other carts is not for
+    sale; cart_id's own holds are consumed.
+
+    An item without an "id" names a product rather than a batch: its qty
+    is split across that product's batches first-expiry-first-out, each
+    batch sold at its own price.
+    """
+    date_str = datetime.date.today().strftime('%Y-%m-%d')
+
+    with transaction() as conn:
+        if cart_id is not None:
+            conn.execute("DELETE FROM stock_reservations WHERE cart_id = ?", (cart_id,))
+        cart = _allocate_cart(conn, cart, date_str)
+        total = round(sum(item["subtotal"] for item in cart), 2)
+        if cash < total:
+            raise ValueError("Cash is less than total amount.")
+
+        requested = {}
+        for item in cart:
+            requested[item["id"]] = requested.get(item["id"], 0) + item["qty"]
+        names = {item["id"]: item["name"] for item in cart}
+        _expire_holds(conn, requested)
+        for med_id, qty in requested.items():
+            cursor = conn.execute(
+                f"UPDATE medicines SET quantity = quantity - ? WHERE id = ? AND {AVAILABLE_SQL} >= ?",
+                (qty, med_id, qty)
+            )
+            if cursor.rowcount != 1:
+                raise InsufficientStockError(med_id, names[med_id], qty)
+        _manager.mark_changed(requested)
+
+        if invoice_id is None:
+            invoice_id = _next_invoice_id(conn, prefix or invoice_prefix())
+        conn.executemany('''
+            INSERT INTO sales (medicine_id, name, quantity, price, subtotal, date, invoice_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (item["id"], item["name"], item["qty"], to_minor(item["price"]), to_minor(item["subtotal"]),
+             date_str, invoice_id)
+            for item in cart
+        ])
+
+    return round(cash - total, 2), invoice_id
 
 def fetch_sales_by_date(date):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sales WHERE date = ?", (date,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return read_connection().execute(f"SELECT {SALES_COLUMNS} FROM sales WHERE date = ?", (date,)).fetchall()
 
 def fetch_sales_by_date_range(start_date, end_date):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sales WHERE date BETWEEN ? AND ?", (start_date, end_date))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return read_connection().execute(
+        f"SELECT {SALES_COLUMNS} FROM sales WHERE date BETWEEN ? AND ?", (start_date, end_date)
+    ).fetchall()
 
 def fetch_sales_by_invoice(invoice_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sales WHERE invoice_id = ?", (invoice_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return read_connection().execute(
+        f"SELECT {SALES_COLUMNS} FROM sales WHERE invoice_id = ?", (invoice_id,)
+    ).fetchall()
+
+# ---------------- Stock Reservations ---------------- #
+
+RESERVATION_TTL = 15 * 60          # seconds an idle cart holds its stock
+RESERVATION_SWEEP_INTERVAL = 60    # seconds between sweeps for abandoned holds
+
+# Unheld stock of the medicines row being updated; stock_reserved is kept by triggers (migration 8).
+AVAILABLE_SQL = "quantity - COALESCE((SELECT r.quantity FROM stock_reserved r WHERE r.medicine_id = medicines.id), 0)"
+
+def _expire_holds(conn, med_ids, now=None):
+    # Drop expired holds on these medicines, so availability is exact between sweeps.
+    now = now or time.time()
+    conn.executemany(
+        "DELETE FROM stock_reservations WHERE medicine_id = ? AND expires_at <= ?",
+        [(med_id, now) for med_id in med_ids]
+    )
+
+def reserve_stock(cart_id, med_id, qty, ttl=RESERVATION_TTL):
+    """Hold qty more units of a medicine for an open cart; returns the hold's expiry time.
+
+    Raises InsufficientStockError if fewer than qty units are left once every
+    active hold (the cart's own included) is set aside. Adding to a hold also
+    renews it.
+    """
+    if qty <= 0:
+        raise ValueError("Reservation quantity must be a positive number.")
+    now = time.time()
+    with transaction() as conn:
+        _expire_holds(conn, [med_id], now)
+        row = conn.execute(
+            "SELECT name, available FROM stock_available WHERE medicine_id = ?", (med_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Medicine ID {med_id} not found in inventory.")
+        if row[1] < qty:
+            raise InsufficientStockError(med_id, row[0], qty)
+        conn.execute('''
+            INSERT INTO stock_reservations (cart_id, medicine_id, quantity, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (cart_id, medicine_id)
+            DO UPDATE SET quantity = quantity + excluded.quantity, expires_at = excluded.expires_at
+        ''', (cart_id, med_id, qty, now + ttl))
+    return now + ttl
+
+def extend_reservations(cart_id, ttl=RESERVATION_TTL):
+    # Renew a cart's live holds; returns how many were renewed (expired ones are not revived).
+    now = time.time()
+    with transaction() as conn:
+        return conn.execute(
+            "UPDATE stock_reservations SET expires_at = ? WHERE cart_id = ? AND expires_at > ?",
+            (now + ttl, cart_id, now)
+        ).rowcount
+
+def release_stock(cart_id, med_id=None, qty=None):
+    # Give back qty units of one medicine, all of it (qty None), or the whole cart (med_id None).
+    with transaction() as conn:
+        if med_id is None:
+            return conn.execute("DELETE FROM stock_reservations WHERE cart_id = ?", (cart_id,)).rowcount
+        if qty is not None:
+            cursor = conn.execute(
+                "UPDATE stock_reservations SET quantity = quantity - ? "
+                "WHERE cart_id = ? AND medicine_id = ? AND quantity > ?",
+                (qty, cart_id, med_id, qty)
+            )
+            if cursor.rowcount:
+                return cursor.rowcount
+        return conn.execute(
+            "DELETE FROM stock_reservations WHERE cart_id = ? AND medicine_id = ?", (cart_id, med_id)
+        ).rowcount
+
+def fetch_available_quantities(med_ids):
+    # {medicine id: quantity not held by any live reservation}; expired holds not yet swept count as free.
+    med_ids = list(med_ids)
+    available = {}
+    conn = read_connection()
+    now = time.time()
+    for i in range(0, len(med_ids), 500):
+        chunk = med_ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        available.update(conn.execute(f'''
+            SELECT a.medicine_id, a.available + COALESCE((
+                SELECT SUM(h.quantity) FROM stock_reservations h
+                WHERE h.medicine_id = a.medicine_id AND h.expires_at <= ?
+            ), 0)
+            FROM stock_available a
+            WHERE a.medicine_id IN ({placeholders})
+        ''', [now, *chunk]).fetchall())
+    return available
+
+def expire_reservations(now=None):
+    # Drop every expired hold in one transaction; returns how many. Read-only when none have expired.
+    now = now or time.time()
+    if read_connection().execute(
+        "SELECT 1 FROM stock_reservations WHERE expires_at <= ? LIMIT 1", (now,)
+    ).fetchone() is None:
+        return 0
+    with transaction() as conn:
+        return conn.execute("DELETE FROM stock_reservations WHERE expires_at <= ?", (now,)).rowcount
+
+# Sweeper health, reported by the service's "stats" op: a sweeper failing every
+# time leaves stale holds blocking stock, so its failures must be visible.
+sweeper_stats = {"sweeps": 0, "expired": 0, "failures": 0, "consecutive_failures": 0, "last_error": None}
+
+def start_reservation_sweeper(interval=RESERVATION_SWEEP_INTERVAL):
+    """Expire abandoned holds every interval seconds on a daemon thread.
+
+    Returns a threading.Event; set it to stop the sweeper. Outcomes are
+    counted in sweeper_stats.
+    """
+    stop = threading.Event()
+
+    def sweep():
+        while not stop.wait(interval):
+            try:
+                expired = expire_reservations()
+            except Exception as e:
+                sweeper_stats["failures"] += 1
+                sweeper_stats["consecutive_failures"] += 1
+                sweeper_stats["last_error"] = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Reservation sweep failed ({sweeper_stats['consecutive_failures']} in a row): {e}")
+            else:
+                sweeper_stats["sweeps"] += 1
+                sweeper_stats["expired"] += expired
+                sweeper_stats["consecutive_failures"] = 0
+
+    threading.Thread(target=sweep, name="reservation-sweeper", daemon=True).start()
+    return stop
+
+# ---------------- Batch Allocation (FEFO) ---------------- #
+
+# Sellable batches of a product, earliest expiry first, cut off as soon as the
+# running total of unheld stock covers :qty. Expired batches and ones without
+# a valid expiry date are never drawn. Walks idx_medicines_fefo (migration 11).
+FEFO_SQL = f'''
+    SELECT id, name, batch_no, expiry_date, price, available FROM (
+        SELECT *, SUM(available) OVER (ORDER BY expiry_date, id) AS running FROM (
+            SELECT id, name, batch_no, expiry_date, {_rupees("price", "price")}, {AVAILABLE_SQL} AS available
+            FROM medicines
+            WHERE name = :name COLLATE NOCASE AND expiry_date >= :as_of AND {VALID_EXPIRY_SQL}
+        )
+        WHERE available > 0
+    )
+    WHERE running - available < :qty
+    ORDER BY expiry_date, id
+'''
+
+def _allocate_fefo(conn, name, qty, as_of):
+    # [(id, name, batch_no, expiry_date, price, qty taken)]; raises if the product is short.
+    remaining = qty
+    lines = []
+    for med_id, med_name, batch_no, expiry_date, price, available in conn.execute(
+        FEFO_SQL, {"name": name, "as_of": as_of, "qty": qty}
+    ):
+        take = min(available, remaining)
+        lines.append((med_id, med_name, batch_no, expiry_date, price, take))
+        remaining -= take
+    if remaining > 0:
+        raise InsufficientStockError(None, name, qty)
+    return lines
+
+def _expire_product_holds(conn, name, now=None):
+    conn.execute('''
+        DELETE FROM stock_reservations
+        WHERE expires_at <= ? AND medicine_id IN (SELECT id FROM medicines WHERE name = ? COLLATE NOCASE)
+    ''', (now or time.time(), name))
+
+def fetch_fefo_allocation(name, qty, as_of=None):
+    """Batches qty units of a product would be drawn from right now, without taking them.
+
+    Same result shape as reserve_product(); raises InsufficientStockError if
+    the product's sellable stock falls short. Expired holds not yet swept
+    still count as held here.
+    """
+    as_of = as_of or datetime.date.today().isoformat()
+    return _allocate_fefo(read_connection(), name, qty, as_of)
+
+def reserve_product(cart_id, name, qty, ttl=RESERVATION_TTL):
+    """Hold qty units of a product for a cart, split across batches first-expiry-first-out.
+
+    Returns [(id, name, batch_no, expiry_date, price, qty held)], one entry
+    per batch drawn from. Raises InsufficientStockError if the unheld,
+    unexpired stock of all batches together is short.
+    """
+    if qty <= 0:
+        raise ValueError("Reservation quantity must be a positive number.")
+    now = time.time()
+    with transaction() as conn:
+        _expire_product_holds(conn, name, now)
+        lines = _allocate_fefo(conn, name, qty, datetime.date.today().isoformat())
+        conn.executemany('''
+            INSERT INTO stock_reservations (cart_id, medicine_id, quantity, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (cart_id, medicine_id)
+            DO UPDATE SET quantity = quantity + excluded.quantity, expires_at = excluded.expires_at
+        ''', [(cart_id, line[0], line[5], now + ttl) for line in lines])
+    return lines
 
 # ---------------- Return Operations ---------------- #
 
 def insert_return_record(return_entry):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO returns (medicine_id, name, quantity, price, refund_amount, date, invoice_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', return_entry)
-    conn.commit()
-    conn.close()
+    medicine_id, name, qty, price, refund_amount, date, invoice_id = return_entry
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO returns (medicine_id, name, quantity, price, refund_amount, date, invoice_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (medicine_id, name, qty, to_minor(price), to_minor(refund_amount), iso_date(date), invoice_id))
 
 def fetch_returns_by_invoice(invoice_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM returns WHERE invoice_id = ?", (invoice_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return read_connection().execute(
+        f"SELECT {RETURNS_COLUMNS} FROM returns WHERE invoice_id = ?", (invoice_id,)
+    ).fetchall()
 
 def fetch_total_returned_by_invoice_and_medicine(invoice_id, medicine_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    result = read_connection().execute('''
         SELECT SUM(quantity) FROM returns
         WHERE invoice_id = ? AND medicine_id = ?
-    ''', (invoice_id, medicine_id))
-    result = cursor.fetchone()
-    conn.close()
+    ''', (invoice_id, medicine_id)).fetchone()
     return result[0] if result and result[0] is not None else 0
 
+def _returnable_lines(conn, invoice_id):
+    # Returns are tracked per (invoice, medicine), so repeated sale lines of one
+    # medicine are summed; name and price come from its first line (MIN(id)).
+    return conn.execute(f'''
+        WITH lines AS MATERIALIZED (
+            SELECT s.medicine_id, s.name, SUM(s.quantity) AS qty_sold, {RETURNED_QTY_SQL} AS qty_returned,
+                   s.price, s.invoice_id, MIN(s.id) AS first_id
+            FROM sales s
+            WHERE s.invoice_id = ? AND s.medicine_id IS NOT NULL
+            GROUP BY s.medicine_id
+        )
+        SELECT medicine_id, name, qty_sold, qty_returned, qty_sold - qty_returned,
+               {_rupees("price", "price")}, invoice_id
+        FROM lines
+        WHERE qty_sold > qty_returned
+        ORDER BY first_id
+    ''', (invoice_id,)).fetchall()
+
+def fetch_returnable_lines(invoice_id):
+    """Lines of an invoice that still have something to return, in one query.
+
+    Rows are (medicine_id, name, qty_sold, qty_returned, remaining, price, invoice_id).
+    """
+    return _returnable_lines(read_connection(), invoice_id)
+
+
+class ReturnQuantityError(Exception):
+    def __init__(self, medicine_id, name, requested, remaining):
+        super().__init__(f"Only {remaining} of '{name}' can be returned (requested {requested}).")
+        self.medicine_id = medicine_id
+        self.name = name
+        self.requested = requested
+        self.remaining = remaining
+
+
+def commit_return(lines):
+    """Restock and record a return in one transaction; returns the total refund.
+
+    lines are dicts with "id", "name", "qty", "price" and "invoice_id". The
+    remaining quantities are re-checked inside the transaction, so a concurrent
+    return of the same invoice cannot push it past what was sold.
+    """
+    requested = {}
+    for line in lines:
+        if line["qty"] <= 0:
+            raise ValueError("Return quantity must be a positive number.")
+        key = (line["invoice_id"], line["id"])
+        requested[key] = requested.get(key, 0) + line["qty"]
+    restock = {}
+    for (_, med_id), qty in requested.items():
+        restock[med_id] = restock.get(med_id, 0) + qty
+    date_str = datetime.date.today().strftime('%Y-%m-%d')
+
+    with transaction() as conn:
+        remaining = {}
+        for invoice_id in {invoice_id for invoice_id, _ in requested}:
+            for row in _returnable_lines(conn, invoice_id):
+                remaining[(invoice_id, row[0])] = row[4]
+        names = {(line["invoice_id"], line["id"]): line["name"] for line in lines}
+        for key, qty in requested.items():
+            if qty > remaining.get(key, 0):
+                raise ReturnQuantityError(key[1], names[key], qty, remaining.get(key, 0))
+
+        cursor = conn.executemany(
+            "UPDATE medicines SET quantity = quantity + ? WHERE id = ?",
+            [(qty, med_id) for med_id, qty in restock.items()]
+        )
+        if cursor.rowcount != len(restock):
+            placeholders = ",".join("?" * len(restock))
+            found = {row[0] for row in conn.execute(
+                f"SELECT id FROM medicines WHERE id IN ({placeholders})", list(restock)
+            )}
+            missing = min(set(restock) - found)
+            raise ValueError(f"Medicine ID {missing} not found in inventory.")
+        _manager.mark_changed(restock)
+
+        conn.executemany('''
+            INSERT INTO returns (medicine_id, name, quantity, price, refund_amount, date, invoice_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (line["id"], line["name"], line["qty"], to_minor(line["price"]),
+             to_minor(line["qty"] * line["price"]), date_str, line["invoice_id"])
+            for line in lines
+        ])
+
+    return round(sum(line["qty"] * line["price"] for line in lines), 2)
+
+# ---------------- Receipts ---------------- #
+
+def journal_receipts(receipts):
+    """Append receipts to the journal in one transaction; returns how many were new.
+
+    receipts are (invoice_id, created_at, total, text). Text is compressed
+    here, so callers (and the service protocol) only deal in strings.
+    Re-journaling an invoice is a no-op, which makes retries safe.
+    """
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO receipts (invoice_id, created_at, total, body) VALUES (?, ?, ?, ?)",
+            [(invoice_id, created_at, to_minor(total), zlib.compress(text.encode("utf-8")))
+             for invoice_id, created_at, total, text in receipts]
+        )
+        return conn.total_changes - before
+
+def fetch_receipt(invoice_id):
+    row = read_connection().execute("SELECT body FROM receipts WHERE invoice_id = ?", (invoice_id,)).fetchone()
+    return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+def fetch_receipts_between(start, end, limit=200):
+    # (invoice_id, created_at, total), newest first; start/end compare against created_at text.
+    return read_connection().execute(f'''
+        SELECT invoice_id, created_at, {_rupees("total", "total")} FROM receipts
+        WHERE created_at BETWEEN ? AND ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    ''', (start, end, limit)).fetchall()
+
 # ---------------- Reports ---------------- #
 
-def fetch_sales_report_with_returns(start_date, end_date):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT
-            s.invoice_id,
-            s.medicine_id,
-            s.name,
-            s.quantity AS qty_sold,
-            COALESCE(SUM(r.quantity), 0) AS qty_returned,
-            s.price,
-            s.subtotal,
-            s.date
-        FROM sales s
-        LEFT JOIN returns r ON s.medicine_id = r.medicine_id AND s.invoice_id = r.invoice_id
-        WHERE s.date BETWEEN ? AND ?
-        GROUP BY s.id
-        ORDER BY s.date DESC
-    ''', (start_date, end_date))
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    report_data = []
-    for row in rows:
-        invoice_id, med_id, name, qty_sold, qty_returned, price, subtotal, date = row
-        net_qty = qty_sold - qty_returned
-        net_total = net_qty * price
-        returned_total = qty_returned * price
-
-        report_data.append({
-            "invoice_id": invoice_id,
-            "medicine_id": med_id,
-            "name": name,
-            "qty_sold": qty_sold,
-            "qty_returned": qty_returned,
-            "net_qty": net_qty,
-            "price": price,
-            "subtotal": subtotal,
-            "returned_amount": returned_total,
-            "net_total": net_total,
-            "date": date
-        })
-
-    return report_data
+# Returned quantity of one sale line; answered from idx_returns_invoice_medicine.
+RETURNED_QTY_SQL = '''
+    COALESCE((
+        SELECT SUM(r.quantity) FROM returns r
+        WHERE r.invoice_id = s.invoice_id AND r.medicine_id = s.medicine_id
+    ), 0)
+'''
 
-def fetch_sales_with_remaining_qty(start_date, end_date=None, invoice_id=None):
-    conn = get_connection()
-    cursor = conn.cursor()
+REPORT_PAGE_SIZE = 500
+
+def fetch_sales_report_page(start_date, end_date, after=None, limit=REPORT_PAGE_SIZE):
+    """Return up to limit report rows, newest first, following the keyset `after`.
 
-    base_query = '''
-        SELECT 
+    Rows are tuples of (invoice_id, name, qty_sold, qty_returned, net_qty,
+    price, subtotal, returned_amount, net_total, date, sale_id); pass
+    (date, sale_id) of the last row as `after` to get the next page.
+    """
+    params = {"start": start_date, "end": end_date, "limit": limit}
+    keyset = ""
+    if after is not None:
+        # Spelled out so the walk stays a range scan of idx_sales_date.
+        keyset = "AND s.date <= :after_date AND (s.date < :after_date OR s.id < :after_id)"
+        params["after_date"], params["after_id"] = after
+    # MATERIALIZED keeps the returns lookup to one per line instead of one per use.
+    return read_connection().execute(f'''
+        WITH page AS MATERIALIZED (
+            SELECT s.id, s.invoice_id, s.name, s.quantity AS qty_sold,
+                   {RETURNED_QTY_SQL} AS qty_returned,
+                   s.price, s.subtotal, s.date
+            FROM sales s
+            WHERE s.date BETWEEN :start AND :end {keyset}
+            ORDER BY s.date DESC, s.id DESC
+            LIMIT :limit
+        )
+        SELECT invoice_id, name, qty_sold, qty_returned, qty_sold - qty_returned,
+               {_rupees("price", "price")}, {_rupees("subtotal", "subtotal")},
+               {_rupees("qty_returned * price", "returned_amount")},
+               {_rupees("(qty_sold - qty_returned) * price", "net_total")},
+               date, id
+        FROM page
+        ORDER BY date DESC, id DESC
+    ''', params).fetchall()
+
+def fetch_sales_report_totals(start_date, end_date):
+    # (total sales, total returned, net revenue) over the whole range, read from
+    # the sales_daily rollup: one row per day and medicine instead of per sale line.
+    # Summed in minor units, so the net is exact.
+    return tuple(read_connection().execute(f'''
+        SELECT {_rupees("COALESCE(SUM(gross_amount), 0)", "total_sales")},
+               {_rupees("COALESCE(SUM(refund_amount), 0)", "total_returned")},
+               {_rupees("COALESCE(SUM(gross_amount) - SUM(refund_amount), 0)", "net")}
+        FROM sales_daily
+        WHERE date BETWEEN ? AND ?
+    ''', (start_date, end_date)).fetchone())
+
+def fetch_daily_sales_totals(start_date, end_date):
+    # (date, gross, refunds, net) per day with sales, oldest first.
+    return read_connection().execute(f'''
+        SELECT date, {_rupees("SUM(gross_amount)", "gross")}, {_rupees("SUM(refund_amount)", "refunds")},
+               {_rupees("SUM(gross_amount) - SUM(refund_amount)", "net")}
+        FROM sales_daily
+        WHERE date BETWEEN ? AND ?
+        GROUP BY date
+        ORDER BY date
+    ''', (start_date, end_date)).fetchall()
+
+def fetch_top_sellers(start_date, end_date, limit=10):
+    # (medicine_id, name, net qty, net revenue) for the best sellers by net quantity.
+    return read_connection().execute(f'''
+        SELECT medicine_id, MAX(name), SUM(qty_sold) - SUM(qty_returned) AS net_qty,
+               {_rupees("SUM(gross_amount) - SUM(refund_amount)", "net_amount")}
+        FROM sales_daily
+        WHERE date BETWEEN ? AND ?
+        GROUP BY medicine_id
+        ORDER BY net_qty DESC, net_amount DESC
+        LIMIT ?
+    ''', (start_date, end_date, limit)).fetchall()
+
+def rebuild_sales_rollup():
+    # Backfill sales_daily from the full sales/returns history; returns its row count.
+    with transaction() as conn:
+        return rebuild_sales_daily(conn)
+
+def fetch_sales_with_remaining_qty(start_date, end_date=None, invoice_id=None):
+    base_query = f'''
+        SELECT
             s.medicine_id,
             s.name,
             s.quantity AS qty_sold,
-            COALESCE(SUM(r.quantity), 0) AS qty_returned,
-            s.price,
-            s.invoice_id
+            {RETURNED_QTY_SQL} AS qty_returned,
+            {_rupees("s.price", "price")},
+            s.invoice_id,
+            s.date
         FROM sales s
-        LEFT JOIN returns r ON s.invoice_id = r.invoice_id AND s.medicine_id = r.medicine_id
     '''
 
     filters = []
@@ -292,43 +1263,17 @@ def fetch_sales_with_remaining_qty(start_date, end_date=None, invoice_id=None):
     if filters:
         base_query += " WHERE " + " AND ".join(filters)
 
-    base_query += " GROUP BY s.id HAVING qty_sold > qty_returned ORDER BY s.date DESC"
+    query = f'''
+        SELECT medicine_id, name, qty_sold, qty_returned, price, invoice_id
+        FROM ({base_query})
+        WHERE qty_sold > qty_returned
+        ORDER BY date DESC
+    '''
+    return read_connection().execute(query, params).fetchall()
 
-    cursor.execute(base_query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+# ---------------- Tracing ---------------- #
 
-# ---------------- Automatic Backup ---------------- #
+# Wraps the public functions above; a no-op flag check until tracing.enable().
+from database.tracing import instrument  # noqa: E402
 
-def backup_database():
-    try:
-        original_path = os.path.expanduser("~/Documents/PharmacyData/pharmacy.db")
-        backup_folder = os.path.expanduser("~/Documents/PharmacyData/Backups")
-        os.makedirs(backup_folder, exist_ok=True)
-
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"pharmacy_backup_{timestamp}.db"
-        backup_path = os.path.join(backup_folder, backup_filename)
-
-        shutil.copy2(original_path, backup_path)
-        return backup_path
-    except Exception as e:
-        print(f"Backup failed: {e}")
-        return None
-
-def auto_backup_once_per_day():
-    backup_folder = os.path.expanduser("~/Documents/PharmacyData/Backups")
-    os.makedirs(backup_folder, exist_ok=True)
-
-    today_str = datetime.datetime.now().strftime("%Y%m%d")
-    existing_backups = [f for f in os.listdir(backup_folder) if f.startswith("pharmacy_backup_") and today_str in f]
-
-    if not existing_backups:
-        backup_path = backup_database()
-        print(f"✅ Daily backup created: {backup_path}")
-    else:
-        print("✅ Backup already created for today.")
-
-# ---------------- Trigger Auto Backup on Load ---------------- #
-auto_backup_once_per_day()
+instrument(globals())
@@ -0,0 +1,177 @@
+"""Process-wide in-memory snapshot of the medicines table.
+
+Rows are keyed by id with secondary indexes on name and batch, plus a sorted
+list of (expiry_date, id) per product for first-expiry-first-out lookups. Local writes
+made through db_handler only re-read the rows they touched; a change made by
+another connection (seen through PRAGMA data_version) or a write whose rows
+are unknown triggers one full reload.
+"""
+import bisect
+import datetime
+import threading
+
+from database import db_handler
+
+
+def _valid_expiry(value):
+    # Same rule as VALID_EXPIRY_SQL: a well-formed YYYY-MM-DD date.
+    try:
+        return datetime.date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+
+class InventoryCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._by_name = {}     # lower-cased name -> set of ids
+        self._by_batch = {}    # batch_no -> set of ids
+        self._fefo = {}        # lower-cased name -> sorted list of (expiry_date, id) with a valid expiry
+        self._loaded = False
+        self._stale = False
+        self._pending = set()
+        self._data_version = None
+        self._write_counter = None
+        db_handler.add_change_listener(self._on_change)
+
+    # ---------------- Change Tracking ---------------- #
+
+    def _on_change(self, med_ids, write_counter):
+        with self._lock:
+            if med_ids is None:
+                self._stale = True
+            else:
+                self._pending.update(med_ids)
+            self._write_counter = write_counter
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def _ensure_fresh(self):
+        data_version, write_counter = db_handler.data_change_token()
+        with self._lock:
+            if (not self._loaded or self._stale
+                    or data_version != self._data_version
+                    or write_counter != self._write_counter):
+                self._reload(data_version, write_counter)
+            elif self._pending:
+                self._patch(self._pending)
+                self._pending = set()
+
+    def _reload(self, data_version, write_counter):
+        self._rows = {}
+        self._by_name = {}
+        self._by_batch = {}
+        self._fefo = {}
+        for row in db_handler.fetch_all_medicines():
+            self._index(row)
+        self._loaded = True
+        self._stale = False
+        self._pending = set()
+        self._data_version = data_version
+        self._write_counter = write_counter
+
+    def _patch(self, med_ids):
+        for med_id in med_ids:
+            self._unindex(med_id)
+        for row in db_handler.fetch_medicines_by_ids(med_ids):
+            self._index(row)
+
+    def _index(self, row):
+        med_id = row[0]
+        self._rows[med_id] = row
+        self._by_name.setdefault(row[1].lower(), set()).add(med_id)
+        self._by_batch.setdefault(row[2], set()).add(med_id)
+        if _valid_expiry(row[4]):
+            bisect.insort(self._fefo.setdefault(row[1].lower(), []), (row[4], med_id))
+
+    def _unindex(self, med_id):
+        row = self._rows.pop(med_id, None)
+        if row is None:
+            return
+        for index, key in ((self._by_name, row[1].lower()), (self._by_batch, row[2])):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(med_id)
+                if not ids:
+                    del index[key]
+        batches = self._fefo.get(row[1].lower())
+        if batches:
+            i = bisect.bisect_left(batches, (row[4], med_id))
+            if i < len(batches) and batches[i] == (row[4], med_id):
+                del batches[i]
+            if not batches:
+                del self._fefo[row[1].lower()]
+
+    # ---------------- Lookups ---------------- #
+
+    def get(self, med_id):
+        self._ensure_fresh()
+        with self._lock:
+            return self._rows.get(int(med_id))
+
+    def all_rows(self):
+        self._ensure_fresh()
+        with self._lock:
+            return [self._rows[i] for i in sorted(self._rows)]
+
+    def by_name(self, name):
+        self._ensure_fresh()
+        with self._lock:
+            return [self._rows[i] for i in sorted(self._by_name.get(name.lower(), ()))]
+
+    def by_batch(self, batch_no):
+        self._ensure_fresh()
+        with self._lock:
+            return [self._rows[i] for i in sorted(self._by_batch.get(batch_no, ()))]
+
+    def get_batch(self, name, batch_no):
+        self._ensure_fresh()
+        with self._lock:
+            ids = self._by_name.get(name.lower(), set()) & self._by_batch.get(batch_no, set())
+            return self._rows[min(ids)] if ids else None
+
+    def fefo_batches(self, name, limit=None):
+        """Rows of a product's unexpired batches with stock, earliest expiry first.
+
+        Expired batches are skipped with one bisect, so the first `limit`
+        batches cost O(log batches + limit). Quantities are the cached stock,
+        before holds.
+        """
+        self._ensure_fresh()
+        today = datetime.date.today().isoformat()
+        with self._lock:
+            batches = self._fefo.get(name.lower(), ())
+            rows = []
+            for i in range(bisect.bisect_left(batches, (today,)), len(batches)):
+                row = self._rows[batches[i][1]]
+                if (row[5] or 0) > 0:
+                    rows.append(row)
+                    if limit is not None and len(rows) >= limit:
+                        break
+            return rows
+
+    def search_names(self, keyword):
+        # Substring match over distinct names rather than every batch row.
+        self._ensure_fresh()
+        keyword = keyword.lower()
+        with self._lock:
+            ids = []
+            for name, name_ids in self._by_name.items():
+                if keyword in name:
+                    ids.extend(name_ids)
+            return [self._rows[i] for i in sorted(ids)]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_inventory_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = InventoryCache()
+        return _cache
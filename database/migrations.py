@@ -0,0 +1,668 @@
+"""Ordered schema migrations tracked through PRAGMA user_version.
+
+Each migration runs exactly once, in order, inside the caller's write
+transaction. Append new migrations to MIGRATIONS; never edit or reorder
+ones that have already shipped.
+"""
+import sqlite3
+
+from database.normalize import MONEY_SCALE, repair_rows
+
+
+def _column_names(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _initial_schema(conn):
+    # Matches the tables created by the pre-migration create_table(),
+    # including the columns it used to patch in on existing databases.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS medicines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            batch_no TEXT,
+            mfg_date TEXT,
+            expiry_date TEXT,
+            quantity INTEGER,
+            price REAL,
+            demand TEXT
+        )
+    ''')
+    if "demand" not in _column_names(conn, "medicines"):
+        conn.execute("ALTER TABLE medicines ADD COLUMN demand TEXT")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER,
+            name TEXT,
+            quantity INTEGER,
+            price REAL,
+            subtotal REAL,
+            date TEXT,
+            invoice_id TEXT
+        )
+    ''')
+    if "invoice_id" not in _column_names(conn, "sales"):
+        conn.execute("ALTER TABLE sales ADD COLUMN invoice_id TEXT")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS returns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER,
+            name TEXT,
+            quantity INTEGER,
+            price REAL,
+            refund_amount REAL,
+            date TEXT,
+            invoice_id TEXT
+        )
+    ''')
+    if "invoice_id" not in _column_names(conn, "returns"):
+        conn.execute("ALTER TABLE returns ADD COLUMN invoice_id TEXT")
+
+
+def _report_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_invoice_medicine ON sales(invoice_id, medicine_id)")
+    # Covers SUM(quantity) lookups per (invoice, medicine) without touching the table.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_returns_invoice_medicine ON returns(invoice_id, medicine_id, quantity)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_name_batch ON medicines(name, batch_no)")
+
+
+SEARCH_INDEX_TRIGGERS = {
+    "medicines_fts_insert": '''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_insert AFTER INSERT ON medicines BEGIN
+            INSERT INTO medicines_fts(rowid, name, batch_no) VALUES (new.id, new.name, new.batch_no);
+        END
+    ''',
+    "medicines_fts_delete": '''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_delete AFTER DELETE ON medicines BEGIN
+            INSERT INTO medicines_fts(medicines_fts, rowid, name, batch_no)
+            VALUES ('delete', old.id, old.name, old.batch_no);
+        END
+    ''',
+    "medicines_fts_update": '''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_update AFTER UPDATE OF name, batch_no ON medicines BEGIN
+            INSERT INTO medicines_fts(medicines_fts, rowid, name, batch_no)
+            VALUES ('delete', old.id, old.name, old.batch_no);
+            INSERT INTO medicines_fts(rowid, name, batch_no) VALUES (new.id, new.name, new.batch_no);
+        END
+    ''',
+}
+
+
+def _create_search_index(conn, tokenizer):
+    # External-content table: the index stores tokens only, rows stay in medicines.
+    # New searchable fields (generic/brand names) are added here in a later migration.
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE medicines_fts USING fts5(
+            name, batch_no,
+            content='medicines', content_rowid='id',
+            {tokenizer}
+        )
+    ''')
+
+
+def _medicine_search_index(conn):
+    try:
+        # Trigram gives case-insensitive substring matching, the same semantics as LIKE '%q%'.
+        _create_search_index(conn, "tokenize='trigram'")
+    except sqlite3.OperationalError as e:
+        if "no such module" in str(e):
+            # SQLite built without FTS5: search_medicine() falls back to LIKE.
+            return
+        _create_search_index(conn, "tokenize='unicode61', prefix='2 3 4'")
+
+    conn.execute("INSERT INTO medicines_fts(medicines_fts) VALUES ('rebuild')")
+    for ddl in SEARCH_INDEX_TRIGGERS.values():
+        conn.execute(ddl)
+
+
+def _grid_sort_indexes(conn):
+    # One index per sortable grid column; the implicit trailing rowid makes
+    # (column, id) keyset pagination an index range scan.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_name_nocase ON medicines(name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_batch ON medicines(batch_no COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_mfg_date ON medicines(mfg_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_expiry_date ON medicines(expiry_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_quantity ON medicines(quantity)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_price ON medicines(price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_demand ON medicines(CAST(demand AS INTEGER))")
+
+
+def valid_expiry_sql(column="expiry_date"):
+    return f"(date({column}) = {column}) IS 1"
+
+
+# Expiry validity as used by the status predicates in db_handler. The partial
+# indexes below are only chosen when a query repeats the exact same term.
+VALID_EXPIRY_SQL = valid_expiry_sql()
+INVALID_EXPIRY_SQL = "(date(expiry_date) = expiry_date) IS NOT 1"
+
+
+def _expiry_status_indexes(conn):
+    # Expiry status filters and counts become index range scans instead of
+    # evaluating date() on every row.
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_medicines_valid_expiry ON medicines(expiry_date) WHERE {VALID_EXPIRY_SQL}")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_medicines_invalid_expiry ON medicines(id) WHERE {INVALID_EXPIRY_SQL}")
+
+
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+
+
+def _stats_terms(row):
+    # How much one medicines row (new or old) adds to each inventory_stats counter,
+    # judged against the threshold and expiry window stored in the stats row.
+    valid = valid_expiry_sql(f"{row}.expiry_date")
+    return {
+        "low_stock": f"COALESCE({row}.quantity < low_stock_threshold, 0)",
+        "expired": f"COALESCE({row}.expiry_date < as_of AND {valid}, 0)",
+        "near_expiry": f"COALESCE({row}.expiry_date BETWEEN as_of AND near_until AND {valid}, 0)",
+    }
+
+
+_new, _old = _stats_terms("new"), _stats_terms("old")
+
+INVENTORY_STATS_TRIGGERS = {
+    "inventory_stats_insert": f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_stats_insert AFTER INSERT ON medicines BEGIN
+            UPDATE inventory_stats SET
+                total = total + 1,
+                low_stock = low_stock + {_new["low_stock"]},
+                expired = expired + {_new["expired"]},
+                near_expiry = near_expiry + {_new["near_expiry"]}
+            WHERE id = 1;
+        END
+    ''',
+    "inventory_stats_delete": f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_stats_delete AFTER DELETE ON medicines BEGIN
+            UPDATE inventory_stats SET
+                total = total - 1,
+                low_stock = low_stock - {_old["low_stock"]},
+                expired = expired - {_old["expired"]},
+                near_expiry = near_expiry - {_old["near_expiry"]}
+            WHERE id = 1;
+        END
+    ''',
+    "inventory_stats_update": f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_stats_update AFTER UPDATE OF quantity, expiry_date ON medicines BEGIN
+            UPDATE inventory_stats SET
+                low_stock = low_stock + {_new["low_stock"]} - {_old["low_stock"]},
+                expired = expired + {_new["expired"]} - {_old["expired"]},
+                near_expiry = near_expiry + {_new["near_expiry"]} - {_old["near_expiry"]}
+            WHERE id = 1;
+        END
+    ''',
+}
+
+
+def _inventory_stats(conn):
+    # Single-row dashboard counters. Total and low stock are exact at all times;
+    # the expiry buckets are relative to as_of, and db_handler recounts them when
+    # the day rolls over (as_of starts NULL so the first read does that).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL,
+            expired INTEGER NOT NULL,
+            near_expiry INTEGER NOT NULL,
+            low_stock INTEGER NOT NULL,
+            low_stock_threshold INTEGER NOT NULL,
+            as_of TEXT,
+            near_until TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO inventory_stats (id, total, expired, near_expiry, low_stock, low_stock_threshold)
+        SELECT 1, COUNT(*), 0, 0, COALESCE(SUM(quantity < :threshold), 0), :threshold FROM medicines
+    ''', {"threshold": DEFAULT_LOW_STOCK_THRESHOLD})
+    for ddl in INVENTORY_STATS_TRIGGERS.values():
+        conn.execute(ddl)
+
+
+# One row per (sale date, medicine): what was sold that day and what has since
+# been returned from those sales. Returns are booked against the date and price
+# of the sale line they refund, so ranges agree with the line-level report.
+_ROLLUP_UPSERT = '''
+    ON CONFLICT(date, medicine_id) DO UPDATE SET
+        name = COALESCE(excluded.name, name),
+        qty_sold = qty_sold + excluded.qty_sold,
+        qty_returned = qty_returned + excluded.qty_returned,
+        gross_amount = gross_amount + excluded.gross_amount,
+        refund_amount = refund_amount + excluded.refund_amount
+'''
+
+
+def _sale_delta(row, sign):
+    return f'''
+        INSERT INTO sales_daily (date, medicine_id, name, qty_sold, qty_returned, gross_amount, refund_amount)
+        SELECT {row}.date, {row}.medicine_id, {row}.name,
+               {sign}COALESCE({row}.quantity, 0), 0, {sign}COALESCE({row}.subtotal, 0), 0
+        WHERE {row}.date IS NOT NULL AND {row}.medicine_id IS NOT NULL
+        {_ROLLUP_UPSERT};
+    '''
+
+
+def _return_delta(row, sign):
+    # The first sale line of the invoice for that medicine; the same line
+    # rebuild_sales_daily() picks with MIN(id).
+    return f'''
+        INSERT INTO sales_daily (date, medicine_id, name, qty_sold, qty_returned, gross_amount, refund_amount)
+        SELECT s.date, s.medicine_id, s.name,
+               0, {sign}COALESCE({row}.quantity, 0), 0, {sign}COALESCE({row}.quantity * s.price, 0)
+        FROM sales s
+        WHERE s.id = (SELECT MIN(id) FROM sales WHERE invoice_id = {row}.invoice_id AND medicine_id = {row}.medicine_id)
+          AND s.date IS NOT NULL
+        {_ROLLUP_UPSERT};
+    '''
+
+
+SALES_DAILY_TRIGGERS = {
+    "sales_daily_sale_insert": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_sale_insert AFTER INSERT ON sales BEGIN
+            {_sale_delta("new", "")}
+        END
+    ''',
+    "sales_daily_sale_delete": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_sale_delete AFTER DELETE ON sales BEGIN
+            {_sale_delta("old", "-")}
+        END
+    ''',
+    "sales_daily_sale_update": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_sale_update
+        AFTER UPDATE OF medicine_id, name, quantity, subtotal, date ON sales BEGIN
+            {_sale_delta("old", "-")}
+            {_sale_delta("new", "")}
+        END
+    ''',
+    "sales_daily_return_insert": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_return_insert AFTER INSERT ON returns BEGIN
+            {_return_delta("new", "")}
+        END
+    ''',
+    "sales_daily_return_delete": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_return_delete AFTER DELETE ON returns BEGIN
+            {_return_delta("old", "-")}
+        END
+    ''',
+    "sales_daily_return_update": f'''
+        CREATE TRIGGER IF NOT EXISTS sales_daily_return_update
+        AFTER UPDATE OF medicine_id, quantity, invoice_id ON returns BEGIN
+            {_return_delta("old", "-")}
+            {_return_delta("new", "")}
+        END
+    ''',
+}
+
+
+def rebuild_sales_daily(conn):
+    """Recompute sales_daily from the sales and returns history.
+
+    Runs inside the caller's write transaction; returns the number of rollup rows.
+    """
+    conn.execute("DELETE FROM sales_daily")
+    conn.execute('''
+        INSERT INTO sales_daily (date, medicine_id, name, qty_sold, qty_returned, gross_amount, refund_amount)
+        SELECT date, medicine_id, MAX(name), COALESCE(SUM(quantity), 0), 0, COALESCE(SUM(subtotal), 0), 0
+        FROM sales
+        WHERE date IS NOT NULL AND medicine_id IS NOT NULL
+        GROUP BY date, medicine_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO sales_daily (date, medicine_id, name, qty_sold, qty_returned, gross_amount, refund_amount)
+        SELECT s.date, s.medicine_id, s.name,
+               0, COALESCE(SUM(r.quantity), 0), 0, COALESCE(SUM(r.quantity * s.price), 0)
+        FROM returns r
+        JOIN sales s ON s.id = (
+            SELECT MIN(id) FROM sales WHERE invoice_id = r.invoice_id AND medicine_id = r.medicine_id
+        )
+        WHERE s.date IS NOT NULL
+        GROUP BY s.date, s.medicine_id
+        {_ROLLUP_UPSERT}
+    ''')
+    return conn.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0]
+
+
+def _sales_daily_rollup(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            date TEXT NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            name TEXT,
+            qty_sold INTEGER NOT NULL,
+            qty_returned INTEGER NOT NULL,
+            gross_amount REAL NOT NULL,
+            refund_amount REAL NOT NULL,
+            PRIMARY KEY (date, medicine_id)
+        ) WITHOUT ROWID
+    ''')
+    rebuild_sales_daily(conn)
+    for ddl in SALES_DAILY_TRIGGERS.values():
+        conn.execute(ddl)
+
+
+# Held quantity per medicine, kept current from stock_reservations so
+# availability is one primary-key lookup rather than a SUM over the holds.
+STOCK_RESERVED_TRIGGERS = {
+    "stock_reserved_insert": '''
+        CREATE TRIGGER IF NOT EXISTS stock_reserved_insert AFTER INSERT ON stock_reservations BEGIN
+            INSERT INTO stock_reserved (medicine_id, quantity) VALUES (new.medicine_id, new.quantity)
+            ON CONFLICT (medicine_id) DO UPDATE SET quantity = quantity + excluded.quantity;
+        END
+    ''',
+    "stock_reserved_delete": '''
+        CREATE TRIGGER IF NOT EXISTS stock_reserved_delete AFTER DELETE ON stock_reservations BEGIN
+            UPDATE stock_reserved SET quantity = quantity - old.quantity WHERE medicine_id = old.medicine_id;
+        END
+    ''',
+    "stock_reserved_update": '''
+        CREATE TRIGGER IF NOT EXISTS stock_reserved_update
+        AFTER UPDATE OF medicine_id, quantity ON stock_reservations BEGIN
+            UPDATE stock_reserved SET quantity = quantity - old.quantity WHERE medicine_id = old.medicine_id;
+            INSERT INTO stock_reserved (medicine_id, quantity) VALUES (new.medicine_id, new.quantity)
+            ON CONFLICT (medicine_id) DO UPDATE SET quantity = quantity + excluded.quantity;
+        END
+    ''',
+}
+
+
+STOCK_AVAILABLE_VIEW = '''
+    CREATE VIEW IF NOT EXISTS stock_available AS
+    SELECT m.id AS medicine_id, m.name, m.quantity, COALESCE(r.quantity, 0) AS reserved,
+           m.quantity - COALESCE(r.quantity, 0) AS available
+    FROM medicines m
+    LEFT JOIN stock_reserved r ON r.medicine_id = m.id
+'''
+
+
+def _stock_reservations(conn):
+    # Holds on stock for carts that are still open; expires_at is a Unix timestamp.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            id INTEGER PRIMARY KEY,
+            cart_id TEXT NOT NULL,
+            medicine_id INTEGER NOT NULL REFERENCES medicines (id) ON DELETE CASCADE,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_reservations_cart_medicine
+        ON stock_reservations (cart_id, medicine_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reservations_medicine_expires
+        ON stock_reservations (medicine_id, expires_at)
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservations_expires ON stock_reservations (expires_at)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reserved (
+            medicine_id INTEGER PRIMARY KEY,
+            quantity INTEGER NOT NULL
+        )
+    ''')
+    for ddl in STOCK_RESERVED_TRIGGERS.values():
+        conn.execute(ddl)
+    conn.execute(STOCK_AVAILABLE_VIEW)
+
+
+def _invoice_sequence(conn):
+    # Last invoice number handed out per prefix ("INV-", "INV-S1-T2-", ...).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_sequence (
+            prefix TEXT PRIMARY KEY,
+            last_value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _receipt_journal(conn):
+    # One row per printed receipt; body is the zlib-compressed receipt text.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipts (
+            invoice_id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            total REAL,
+            body BLOB NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_receipts_created ON receipts (created_at)")
+
+
+def _fefo_index(conn):
+    # A product's batches in expiry order, for first-expiry-first-out allocation.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_fefo ON medicines(name COLLATE NOCASE, expiry_date)")
+
+
+# STRICT needs SQLite 3.37; older builds get the same tables and CHECKs without type enforcement.
+STRICT_TABLES = sqlite3.sqlite_version_info >= (3, 37, 0)
+
+
+def _table_options(*options):
+    return ", ".join(options + (("STRICT",) if STRICT_TABLES else ()))
+
+
+def _iso_date_check(column):
+    # NULL or a real YYYY-MM-DD date; date() returns NULL for anything else.
+    return f"CHECK (date({column}) IS {column})"
+
+
+# Dates are ISO text and money is integer minor units (normalize.MONEY_SCALE per rupee).
+TYPED_TABLES = {
+    "medicines": (f'''
+        CREATE TABLE {{table}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            batch_no TEXT,
+            mfg_date TEXT {_iso_date_check("mfg_date")},
+            expiry_date TEXT {_iso_date_check("expiry_date")},
+            quantity INTEGER,
+            price INTEGER,
+            demand INTEGER
+        ) {_table_options()}
+    ''', {"mfg_date": "date", "expiry_date": "date", "quantity": "int", "price": "money", "demand": "int"}),
+    "sales": (f'''
+        CREATE TABLE {{table}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER,
+            name TEXT,
+            quantity INTEGER,
+            price INTEGER,
+            subtotal INTEGER,
+            date TEXT {_iso_date_check("date")},
+            invoice_id TEXT
+        ) {_table_options()}
+    ''', {"medicine_id": "int", "quantity": "int", "price": "money", "subtotal": "money", "date": "date"}),
+    "returns": (f'''
+        CREATE TABLE {{table}} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER,
+            name TEXT,
+            quantity INTEGER,
+            price INTEGER,
+            refund_amount INTEGER,
+            date TEXT {_iso_date_check("date")},
+            invoice_id TEXT
+        ) {_table_options()}
+    ''', {"medicine_id": "int", "quantity": "int", "price": "money", "refund_amount": "money", "date": "date"}),
+    "receipts": (f'''
+        CREATE TABLE {{table}} (
+            invoice_id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            total INTEGER,
+            body BLOB NOT NULL
+        ) {_table_options("WITHOUT ROWID")}
+    ''', {"total": "money"}),
+}
+
+# Per kind: the SQL test for a value that converts without repair, and that conversion.
+# ROUND() goes half away from zero, as normalize.to_minor() does.
+_WELL_FORMED = {
+    "date": lambda c: f"date({c}) IS {c}",
+    "int": lambda c: f"({c} IS NULL OR CAST(CAST({c} AS INTEGER) AS TEXT) = CAST({c} AS TEXT))",
+    "money": lambda c: f"typeof({c}) IN ('integer', 'real', 'null')",
+}
+_CONVERT = {
+    "date": lambda c: c,
+    "int": lambda c: f"CAST({c} AS INTEGER)",
+    "money": lambda c: f"CAST(ROUND({c} * {MONEY_SCALE}) AS INTEGER)",
+}
+
+TYPED_SALES_DAILY = f'''
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        date TEXT NOT NULL,
+        medicine_id INTEGER NOT NULL,
+        name TEXT,
+        qty_sold INTEGER NOT NULL,
+        qty_returned INTEGER NOT NULL,
+        gross_amount INTEGER NOT NULL,
+        refund_amount INTEGER NOT NULL,
+        PRIMARY KEY (date, medicine_id)
+    ) {_table_options("WITHOUT ROWID")}
+'''
+
+GRID_SORT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_medicines_name_nocase ON medicines(name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_batch ON medicines(batch_no COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_mfg_date ON medicines(mfg_date)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_expiry_date ON medicines(expiry_date)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_quantity ON medicines(quantity)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_price ON medicines(price)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_demand ON medicines(demand)",
+)
+
+
+def _retype_table(conn, table, ddl, kinds, batch_size=1000):
+    # Copy table into its typed twin: well-formed rows in one INSERT ... SELECT,
+    # the rest through normalize.repair_rows(). Row ids are kept.
+    columns = _column_names(conn, table)
+    typed = f"{table}_typed"
+    conn.execute(ddl.format(table=typed))
+    column_list = ", ".join(columns)
+    well_formed = " AND ".join(_WELL_FORMED[kind](column) for column, kind in kinds.items())
+    converted = ", ".join(_CONVERT[kinds[column]](column) if column in kinds else column for column in columns)
+    conn.execute(f"INSERT INTO {typed} ({column_list}) SELECT {converted} FROM {table} WHERE {well_formed}")
+
+    insert = f"INSERT INTO {typed} ({column_list}) VALUES ({', '.join('?' * len(columns))})"
+    cursor = conn.execute(f"SELECT {column_list} FROM {table} WHERE NOT ({well_formed})")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        conn.executemany(insert, repair_rows(conn, table, columns, rows, kinds))
+
+    # AUTOINCREMENT must not hand out ids of deleted rows that history still refers to.
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() \
+        if "AUTOINCREMENT" in ddl else None
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {typed} RENAME TO {table}")
+    if sequence:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+        conn.execute('''
+            INSERT INTO sqlite_sequence (name, seq) SELECT ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        ''', (table, sequence[0], table))
+
+
+def _typed_storage(conn):
+    # Rebuild the data tables as STRICT tables with CHECKed ISO dates, integer
+    # money and an integer demand, repairing legacy values on the way.
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS legacy_fixes (
+            id INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            old_value TEXT,
+            new_value TEXT
+        ) {_table_options()}
+    ''')
+
+    # Everything that names the rebuilt tables goes first, or the renames fail;
+    # open holds are put back afterwards.
+    has_search_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'medicines_fts'").fetchone()
+    holds = conn.execute("SELECT cart_id, medicine_id, quantity, expires_at FROM stock_reservations").fetchall()
+    conn.execute("DELETE FROM stock_reservations")
+    conn.execute("DROP VIEW IF EXISTS stock_available")
+    for name in (*SEARCH_INDEX_TRIGGERS, *INVENTORY_STATS_TRIGGERS, *SALES_DAILY_TRIGGERS):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS sales_daily")
+
+    for table, (ddl, kinds) in TYPED_TABLES.items():
+        _retype_table(conn, table, ddl, kinds)
+
+    _report_indexes(conn)
+    for ddl in GRID_SORT_INDEXES:
+        conn.execute(ddl)
+    _expiry_status_indexes(conn)
+    _fefo_index(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_receipts_created ON receipts (created_at)")
+
+    if has_search_index:
+        for ddl in SEARCH_INDEX_TRIGGERS.values():
+            conn.execute(ddl)
+    for ddl in INVENTORY_STATS_TRIGGERS.values():
+        conn.execute(ddl)
+    # Expiry buckets are recounted on the next read; repaired dates may have moved rows between them.
+    conn.execute('''
+        UPDATE inventory_stats SET
+            total = (SELECT COUNT(*) FROM medicines),
+            low_stock = (SELECT COUNT(*) FROM medicines WHERE quantity < low_stock_threshold),
+            as_of = NULL
+        WHERE id = 1
+    ''')
+
+    conn.execute(TYPED_SALES_DAILY)
+    rebuild_sales_daily(conn)
+    for ddl in SALES_DAILY_TRIGGERS.values():
+        conn.execute(ddl)
+
+    conn.execute(STOCK_AVAILABLE_VIEW)
+    conn.executemany(
+        "INSERT INTO stock_reservations (cart_id, medicine_id, quantity, expires_at) VALUES (?, ?, ?, ?)", holds
+    )
+
+
+MIGRATIONS = [
+    (1, _initial_schema),
+    (2, _report_indexes),
+    (3, _medicine_search_index),
+    (4, _grid_sort_indexes),
+    (5, _expiry_status_indexes),
+    (6, _inventory_stats),
+    (7, _sales_daily_rollup),
+    (8, _stock_reservations),
+    (9, _invoice_sequence),
+    (10, _receipt_journal),
+    (11, _fefo_index),
+    (12, _typed_storage),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Apply pending migrations on a connection inside an open write transaction.
+
+    Returns the list of versions that were applied.
+    """
+    current = schema_version(conn)
+    applied = []
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        migrate(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+
+    if applied:
+        # Refresh planner statistics so new indexes are picked up immediately.
+        conn.execute("ANALYZE")
+    return applied
@@ -0,0 +1,212 @@
+"""Typed values for the STRICT tables, and the repair of legacy rows.
+
+Dates are stored as ISO YYYY-MM-DD text (CHECKed by the tables) and money
+as integer minor units (paisa), so comparisons, sorts and sums are native
+SQLite operations. to_minor() and iso_date() are the strict converters
+db_handler applies on every write.
+
+Databases from before migration 12 may hold free-form dates ("07/03/2025",
+"03-2026"), prices typed as text ("Rs. 12.50") or a blank demand. Migration
+12 copies well-formed rows across in bulk. The legacy_* parsers repair the
+rest row by row. A value that cannot be repaired is stored as NULL. Every
+repair is recorded in the legacy_fixes table.
+
+    python -m database.normalize [--db PATH] [--dry-run] [--limit 50]
+
+reports those repairs; --dry-run runs the migration on an in-memory copy
+of the database first, leaving the file untouched.
+"""
+import argparse
+import calendar
+import re
+import sqlite3
+import sys
+from collections import Counter
+from datetime import date, datetime
+
+MONEY_SCALE = 100   # minor units per rupee
+
+# Day-first like the rest of the shop's paperwork; tried in order.
+LEGACY_DATE_FORMATS = (
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d",
+    "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y",
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y",
+)
+# Month-only dates as printed on packs ("03/2026", "2026-03", "Mar 2026") mean the end of that month.
+LEGACY_MONTH_FORMATS = ("%m/%Y", "%m-%Y", "%Y-%m", "%Y/%m", "%b %Y", "%B %Y", "%b-%Y")
+_CURRENCY = re.compile(r"^(?:rs\.?|pkr|₨)\s*|\s*(?:rs\.?|pkr|₨)$|,", re.I)
+
+# ---------------- Strict Converters ---------------- #
+
+def to_minor(amount):
+    """Rupees (number or numeric string) -> integer minor units; None stays None.
+
+    Rounds half away from zero, like SQLite's ROUND(), so migrated and newly
+    written amounts agree.
+    """
+    if amount is None or amount == "":
+        return None
+    scaled = float(amount) * MONEY_SCALE
+    return int(scaled + 0.5) if scaled >= 0 else -int(0.5 - scaled)
+
+
+def iso_date(value, field="date"):
+    """Check a YYYY-MM-DD date for storage; blank is None, anything else raises ValueError."""
+    if value is None or value == "":
+        return None
+    try:
+        if date.fromisoformat(value).isoformat() == value:
+            return value
+    except (TypeError, ValueError):
+        pass
+    raise ValueError(f"{field} must be a YYYY-MM-DD date, got {value!r}.")
+
+
+def to_int(value, field="value"):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number, got {value!r}.") from None
+    if number != int(number):
+        raise ValueError(f"{field} must be a whole number, got {value!r}.")
+    return int(number)
+
+# ---------------- Legacy Parsers ---------------- #
+
+def legacy_date(value):
+    # Best-effort ISO date for a legacy value, or None.
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    if len(text) > 10 and text[10] in " T":
+        text = text[:10]   # a timestamp; keep the day
+    for fmt in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    for fmt in LEGACY_MONTH_FORMATS:
+        try:
+            first = datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+        return first.replace(day=calendar.monthrange(first.year, first.month)[1]).isoformat()
+    return None
+
+
+def legacy_money(value):
+    # Minor units for a legacy amount ("12.5", "Rs. 1,250", 12.499999), or None.
+    if isinstance(value, str):
+        value = _CURRENCY.sub("", value.strip())
+    try:
+        return to_minor(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def legacy_int(value):
+    try:
+        return to_int(value.strip() if isinstance(value, str) else value)
+    except ValueError:
+        return None
+
+# ---------------- Batch Validator ---------------- #
+
+def _is_conversion(kind, old, new):
+    # True when new is just old in its stored type rather than a repaired value.
+    if kind == "date":
+        return new == old
+    if kind == "int":
+        return new is not None and str(new) == str(old).strip()
+    return isinstance(old, (int, float))
+
+
+def repair_rows(conn, table, columns, rows, kinds):
+    """Repair legacy rows of table; returns them ready for the typed table.
+
+    rows are tuples in `columns` order, the row id first. kinds maps a
+    column name to "date", "money" or "int"; other columns pass through.
+    Every repaired or cleared value is logged to legacy_fixes.
+    """
+    parsers = {"date": legacy_date, "money": legacy_money, "int": legacy_int}
+    positions = [(columns.index(column), column, kind) for column, kind in kinds.items()]
+    fixed_rows = []
+    fixes = []
+    for row in rows:
+        fixed = list(row)
+        for position, column, kind in positions:
+            old = row[position]
+            new = fixed[position] = parsers[kind](old)
+            if old is not None and old != "" and not _is_conversion(kind, old, new):
+                fixes.append((table, row[0], column, str(old), None if new is None else str(new)))
+        fixed_rows.append(tuple(fixed))
+    conn.executemany(
+        "INSERT INTO legacy_fixes (table_name, row_id, column_name, old_value, new_value) VALUES (?, ?, ?, ?, ?)",
+        fixes
+    )
+    return fixed_rows
+
+# ---------------- Report ---------------- #
+
+def fix_report(conn, limit=50):
+    """(counts per (table, column, repaired?), the first `limit` fixes)."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'legacy_fixes'").fetchone():
+        return Counter(), []
+    counts = Counter()
+    for table, column, repaired, n in conn.execute('''
+        SELECT table_name, column_name, new_value IS NOT NULL, COUNT(*)
+        FROM legacy_fixes GROUP BY 1, 2, 3
+    '''):
+        counts[(table, column, bool(repaired))] = n
+    sample = conn.execute(
+        "SELECT table_name, row_id, column_name, old_value, new_value FROM legacy_fixes ORDER BY id LIMIT ?",
+        (limit,)
+    ).fetchall()
+    return counts, sample
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report legacy values repaired by the typed-storage migration.")
+    parser.add_argument("--db", help="database file (default: the app's pharmacy.db)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="migrate an in-memory copy and report what would be repaired")
+    parser.add_argument("--limit", type=int, default=50, help="individual repairs to list")
+    args = parser.parse_args(argv)
+
+    from database import db_handler
+    from database.migrations import apply_migrations
+    path = args.db or db_handler.DB_PATH
+
+    if args.dry_run:
+        conn = sqlite3.connect(":memory:", isolation_level=None)
+        source = sqlite3.connect(path)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        conn.execute("BEGIN IMMEDIATE")
+        applied = apply_migrations(conn)
+        conn.execute("COMMIT")
+        print(f"🔎 Dry run: would apply migrations {applied or 'none'}")
+    else:
+        db_handler.set_database_path(path)
+        db_handler.create_table()
+        conn = db_handler.read_connection()
+
+    counts, sample = fix_report(conn, args.limit)
+    if not counts:
+        print("✅ No legacy values needed repair")
+        return 0
+    for (table, column, repaired), n in sorted(counts.items()):
+        print(f"{'🔧 repaired' if repaired else '⚠️ cleared '} {n:>8,}  {table}.{column}")
+    for table, row_id, column, old, new in sample:
+        print(f"    {table}#{row_id}.{column}: {old!r} -> {new!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
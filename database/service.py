@@ -0,0 +1,365 @@
+"""Local service mode: one process owns the database and several tills share it.
+
+    python -m database.service [--listen 127.0.0.1:8765 | --listen unix:/path/to.sock] [--db PATH]
+
+The protocol is one JSON object per line: {"id", "op", "args", "kwargs"} in,
+{"id", "result"} or {"id", "error"} out. READ_OPS run concurrently on a
+thread pool, each thread with its own reader connection. WRITE_OPS are
+queued to a single writer task, which commits whatever has queued up as
+one transaction with a savepoint per operation, so a rejected checkout
+rolls back alone while the others in its group still commit.
+
+The GUI becomes a thin client with `python main.py --connect ADDRESS`:
+use_service() swaps the db_handler functions named in SERVICE_OPS for
+calls to the service. The inventory grid keeps reading the same file
+through its own WAL readers, which are opened read-only so that any
+write missing from WRITE_OPS raises instead of bypassing the writer.
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import db_handler, tracing
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+READ_WORKERS = 4
+MAX_GROUP = 64                  # writes committed together at most
+STREAM_LIMIT = 16 * 1024 * 1024   # longest request or response line
+
+READ_OPS = (
+    "search_medicine", "fetch_medicines_by_ids", "fetch_available_quantities", "fetch_fefo_allocation",
+    "fetch_sales_by_invoice", "fetch_returns_by_invoice",
+    "fetch_returnable_lines", "fetch_sales_with_remaining_qty",
+    "fetch_sales_report_page", "fetch_sales_report_totals",
+    "fetch_daily_sales_totals", "fetch_top_sellers",
+    "fetch_receipt", "fetch_receipts_between",
+)
+WRITE_OPS = (
+    "commit_sale", "commit_return", "allocate_invoice_id", "journal_receipts",
+    "reserve_stock", "reserve_product", "extend_reservations", "release_stock",
+    "insert_medicine", "bulk_insert_medicines", "update_medicine_by_id", "delete_medicine_by_id",
+    "update_medicine", "delete_medicine", "insert_sale_record", "insert_return_record",
+    "recount_inventory_stats",  # only when the day or window changes; tills read the counters themselves
+    "expire_reservations", "rebuild_sales_rollup",
+)
+SERVICE_OPS = READ_OPS + WRITE_OPS
+
+# Exceptions rebuilt on the client, with the attributes passed back to their constructor.
+REMOTE_ERRORS = {
+    "InsufficientStockError": (db_handler.InsufficientStockError, ("medicine_id", "name", "requested")),
+    "ReturnQuantityError": (db_handler.ReturnQuantityError, ("medicine_id", "name", "requested", "remaining")),
+}
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceUnavailable(ServiceError):
+    pass
+
+# ---------------- Protocol ---------------- #
+
+def parse_address(address):
+    # "host:port", ":port" or "unix:/path/to/socket"
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or DEFAULT_HOST, int(port or DEFAULT_PORT))
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def error_payload(error):
+    name = type(error).__name__
+    if name in REMOTE_ERRORS:
+        return {"type": name, "fields": [getattr(error, field) for field in REMOTE_ERRORS[name][1]]}
+    return {"type": name, "message": str(error)}
+
+
+def _rebuild_error(payload):
+    name = payload["type"]
+    if name in REMOTE_ERRORS:
+        return REMOTE_ERRORS[name][0](*payload["fields"])
+    if name == "ValueError":
+        return ValueError(payload["message"])
+    return ServiceError(f"{name}: {payload['message']}")
+
+
+def _from_json(value):
+    # JSON turns row tuples into lists and id keys into strings; undo both.
+    if isinstance(value, dict):
+        return {int(key) if key.isdigit() else key: item for key, item in value.items()}
+    if isinstance(value, list) and value:
+        if all(isinstance(item, list) for item in value):
+            return [tuple(item) for item in value]
+        if not any(isinstance(item, (list, dict)) for item in value):
+            return tuple(value)
+    return value
+
+
+def unpack(response):
+    """Result of a decoded response, or raise the error it carries."""
+    if "error" in response:
+        raise _rebuild_error(response["error"])
+    return _from_json(response["result"])
+
+# ---------------- Server ---------------- #
+
+def _run_group(ops):
+    # Runs on the writer thread: one transaction for the group, a savepoint per operation.
+    outcomes = []
+    try:
+        with db_handler.transaction() as conn:
+            for op, args, kwargs in ops:
+                conn.execute("SAVEPOINT service_op")
+                try:
+                    outcomes.append((True, getattr(db_handler, op)(*args, **kwargs)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO service_op")
+                    outcomes.append((False, e))
+                conn.execute("RELEASE service_op")
+    except Exception as e:
+        return [(False, e)] * len(ops)
+    return outcomes
+
+
+class PharmacyService:
+    def __init__(self, read_workers=READ_WORKERS, max_group=MAX_GROUP):
+        self.read_workers = read_workers
+        self.max_group = max_group
+        self.stats = {"reads": 0, "writes": 0, "groups": 0, "clients": 0}
+        self._server = None
+        self._reads = None
+        self._write_thread = None
+        self._writes = None
+        self._writer_task = None
+
+    async def start(self, address):
+        self._reads = ThreadPoolExecutor(self.read_workers, thread_name_prefix="service-read")
+        self._write_thread = ThreadPoolExecutor(1, thread_name_prefix="service-write")
+        self._writes = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._write_loop())
+        kind, target = parse_address(address)
+        if kind == "unix":
+            self._server = await asyncio.start_unix_server(self._serve_client, target, limit=STREAM_LIMIT)
+        else:
+            self._server = await asyncio.start_server(self._serve_client, *target, limit=STREAM_LIMIT)
+        return self.address
+
+    @property
+    def address(self):
+        name = self._server.sockets[0].getsockname()
+        if isinstance(name, str):
+            return f"unix:{name}"
+        return f"{name[0]}:{name[1]}"
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._writer_task.cancel()
+        self._reads.shutdown(wait=True)
+        self._write_thread.shutdown(wait=True)
+
+    async def call(self, op, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if op == "ping":
+            return "pong"
+        if op == "stats":
+            return {**self.stats, "sweeper": dict(db_handler.sweeper_stats)}
+        loop = asyncio.get_running_loop()
+        if op in READ_OPS:
+            self.stats["reads"] += 1
+            func = getattr(db_handler, op)
+            return await loop.run_in_executor(self._reads, functools.partial(func, *args, **kwargs))
+        if op in WRITE_OPS:
+            done = loop.create_future()
+            await self._writes.put((op, args, kwargs, done))
+            return await done
+        raise LookupError(f"Unknown operation '{op}'.")
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._writes.get()]
+            while len(group) < self.max_group and not self._writes.empty():
+                group.append(self._writes.get_nowait())
+            outcomes = await loop.run_in_executor(
+                self._write_thread, _run_group, [(op, args, kwargs) for op, args, kwargs, _ in group]
+            )
+            self.stats["writes"] += len(group)
+            self.stats["groups"] += 1
+            for (*_, done), (ok, value) in zip(group, outcomes):
+                if done.cancelled():
+                    continue
+                if ok:
+                    done.set_result(value)
+                else:
+                    done.set_exception(value)
+
+    async def _answer(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            result = await self.call(request["op"], request.get("args", []), request.get("kwargs"))
+            data = encode({"id": request_id, "result": result})
+        except Exception as e:
+            data = encode({"id": request_id, "error": error_payload(e)})
+        try:
+            writer.write(data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _serve_client(self, reader, writer):
+        # Requests on one connection may be pipelined; responses carry the request id.
+        self.stats["clients"] += 1
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                task = asyncio.create_task(self._answer(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self.stats["clients"] -= 1
+            writer.close()
+
+
+async def serve(address, read_workers=READ_WORKERS):
+    service = PharmacyService(read_workers)
+    await service.start(address)
+    print(f"✅ MediTrack service listening on {service.address}", flush=True)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+# ---------------- Client ---------------- #
+
+class ServiceClient:
+    """Blocking client for the GUI: one connection, one request at a time.
+
+    A dropped connection is reopened on the next call; the failed call itself
+    is not retried, since a write may already have committed.
+    """
+
+    def __init__(self, address, timeout=30):
+        self.address = address
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _connect(self):
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+        else:
+            sock = socket.create_connection(target, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+    def call(self, op, *args, **kwargs):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(encode({"id": next(self._ids), "op": op, "args": args, "kwargs": kwargs}))
+                line = self._file.readline()
+            except OSError as e:
+                self.close()
+                raise ServiceUnavailable(f"MediTrack service at {self.address} is unreachable: {e}") from e
+            if not line:
+                self.close()
+                raise ServiceUnavailable(f"MediTrack service at {self.address} closed the connection.")
+        return unpack(json.loads(line))
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+
+_client = None
+
+
+def _remote(op, client):
+    @functools.wraps(getattr(db_handler, op))
+    def call(*args, **kwargs):
+        return client.call(op, *args, **kwargs)
+    # Traced like the local function it replaces, so --trace --connect records tills' calls.
+    return tracing.traced(op, call)
+
+
+def use_service(address):
+    """Route the db_handler functions in SERVICE_OPS through the service at address.
+
+    Must run before the GUI modules import them by name.
+    """
+    global _client
+    _client = ServiceClient(address)
+    _client.call("ping")  # fail at start-up rather than at the first checkout
+    for op in SERVICE_OPS:
+        setattr(db_handler, op, _remote(op, _client))
+    db_handler.set_read_only()
+    return _client
+
+
+def remote_address():
+    return _client.address if _client else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the MediTrack database to several tills.")
+    parser.add_argument("--listen", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}",
+                        help="HOST:PORT or unix:/path/to/socket (default %(default)s)")
+    parser.add_argument("--db", help="database file (default: the app's pharmacy.db)")
+    parser.add_argument("--read-workers", type=int, default=READ_WORKERS)
+    parser.add_argument("--no-backup", action="store_true", help="skip the daily backup")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db_handler.set_database_path(args.db)
+    db_handler.create_table()
+    db_handler.start_reservation_sweeper()
+    if not args.no_backup:
+        from database.backup import start_daily_backup
+        start_daily_backup()
+    try:
+        asyncio.run(serve(args.listen, args.read_workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
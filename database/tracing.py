@@ -0,0 +1,285 @@
+"""Opt-in timing of every public db_handler call.
+
+db_handler passes its namespace to instrument() at import time, which wraps
+each public function once. While tracing is disabled a wrapper costs one
+flag check; enable() switches on:
+  - wall time, rows returned (list results and batched generators) and
+    time spent waiting for the shared writer, per function, kept as a
+    rolling window of recent calls
+  - SQL capture through sqlite3's set_trace_callback; calls slower than
+    slow_ms are logged with their statements and the EXPLAIN QUERY PLAN
+    of the slowest one
+
+snapshot() summarises everything as plain data and dump_json() writes it
+out; gui/diagnostics_gui.py shows the same data live.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+
+ROLLING_SAMPLES = 1000       # recent calls kept per function
+SLOW_LOG_SIZE = 50
+DEFAULT_SLOW_MS = 50.0
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+PLANNED_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+# Plumbing and pure SQL builders; tracing them would only add noise.
+UNTRACED = {
+    "read_connection", "transaction", "get_connection", "set_database_path",
+    "add_change_listener", "remove_change_listener", "data_change_token",
+    "explain_query_plan", "build_medicine_filter", "build_medicine_query",
+    "start_reservation_sweeper", "invoice_prefix", "offline_invoice_id",
+}
+
+_enabled = False
+_slow_ms = DEFAULT_SLOW_MS
+_lock = threading.Lock()
+_local = threading.local()    # .frames: stack of calls in progress on this thread
+_samples = {}                 # function name -> deque of (ms, rows, wait_ms)
+_calls = {}                   # function name -> lifetime call count
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_started = None
+
+
+class _Frame:
+    __slots__ = ("name", "args", "start", "wait", "statements")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = time.perf_counter()
+        self.wait = 0.0
+        self.statements = []   # (perf_counter at start, sql)
+
+
+def _frames():
+    frames = getattr(_local, "frames", None)
+    if frames is None:
+        frames = _local.frames = []
+    return frames
+
+# ---------------- Hooks ---------------- #
+
+def _on_statement(sql):
+    frames = getattr(_local, "frames", None)
+    # Trigger bodies are reported as "-- ..." comments; they run inside their statement.
+    if frames and not sql.startswith("--"):
+        statements = frames[-1].statements
+        # Trigger programs can re-report their parent statement; keep the first.
+        if not statements or statements[-1][1] != sql:
+            statements.append((time.perf_counter(), sql))
+
+
+def _on_wait(seconds):
+    frames = getattr(_local, "frames", None)
+    if frames:
+        frames[-1].wait += seconds
+
+
+def _row_count(result):
+    return len(result) if isinstance(result, list) else None
+
+
+def _finish(frame, rows):
+    end = time.perf_counter()
+    elapsed_ms = (end - frame.start) * 1000
+    with _lock:
+        samples = _samples.get(frame.name)
+        if samples is None:
+            samples = _samples[frame.name] = deque(maxlen=ROLLING_SAMPLES)
+        samples.append((elapsed_ms, rows, frame.wait * 1000))
+        _calls[frame.name] = _calls.get(frame.name, 0) + 1
+    if elapsed_ms >= _slow_ms:
+        _log_slow(frame, elapsed_ms, end)
+
+
+def _log_slow(frame, elapsed_ms, end):
+    # Statement time is approximated by the gap to the next statement (or the
+    # end of the call), which includes fetching its rows.
+    statements = []
+    for i, (started, sql) in enumerate(frame.statements):
+        finished = frame.statements[i + 1][0] if i + 1 < len(frame.statements) else end
+        statements.append({"sql": sql.strip(), "ms": round((finished - started) * 1000, 3)})
+    slowest = max(statements, key=lambda s: s["ms"], default=None)
+    if slowest and slowest["sql"].lstrip().upper().startswith(PLANNED_PREFIXES):
+        slowest["plan"] = _explain(slowest["sql"])
+    with _lock:
+        _slow.append({
+            "function": frame.name,
+            "args": frame.args,
+            "ms": round(elapsed_ms, 3),
+            "wait_ms": round(frame.wait * 1000, 3),
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "statements": statements,
+        })
+
+
+def _explain(sql):
+    from database import db_handler
+    conn = db_handler.get_connection()
+    try:
+        conn.set_trace_callback(None)
+        return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    except Exception as e:  # e.g. the statement referenced a temp table
+        return [f"(plan unavailable: {e})"]
+    finally:
+        conn.close()
+
+# ---------------- Instrumentation ---------------- #
+
+def _describe_args(args, kwargs):
+    text = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+    return text if len(text) <= 200 else text[:197] + "..."
+
+
+def _trace(name, func):
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if not _enabled:
+                yield from func(*args, **kwargs)
+                return
+            frame = _Frame(name, _describe_args(args, kwargs))
+            frames = _frames()
+            iterator = func(*args, **kwargs)
+            rows = 0
+            try:
+                while True:
+                    frames.append(frame)
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        frames.pop()
+                    rows += len(item) if isinstance(item, list) else 1
+                    # Time spent in the consumer between batches is not the query's.
+                    paused = time.perf_counter()
+                    yield item
+                    frame.start += time.perf_counter() - paused
+            finally:
+                iterator.close()
+                _finish(frame, rows)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        frames = _frames()
+        frame = _Frame(name, _describe_args(args, kwargs))
+        frames.append(frame)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            frames.pop()
+        _finish(frame, _row_count(result))
+        return result
+    return wrapper
+
+
+def instrument(namespace):
+    """Wrap the public functions defined in a module namespace (db_handler's globals())."""
+    module = namespace["__name__"]
+    for name, obj in list(namespace.items()):
+        if (inspect.isfunction(obj) and obj.__module__ == module
+                and not name.startswith("_") and name not in UNTRACED):
+            namespace[name] = _trace(name, obj)
+
+
+def traced(name, func):
+    # Wrap a function installed after import, as use_service() does with its remote calls.
+    return _trace(name, func)
+
+# ---------------- Control ---------------- #
+
+def _install(callback, wait_callback):
+    from database import db_handler
+    manager = db_handler._manager
+    manager.on_statement = callback
+    manager.on_wait = wait_callback
+    with manager._registry_lock:
+        for conn in manager._connections:
+            conn.set_trace_callback(callback)
+
+
+def enable(slow_ms=DEFAULT_SLOW_MS):
+    global _enabled, _slow_ms, _started
+    _slow_ms = slow_ms
+    _install(_on_statement, _on_wait)
+    if _started is None:
+        _started = time.time()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    _install(None, None)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    global _started
+    with _lock:
+        _samples.clear()
+        _calls.clear()
+        _slow.clear()
+        _started = time.time() if _enabled else None
+
+# ---------------- Reporting ---------------- #
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _histogram(times):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for ms in times:
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f"<={bound}" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+    return dict(zip(labels, counts))
+
+
+def snapshot():
+    """Per-function statistics over the rolling window, slowest total first, plus the slow log."""
+    with _lock:
+        samples = {name: list(window) for name, window in _samples.items()}
+        calls = dict(_calls)
+        slow = list(_slow)
+    functions = []
+    for name, window in samples.items():
+        times = sorted(ms for ms, _, _ in window)
+        rows = [r for _, r, _ in window if r is not None]
+        functions.append({
+            "function": name,
+            "calls": calls[name],
+            "window": len(window),
+            "total_ms": round(sum(times), 3),
+            "p50_ms": round(_percentile(times, 0.5), 3),
+            "p95_ms": round(_percentile(times, 0.95), 3),
+            "max_ms": round(times[-1], 3),
+            "avg_rows": round(sum(rows) / len(rows), 1) if rows else None,
+            "wait_ms": round(sum(w for _, _, w in window), 3),
+            "histogram": _histogram(times),
+        })
+    functions.sort(key=lambda f: f["total_ms"], reverse=True)
+    return {"enabled": _enabled, "since": _started, "slow_ms": _slow_ms,
+            "functions": functions, "slow_calls": slow}
+
+
+def dump_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    return path
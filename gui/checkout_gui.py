@@ -2,67 +2,37 @@ import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, Listbox
 from tkinter import ttk
-import datetime
-import os
-
-from database.db_handler import fetch_all_medicines, update_medicine_by_id, insert_sale_record
+import uuid
+
+from database.db_handler import (
+    RESERVATION_TTL,
+    InsufficientStockError,
+    commit_sale,
+    extend_reservations,
+    fetch_available_quantities,
+    invoice_prefix,
+    release_stock,
+    reserve_product,
+)
+from database.inventory_cache import get_inventory_cache
+from utils.receipts import get_spooler, render_receipt
 
 cart = []
-selected_medicine = None
+selected_product = None  # medicine name; checkout draws from its batches first-expiry-first-out
 checkout_window_ref = None  # ✅ Global tracker
-
-def generate_receipt_text(items, total, cash, change, invoice_id):
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    receipt_width = 42  # Adjust this as needed
-
-    lines = []
-    lines.append(" " * ((receipt_width - len("PHARMACY RECEIPT")) // 2) + "PHARMACY RECEIPT")
-
-    # Split address if it's too long
-    address = "Shop No. 9, Shangrila Tower, Block 13, Gulistan-e-Johar Karachi, Pakistan"
-    address_lines = [
-        "Shop No. 9, Shangrila Tower, Block 13",
-        "Gulistan-e-Johar, Karachi, Pakistan"
-    ]
-    for line in address_lines:
-        lines.append(" " * ((receipt_width - len(line)) // 2) + line)
-
-    lines.append("*" * receipt_width)
-    lines.append(" " * ((receipt_width - len("CASH RECEIPT")) // 2) + "CASH RECEIPT")
-    lines.append("*" * receipt_width)
-    lines.append(f"Date: {now}")
-    lines.append(f"Invoice ID: {invoice_id}")
-    lines.append("")
-    lines.append(f"{'Description':<25}{'Price':>14}")
-
-    for name, qty, price in items:
-        subtotal = qty * price
-        item_line = f"{name} x{qty}"
-        if len(item_line) > 25:
-            item_line = item_line[:22] + "..."
-        lines.append(f"{item_line:<25}{subtotal:>14.2f}")
-
-    lines.append("")
-    lines.append("*" * receipt_width)
-    lines.append(f"{'Total':<25}Rs. {total:>12.2f}")
-    lines.append(f"{'Cash':<25}Rs. {cash:>12.2f}")
-    lines.append(f"{'Change':<25}Rs. {change:>12.2f}")
-    lines.append("*" * receipt_width)
-    lines.append(" " * ((receipt_width - len("THANK YOU FOR VISITING!")) // 2) + "THANK YOU FOR VISITING!")
-    lines.append("*" * receipt_width)
-    
-
-    return "\n".join(lines)
+cart_id = None  # stock in the cart is held under this id until checkout or close
+KEEP_ALIVE_MS = RESERVATION_TTL * 1000 // 3
 
 def open_checkout_window(on_checkout_complete=None):
-    global selected_medicine, checkout_window_ref
+    global selected_product, checkout_window_ref, cart_id
     if checkout_window_ref and checkout_window_ref.winfo_exists():
         messagebox.showinfo("Window Already Open", "Checkout window is already open.")
         checkout_window_ref.lift()
         return
 
-    selected_medicine = None
+    selected_product = None
     cart.clear()
+    cart_id = uuid.uuid4().hex
 
     checkout_window_ref = tb.Toplevel()
     checkout_window_ref.title("Medicine Checkout")
@@ -70,6 +40,9 @@ def open_checkout_window(on_checkout_complete=None):
 
     def on_close():
         global checkout_window_ref
+        if cart:
+            release_stock(cart_id)
+            cart.clear()
         if checkout_window_ref is not None:
             checkout_window_ref.destroy()
             checkout_window_ref = None
@@ -91,27 +64,40 @@ def open_checkout_window(on_checkout_complete=None):
     result_box = Listbox(search_frame, height=6, font=("Segoe UI", 10))
     result_box.pack(fill="x", pady=8)
 
+    result_names = []
+
+    def sellable_batches(names):
+        # {name: unexpired batch rows in FEFO order}, and the unheld quantity of each batch.
+        cache = get_inventory_cache()
+        batches = {name: cache.fefo_batches(name) for name in names}
+        available = fetch_available_quantities([row[0] for rows in batches.values() for row in rows])
+        return batches, available
+
     def search():
         result_box.delete(0, "end")
+        result_names.clear()
         keyword = search_entry.get().lower()
-        for row in fetch_all_medicines():
-            name = row[1].lower()
-            if keyword in name:
-                result_box.insert("end", f"{row[0]} | {row[1]} | Qty: {row[5]} | Price: {row[6]}")
+        names = {}
+        for row in get_inventory_cache().search_names(keyword):
+            names.setdefault(row[1].lower(), row[1])
+        # One line per medicine; stock held by other open carts or past its expiry is not offered.
+        batches, available = sellable_batches(names.values())
+        for name in sorted(names.values(), key=str.lower):
+            rows = batches[name]
+            qty = sum(available.get(row[0], row[5]) for row in rows)
+            if rows:
+                result_box.insert("end", f"{name} | Qty: {qty} | Next expiry: {rows[0][4]} | Price: {rows[0][6]}")
+            else:
+                result_box.insert("end", f"{name} | No unexpired stock")
+            result_names.append(name)
 
     tb.Button(inner_search_frame, text="Search", command=search, bootstyle="primary").pack(side="left", padx=10)
 
     def on_select(event):
-        global selected_medicine
-        try:
-            selected = result_box.get(result_box.curselection())
-            selected_id = int(selected.split('|')[0].strip())
-            for row in fetch_all_medicines():
-                if row[0] == selected_id:
-                    selected_medicine = row
-                    break
-        except:
-            pass
+        global selected_product
+        selection = result_box.curselection()
+        if selection:
+            selected_product = result_names[selection[0]]
 
     result_box.bind("<<ListboxSelect>>", on_select)
 
@@ -138,23 +124,34 @@ def open_checkout_window(on_checkout_complete=None):
         total_label.config(text=f"Total: Rs. {total:.2f}")
 
     def add_to_cart():
-        if not selected_medicine:
+        if not selected_product:
             messagebox.showwarning("No Selection", "Please select a medicine.")
             return
         try:
             qty = int(qty_entry.get())
-            if qty <= 0 or qty > selected_medicine[5]:
+            if qty <= 0:
                 raise ValueError
-            subtotal = round(qty * selected_medicine[6], 2)
-            tree_id = cart_tree.insert("", "end", values=(selected_medicine[1], qty, selected_medicine[6], subtotal))
-            cart.append({
-                "id": selected_medicine[0],
-                "name": selected_medicine[1],
-                "price": selected_medicine[6],
-                "qty": qty,
-                "subtotal": subtotal,
-                "tree_id": tree_id
-            })
+            try:
+                # Held batch by batch, earliest expiry first; one cart line per batch.
+                lines = reserve_product(cart_id, selected_product, qty)
+            except InsufficientStockError:
+                batches, available = sellable_batches([selected_product])
+                sellable = sum(available.get(row[0], 0) for row in batches[selected_product])
+                messagebox.showerror("Insufficient Stock",
+                                     f"Only {sellable} more of '{selected_product}' available; "
+                                     "the rest is expired or held by other open carts.")
+                return
+            for med_id, name, batch_no, expiry_date, price, batch_qty in lines:
+                subtotal = round(batch_qty * price, 2)
+                tree_id = cart_tree.insert("", "end", values=(f"{name} ({batch_no})", batch_qty, price, subtotal))
+                cart.append({
+                    "id": med_id,
+                    "name": name,
+                    "price": price,
+                    "qty": batch_qty,
+                    "subtotal": subtotal,
+                    "tree_id": tree_id
+                })
             qty_entry.delete(0, "end")
             update_total()
         except:
@@ -172,6 +169,7 @@ def open_checkout_window(on_checkout_complete=None):
             cart_tree.delete(tree_id)
             for i, item in enumerate(cart):
                 if item.get("tree_id") == tree_id:
+                    release_stock(cart_id, item["id"], item["qty"])
                     del cart[i]
                     break
         update_total()
@@ -202,29 +200,20 @@ def open_checkout_window(on_checkout_complete=None):
                 if cash < total:
                     messagebox.showerror("Insufficient Cash", "Cash is less than total amount.")
                     return
-                change = round(cash - total, 2)
-                invoice_id = "INV-" + datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-                date_str = datetime.datetime.now().strftime('%Y-%m-%d')
-                items_summary = []
-
-                for item in cart:
-                    items_summary.append((item['name'], item['qty'], item['price']))
-                    med = next((m for m in fetch_all_medicines() if m[0] == item['id']), None)
-                    if med:
-                        updated_qty = med[5] - item['qty']
-                        update_medicine_by_id((med[1], med[2], med[3], med[4], updated_qty, med[6], med[7]), med[0])
-                    insert_sale_record((item['id'], item['name'], item['qty'], item['price'],
-                                        item['subtotal'], date_str, invoice_id))
-
-                receipt_text = generate_receipt_text(items_summary, total, cash, change, invoice_id)
-                file_path = os.path.expanduser(
-                    f"~/Documents/PharmacyData/receipt_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                )
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(receipt_text)
-
-                messagebox.showinfo("Checkout Successful", f"Receipt saved to:\n{file_path}")
+                try:
+                    # The invoice number is allocated inside the checkout transaction.
+                    change, invoice_id = commit_sale(cart, cash, cart_id=cart_id, prefix=invoice_prefix())
+                except InsufficientStockError as e:
+                    messagebox.showerror("Insufficient Stock", f"{e}\nNo items were sold; please adjust the cart.")
+                    return
+                items_summary = [(item['name'], item['qty'], item['price']) for item in cart]
+
+                receipt_text = render_receipt(items_summary, total, cash, change, invoice_id)
+                # Journaled (and printed, if a printer is configured) in the background.
+                get_spooler().submit(invoice_id, receipt_text, total)
+
+                messagebox.showinfo("Checkout Successful", f"Invoice {invoice_id} completed.\n"
+                                    "Reprint it any time from 🧾 Reprint Receipt.")
                 cart.clear()
                 cart_tree.delete(*cart_tree.get_children())
                 update_total()
@@ -244,3 +233,13 @@ def open_checkout_window(on_checkout_complete=None):
         tb.Button(cash_win, text="Confirm", command=confirm_cash, bootstyle="success").pack(pady=10)
 
     tb.Button(checkout_window_ref, text="Checkout & Print Slip", bootstyle="primary", command=checkout).pack(pady=15)
+
+    def keep_alive():
+        # An open window keeps its holds; an abandoned one lets them expire.
+        if checkout_window_ref is None or not checkout_window_ref.winfo_exists():
+            return
+        if cart:
+            extend_reservations(cart_id)
+        checkout_window_ref.after(KEEP_ALIVE_MS, keep_alive)
+
+    checkout_window_ref.after(KEEP_ALIVE_MS, keep_alive)
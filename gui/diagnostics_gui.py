@@ -0,0 +1,130 @@
+import ttkbootstrap as tb
+from tkinter import ttk, messagebox, filedialog
+
+from database import tracing
+
+REFRESH_MS = 2000
+
+diagnostics_window_ref = None
+
+
+def open_diagnostics_window():
+    # Live view of database/tracing.py: per-function latency and the slow-call log.
+    global diagnostics_window_ref
+    if diagnostics_window_ref and diagnostics_window_ref.winfo_exists():
+        diagnostics_window_ref.lift()
+        return
+
+    win = tb.Toplevel()
+    win.title("🩺 Database Diagnostics")
+    win.geometry("1000x650")
+    diagnostics_window_ref = win
+
+    def on_close():
+        global diagnostics_window_ref
+        win.destroy()
+        diagnostics_window_ref = None
+
+    win.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Controls
+    controls = tb.Frame(win, padding=10)
+    controls.pack(fill="x")
+
+    enabled_var = tb.BooleanVar(value=tracing.is_enabled())
+    slow_var = tb.StringVar(value=f"{tracing.snapshot()['slow_ms']:g}")
+
+    def toggle():
+        if enabled_var.get():
+            try:
+                slow_ms = float(slow_var.get())
+            except ValueError:
+                messagebox.showerror("Invalid Threshold", "Slow threshold must be a number of milliseconds.")
+                enabled_var.set(False)
+                return
+            tracing.enable(slow_ms)
+        else:
+            tracing.disable()
+        refresh()
+
+    tb.Checkbutton(controls, text="Tracing enabled", variable=enabled_var, command=toggle,
+                   bootstyle="success-round-toggle").pack(side="left")
+    tb.Label(controls, text="Slow call (ms):").pack(side="left", padx=(20, 5))
+    tb.Entry(controls, textvariable=slow_var, width=8).pack(side="left")
+
+    def export_json():
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")],
+                                            title="Save Diagnostics As")
+        if path:
+            tracing.dump_json(path)
+            messagebox.showinfo("Saved", f"Diagnostics saved to {path}")
+
+    def reset():
+        tracing.reset()
+        refresh()
+
+    tb.Button(controls, text="Export JSON", command=export_json, bootstyle="info").pack(side="right", padx=5)
+    tb.Button(controls, text="Reset", command=reset, bootstyle="secondary").pack(side="right", padx=5)
+
+    # Per-function statistics
+    columns = ("function", "calls", "p50_ms", "p95_ms", "max_ms", "total_ms", "avg_rows", "wait_ms")
+    functions_tree = ttk.Treeview(win, columns=columns, show="headings", height=12)
+    for col in columns:
+        functions_tree.heading(col, text=col.replace("_", " ").capitalize())
+        functions_tree.column(col, anchor="e" if col != "function" else "w", width=100)
+    functions_tree.column("function", width=260)
+    functions_tree.pack(fill="both", expand=True, padx=10)
+
+    # Slow calls and the statements behind the selected one
+    slow_frame = tb.Frame(win)
+    slow_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+    slow_columns = ("at", "function", "ms", "wait_ms")
+    slow_tree = ttk.Treeview(slow_frame, columns=slow_columns, show="headings", height=8)
+    for col in slow_columns:
+        slow_tree.heading(col, text=col.replace("_", " ").capitalize())
+        slow_tree.column(col, width=110)
+    slow_tree.column("function", width=220)
+    slow_tree.pack(side="left", fill="both", expand=True)
+
+    detail = tb.Text(slow_frame, width=60, height=10, wrap="word", font=("Consolas", 9))
+    detail.pack(side="right", fill="both", expand=True, padx=(10, 0))
+
+    slow_calls = []
+
+    def show_detail(event=None):
+        selected = slow_tree.selection()
+        detail.delete("1.0", "end")
+        if not selected:
+            return
+        call = slow_calls[int(selected[0])]
+        lines = [f"{call['function']}({call['args']})", f"{call['ms']} ms, waited {call['wait_ms']} ms", ""]
+        for statement in call["statements"]:
+            lines.append(f"[{statement['ms']} ms] {statement['sql']}")
+            for step in statement.get("plan", []):
+                lines.append(f"    ↳ {step}")
+        detail.insert("1.0", "\n".join(lines))
+
+    slow_tree.bind("<<TreeviewSelect>>", show_detail)
+
+    def refresh():
+        snapshot = tracing.snapshot()
+        functions_tree.delete(*functions_tree.get_children())
+        for stats in snapshot["functions"]:
+            functions_tree.insert("", "end", values=tuple(
+                "" if stats[col] is None else stats[col] for col in columns
+            ))
+        # Rebuilt only when the log changed, so a selected call stays selected.
+        if snapshot["slow_calls"] != slow_calls:
+            slow_calls[:] = snapshot["slow_calls"]
+            slow_tree.delete(*slow_tree.get_children())
+            for i, call in reversed(list(enumerate(slow_calls))):
+                slow_tree.insert("", "end", iid=str(i),
+                                 values=(call["at"], call["function"], call["ms"], call["wait_ms"]))
+
+    def auto_refresh():
+        if diagnostics_window_ref is win and win.winfo_exists():
+            refresh()
+            win.after(REFRESH_MS, auto_refresh)
+
+    auto_refresh()
@@ -1,21 +1,27 @@
 from database.db_handler import (
     insert_medicine,
-    fetch_all_medicines,
+    fetch_inventory_alert_counts,
+    fetch_medicines_filtered,
     delete_medicine_by_id,
     update_medicine_by_id,
-    search_medicine
+    search_medicine,
+    SEARCH_LIMIT
 )
-from utils.expiry_checker import check_expiry
+from gui.refresh_worker import RefreshWorker
+from gui.tree_sync import TreeReconciler
+from gui.virtual_grid import VirtualGrid
+from utils.expiry_checker import check_expiry, describe_expiry, describe_expiry_batch
 from tkinter import messagebox, filedialog
-import csv
-import threading
-import time
-from datetime import datetime
 
 REFRESH_INTERVAL = 4 * 60 * 60  # 4 hours
 LOW_STOCK_THRESHOLD = 10
+NEAR_EXPIRY_DAYS = 30
+MEDICINE_COLUMNS = 8  # id, name, batch_no, mfg_date, expiry_date, quantity, price, demand
 
 tree_widget = None
+tree_reconciler = None
+virtual_grid = None
+refresh_worker = None
 form_entries = None
 
 dashboards_labels = {
@@ -46,10 +52,15 @@ def set_dashboard_labels(lbl_total, lbl_expired, lbl_near_expiry, lbl_low_stock)
     dashboards_labels['low_stock'] = lbl_low_stock
 
 
-def set_tree(tree):
-    global tree_widget
+def set_tree(tree, scrollbar=None):
+    global tree_widget, tree_reconciler, virtual_grid
     tree_widget = tree
-    threading.Thread(target=auto_refresh, daemon=True).start()
+    tree_reconciler = TreeReconciler(tree)
+    if scrollbar is not None:
+        # The inventory is shown through the virtual grid; see load_data().
+        virtual_grid = VirtualGrid(tree, scrollbar, tree_reconciler, lambda row: tree_item(row)[:3],
+                                   near_days=NEAR_EXPIRY_DAYS)
+    start_refresh_worker()
 
 
 def set_entries(entries):
@@ -91,59 +102,6 @@ def reset_filters():
     load_data(show_popup=False)
 
 
-def apply_filters(rows):
-    filtered = []
-    for row in rows:
-        quantity = row[5]
-        price = row[6]
-        status_icon, _ = check_expiry(row[4])
-
-        if current_filters['min_quantity'] is not None and quantity < current_filters['min_quantity']:
-            continue
-        if current_filters['max_quantity'] is not None and quantity > current_filters['max_quantity']:
-            continue
-        if current_filters['min_price'] is not None and price < current_filters['min_price']:
-            continue
-        if current_filters['max_price'] is not None and price > current_filters['max_price']:
-            continue
-        if current_filters['status'] and current_filters['status'] not in status_icon:
-            continue
-
-        filtered.append(row)
-    return filtered
-
-
-def apply_sort(rows):
-    if not sort_column:
-        return rows
-
-    col_idx_map = {
-        "Name": 1,
-        "Batch": 2,
-        "Mfg Date": 3,
-        "Expiry Date": 4,
-        "Quantity": 5,
-        "Price": 6,
-        "Demand": 7
-    }
-    idx = col_idx_map.get(sort_column)
-    if idx is None:
-        return rows
-
-    def sort_key(row):
-        val = row[idx]
-        try:
-            if sort_column in ["Mfg Date", "Expiry Date"]:
-                return datetime.strptime(val, "%Y-%m-%d")
-            elif sort_column in ["Quantity", "Price", "Demand"]:
-                return float(val)
-            return val.lower() if isinstance(val, str) else val
-        except:
-            return float('-inf')
-
-    return sorted(rows, key=sort_key, reverse=sort_reverse)
-
-
 def add_medicine(entries):
     values = []
     for i, entry in enumerate(entries):
@@ -166,7 +124,11 @@ def add_medicine(entries):
         messagebox.showerror("Missing Fields", "Please fill in all required fields correctly.")
         return
 
-    insert_medicine(values)
+    try:
+        insert_medicine(values)
+    except ValueError as e:
+        messagebox.showerror("Invalid Input", str(e))
+        return
     messagebox.showinfo("Success", "Medicine added successfully.")
     load_data()
 
@@ -191,7 +153,12 @@ def edit_selected(entries):
         return
 
     med_id = selected[0]
-    if update_medicine_by_id(values, med_id):
+    try:
+        updated = update_medicine_by_id(values, med_id)
+    except ValueError as e:
+        messagebox.showerror("Input Error", str(e))
+        return
+    if updated:
         messagebox.showinfo("Updated", f"Medicine ID {med_id} has been updated.")
         for e in entries:
             e.delete(0, 'end')
@@ -225,28 +192,47 @@ def search_medicines(query):
         load_data(show_popup=False)
         return
 
-    results = search_medicine(query)
-    tree_widget.delete(*tree_widget.get_children())
+    # Results arrive best match first and capped at SEARCH_LIMIT rows.
+    results = search_medicine(query, limit=SEARCH_LIMIT)
+    if virtual_grid:
+        virtual_grid.deactivate()
+    tree_reconciler.reconcile(tree_items(results))
 
     if not results:
         messagebox.showinfo("Search", "No matching medicines found.")
         return
+    if len(results) == SEARCH_LIMIT and tooltip_var is not None:
+        tooltip_var.set(f"Showing the {SEARCH_LIMIT} best matches; refine the search to narrow it down.")
+
+
+def tree_items(rows):
+    # Grid items for plain medicines rows, with their expiry classified in one batch.
+    expiries = describe_expiry_batch([row[4] for row in rows], near_days=NEAR_EXPIRY_DAYS)
+    return [tree_item(row, expiry)[:3] for row, expiry in zip(rows, expiries)]
+
 
-    for row in results:
-        med_id = row[0]
-        status_icon, days_info = check_expiry(row[4])
-        status = f"{status_icon} ({days_info})"
-        tags = []
+def tree_item(row, expiry=None):
+    # (iid, values, tags, status_icon) for one row as shown in the main grid. Grid
+    # query rows carry days_remaining and expiry_status after the medicines columns;
+    # `expiry` is an already computed (status_icon, days_info) for plain rows.
+    if len(row) > MEDICINE_COLUMNS:
+        expiry = describe_expiry(row[MEDICINE_COLUMNS + 1], row[MEDICINE_COLUMNS])
+        row = row[:MEDICINE_COLUMNS]
+    elif expiry is None:
+        expiry = check_expiry(row[4], near_days=NEAR_EXPIRY_DAYS)
+    status_icon, days_info = expiry
+    status = f"{status_icon} ({days_info})"
+    tags = []
 
-        if row[5] < LOW_STOCK_THRESHOLD:
-            status += " 🔔 Low Stock"
-            tags.append("low_stock")
-        if "❌" in status_icon:
-            tags.append("expired")
-        elif "⚠️" in status_icon:
-            tags.append("near_expiry")
+    if row[5] < LOW_STOCK_THRESHOLD:
+        status += " 🔔 Low Stock"
+        tags.append("low_stock")
+    if "❌" in status_icon:
+        tags.append("expired")
+    elif "⚠️" in status_icon:
+        tags.append("near_expiry")
 
-        tree_widget.insert('', 'end', iid=str(med_id), values=row[1:] + (status,), tags=tags)
+    return str(row[0]), row[1:] + (status,), tags, status_icon
 
 
 def filter_status(status_filter):
@@ -254,49 +240,44 @@ def filter_status(status_filter):
 
 
 def load_data(show_popup=True):
-    expired, near_expiry, low_stock = [], [], []
-    tree_widget.delete(*tree_widget.get_children())
-
-    all_medicines = fetch_all_medicines()
-    filtered = apply_filters(all_medicines)
-    sorted_rows = apply_sort(filtered)
-
-    for row in sorted_rows:
-        med_id = row[0]
-        status_icon, days_info = check_expiry(row[4])
-        status = f"{status_icon} ({days_info})"
-        tags = []
-
-        if row[5] < LOW_STOCK_THRESHOLD:
-            status += " 🔔 Low Stock"
-            tags.append("low_stock")
-            low_stock.append(row[1])
-        if "❌" in status_icon:
-            tags.append("expired")
-            expired.append(row[1])
-        elif "⚠️" in status_icon:
-            tags.append("near_expiry")
-            near_expiry.append(row[1])
-
-        tree_widget.insert('', 'end', iid=str(med_id), values=row[1:] + (status,), tags=tags)
+    # Filters, sort order and expiry status are all evaluated in SQL, so only the
+    # matching rows (with the virtual grid, only the visible window) reach Python.
+    if virtual_grid:
+        virtual_grid.set_filters(current_filters)
+        virtual_grid.set_sort(sort_column, sort_reverse)
+        virtual_grid.refresh()
+    else:
+        rows = fetch_medicines_filtered(current_filters, sort_column, sort_reverse, near_days=NEAR_EXPIRY_DAYS)
+        tree_reconciler.reconcile(tree_item(row)[:3] for row in rows)
+
+    refresh_dashboard(show_popup)
+
 
+def refresh_dashboard(show_popup=False):
+    # Reads the trigger-maintained counters (filtered views count their rows
+    # through the indexes instead); the grid itself is not touched.
+    counts = fetch_inventory_alert_counts(LOW_STOCK_THRESHOLD, current_filters, near_days=NEAR_EXPIRY_DAYS)
+    update_dashboard(*counts, show_popup=show_popup)
+
+
+def update_dashboard(total, expired, near_expiry, low_stock, show_popup=False):
     if dashboards_labels['total']:
-        dashboards_labels['total'].config(text=f"📦 Total Medicines: {len(sorted_rows)}")
+        dashboards_labels['total'].config(text=f"📦 Total Medicines: {total}")
     if dashboards_labels['expired']:
-        dashboards_labels['expired'].config(text=f"❌ Expired: {len(expired)}")
+        dashboards_labels['expired'].config(text=f"❌ Expired: {expired}")
     if dashboards_labels['near_expiry']:
-        dashboards_labels['near_expiry'].config(text=f"⚠️ Near Expiry: {len(near_expiry)}")
+        dashboards_labels['near_expiry'].config(text=f"⚠️ Near Expiry: {near_expiry}")
     if dashboards_labels['low_stock']:
-        dashboards_labels['low_stock'].config(text=f"🔔 Low Stock: {len(low_stock)}")
+        dashboards_labels['low_stock'].config(text=f"🔔 Low Stock: {low_stock}")
 
     if show_popup and (expired or near_expiry or low_stock):
         msg = ""
         if expired:
-            msg += f"❌ Expired Medicines: {len(expired)}\n"
+            msg += f"❌ Expired Medicines: {expired}\n"
         if near_expiry:
-            msg += f"⚠️ Near Expiry (within 30 days): {len(near_expiry)}\n"
+            msg += f"⚠️ Near Expiry (within {NEAR_EXPIRY_DAYS} days): {near_expiry}\n"
         if low_stock:
-            msg += f"🔔 Low Stock Medicines (<{LOW_STOCK_THRESHOLD}): {len(low_stock)}\n"
+            msg += f"🔔 Low Stock Medicines (<{LOW_STOCK_THRESHOLD}): {low_stock}\n"
         messagebox.showwarning("Inventory Alert", msg.strip())
 
     if form_entries:
@@ -304,27 +285,62 @@ def load_data(show_popup=True):
 
 
 def export_to_csv():
-    file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
+    file_path = filedialog.asksaveasfilename(
+        defaultextension=".csv",
+        filetypes=[("CSV Files", "*.csv"), ("Compressed CSV", "*.csv.gz")],
+    )
     if not file_path:
         return
+    # Streams on a worker thread with a progress window; see utils/csv_exporter.py.
+    from gui.export_gui import open_export_window
+    open_export_window(file_path, NEAR_EXPIRY_DAYS, LOW_STOCK_THRESHOLD)
+
+
+def start_refresh_worker(interval=None, near_days=None, on_timing=None):
+    """(Re)start the background refresh.
+
+    interval is in seconds (default REFRESH_INTERVAL), near_days replaces the
+    near-expiry window everywhere, and on_timing(build_seconds, apply_seconds)
+    is called after each refresh that found changes.
+    """
+    global refresh_worker, NEAR_EXPIRY_DAYS
+    if near_days is not None:
+        NEAR_EXPIRY_DAYS = near_days
+        if virtual_grid:
+            virtual_grid.near_days = near_days
+            virtual_grid.invalidate()
+    if refresh_worker:
+        refresh_worker.stop()
+    refresh_worker = RefreshWorker(tree_widget, build_snapshot, apply_snapshot,
+                                   interval or REFRESH_INTERVAL, on_timing)
+    refresh_worker.start()
+
+
+def build_snapshot():
+    # Runs on the refresh thread: every query and expiry classification a
+    # refresh needs, with no Tk calls.
+    filters = dict(current_filters)
+    snapshot = {
+        "view": (sort_column, sort_reverse, filters),
+        "counts": fetch_inventory_alert_counts(LOW_STOCK_THRESHOLD, filters, near_days=NEAR_EXPIRY_DAYS),
+    }
+    if virtual_grid:
+        # Search results are on screen while the grid is inactive; leave them be.
+        snapshot["window"] = virtual_grid.fetch_window() if virtual_grid.active else None
+    else:
+        rows = fetch_medicines_filtered(filters, sort_column, sort_reverse, near_days=NEAR_EXPIRY_DAYS)
+        snapshot["items"] = [tree_item(row)[:3] for row in rows]
+    return snapshot
 
-    data = fetch_all_medicines()
-    try:
-        with open(file_path, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Name", "Batch", "Mfg Date", "Expiry Date", "Quantity", "Price", "Demand", "Status"])
-            for row in data:
-                status_icon, days_info = check_expiry(row[4])
-                status = f"{status_icon} ({days_info})"
-                if row[5] < LOW_STOCK_THRESHOLD:
-                    status += " 🔔 Low Stock"
-                writer.writerow(row[1:] + (status,))
-        messagebox.showinfo("Success", f"Data exported to {file_path}")
-    except Exception as e:
-        messagebox.showerror("Export Error", str(e))
-
-
-def auto_refresh():
-    while True:
-        time.sleep(REFRESH_INTERVAL)
+
+def apply_snapshot(snapshot):
+    # Runs on the Tk thread. A view the user changed meanwhile is reloaded instead.
+    if snapshot["view"] != (sort_column, sort_reverse, current_filters):
         load_data(show_popup=False)
+        return
+    if virtual_grid:
+        if snapshot["window"] and virtual_grid.active:
+            virtual_grid.install(snapshot["window"])
+    else:
+        tree_reconciler.reconcile(snapshot["items"])
+    update_dashboard(*snapshot["counts"])
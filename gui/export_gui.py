@@ -0,0 +1,69 @@
+import queue
+import threading
+
+import ttkbootstrap as tb
+from tkinter import messagebox
+
+from utils.csv_exporter import ExportCancelled, export_inventory
+
+POLL_INTERVAL_MS = 100
+
+
+def open_export_window(path, near_days, low_stock_threshold):
+    # Progress window for a streaming export running on a worker thread. The
+    # worker only posts to a queue; this window drains it on the Tk thread.
+    win = tb.Toplevel()
+    win.title("📤 Export to CSV")
+    win.geometry("420x150")
+    win.resizable(False, False)
+
+    status_var = tb.StringVar(value="Preparing export...")
+    tb.Label(win, textvariable=status_var, font=("Segoe UI", 11)).pack(pady=(15, 8))
+    progress_bar = tb.Progressbar(win, length=360, mode="determinate", bootstyle="success-striped")
+    progress_bar.pack(pady=5)
+
+    cancel = threading.Event()
+    messages = queue.Queue()
+
+    def cancel_export():
+        cancel.set()
+        status_var.set("Cancelling...")
+        cancel_btn.configure(state="disabled")
+
+    cancel_btn = tb.Button(win, text="Cancel", width=12, command=cancel_export, bootstyle="danger")
+    cancel_btn.pack(pady=10)
+    win.protocol("WM_DELETE_WINDOW", cancel_export)
+
+    def work():
+        try:
+            written = export_inventory(
+                path, progress=lambda done, total: messages.put(("progress", done, total)),
+                cancel=cancel, near_days=near_days, low_stock_threshold=low_stock_threshold,
+            )
+            messages.put(("done", written, None))
+        except ExportCancelled:
+            messages.put(("cancelled", None, None))
+        except Exception as e:
+            messages.put(("error", str(e), None))
+
+    def poll():
+        try:
+            while True:
+                kind, a, b = messages.get_nowait()
+                if kind == "progress":
+                    progress_bar.configure(maximum=b, value=a)
+                    status_var.set(f"Exported {a:,} of {b:,} rows")
+                    continue
+                win.destroy()
+                if kind == "done":
+                    messagebox.showinfo("Success", f"Exported {a:,} rows to {path}")
+                elif kind == "error":
+                    messagebox.showerror("Export Error", a)
+                return
+        except queue.Empty:
+            pass
+        win.after(POLL_INTERVAL_MS, poll)
+
+    threading.Thread(target=work, name="csv-export", daemon=True).start()
+    win.after(POLL_INTERVAL_MS, poll)
+    return win
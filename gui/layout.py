@@ -3,9 +3,45 @@ from ttkbootstrap.constants import *
 from tkinter import ttk
 from gui import events
 from gui.events import reset_filters
-from gui.checkout_gui import open_checkout_window
-from gui.sales_report_gui import open_sales_report_window
-from gui.return_gui import open_return_window
+
+MAINTENANCE_DELAY_MS = 2000  # after the first page is shown
+
+
+# The secondary windows are imported on first use to keep them off the start-up path.
+def open_checkout():
+    from gui.checkout_gui import open_checkout_window
+    open_checkout_window(on_checkout_complete=events.load_data)
+
+
+def open_returns():
+    from gui.return_gui import open_return_window
+    open_return_window(on_return_complete=events.load_data)
+
+
+def open_sales_report():
+    from gui.sales_report_gui import open_sales_report_window
+    open_sales_report_window()
+
+
+def open_receipts():
+    from gui.receipt_gui import open_receipt_window
+    open_receipt_window()
+
+
+def open_diagnostics(event=None):
+    from gui.diagnostics_gui import open_diagnostics_window
+    open_diagnostics_window()
+
+
+def run_maintenance():
+    # Deferred start-up work that the first frame should not wait for.
+    from database.service import remote_address
+    if remote_address():
+        return  # the service sweeps reservations and takes the backups
+    from database.backup import start_daily_backup
+    from database.db_handler import start_reservation_sweeper
+    start_reservation_sweeper()
+    start_daily_backup()
 
 
 def create_tooltip(widget, text):
@@ -19,10 +55,17 @@ def create_tooltip(widget, text):
     widget.bind("<Leave>", on_leave)
 
 
-def build_gui():
+def build_gui(profile=None, exit_after_start=False):
+    """Build the main window and run the Tk main loop.
+
+    profile is a utils.startup_profile.StartupProfile to record phases in;
+    exit_after_start prints it and closes the app once the first page is shown.
+    """
     root = tb.Window(themename="flatly")
     root.title("Pharmacy Inventory System")
     root.state('zoomed')
+    if profile:
+        profile.mark("create window")
 
     # Tooltip area
     events.tooltip_var = tb.StringVar()
@@ -102,13 +145,16 @@ def build_gui():
 
     # Main Navigation Buttons
     tb.Button(root, text="💳 Checkout", bootstyle="primary outline", width=20,
-          command=lambda: open_checkout_window(on_checkout_complete=events.load_data)).pack(pady=(0, 5))
+          command=open_checkout).pack(pady=(0, 5))
 
     tb.Button(root, text="↩️ Return Medicine", bootstyle="warning outline", width=20,
-          command=lambda: open_return_window(on_return_complete=events.load_data)).pack(pady=(0, 5))
+          command=open_returns).pack(pady=(0, 5))
 
     tb.Button(root, text="📅 View Sales Report", bootstyle="info outline", width=20,
-              command=open_sales_report_window).pack(pady=(0, 10))
+              command=open_sales_report).pack(pady=(0, 5))
+
+    tb.Button(root, text="🧾 Reprint Receipt", bootstyle="secondary outline", width=20,
+              command=open_receipts).pack(pady=(0, 10))
 
     # Filter Buttons
     filter_frame = tb.Frame(toolbar)
@@ -192,14 +238,39 @@ def build_gui():
 
     tree.bind("<<TreeviewSelect>>", on_tree_select)
 
-    events.set_tree(tree)
+    events.set_tree(tree, scrollbar=scroll_y)
     events.set_entries(entries)
 
-    # Initial Load
-    def load_data_and_set_focus():
-        events.load_data()
-
-    root.after(100, lambda: entries[0].focus_force())
-    root.after(100, load_data_and_set_focus)
+    # Query tracing view; see database/tracing.py.
+    root.bind("<Control-Shift-D>", open_diagnostics)
+
+    if profile:
+        profile.mark("build widgets")
+
+    # Initial Load: paint the window first, then the grid's first page, then
+    # start maintenance once the app is usable.
+    def first_frame():
+        root.update_idletasks()
+        if profile:
+            profile.mark("first frame")
+        entries[0].focus_force()
+        events.load_data(show_popup=not exit_after_start)
+        root.update_idletasks()
+        if profile:
+            profile.mark("first page")
+        if exit_after_start:
+            profile.report()
+            root.destroy()
+            return
+        root.after(MAINTENANCE_DELAY_MS, run_maintenance)
+
+    started = []
+
+    def on_map(event):
+        if event.widget is root and not started:
+            started.append(True)
+            root.after_idle(first_frame)
+
+    root.bind("<Map>", on_map, add="+")
 
     root.mainloop()
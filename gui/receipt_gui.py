@@ -0,0 +1,96 @@
+import datetime
+
+import ttkbootstrap as tb
+from tkinter import ttk, messagebox
+
+from database.db_handler import fetch_receipt, fetch_receipts_between
+from utils.receipts import configured_printer
+
+receipt_window_ref = None
+
+
+def open_receipt_window():
+    # Look up a journaled receipt by invoice and show or reprint it.
+    global receipt_window_ref
+    if receipt_window_ref and receipt_window_ref.winfo_exists():
+        receipt_window_ref.lift()
+        return
+
+    win = tb.Toplevel()
+    win.title("🧾 Reprint Receipt")
+    win.geometry("820x560")
+    receipt_window_ref = win
+
+    def on_close():
+        global receipt_window_ref
+        win.destroy()
+        receipt_window_ref = None
+
+    win.protocol("WM_DELETE_WINDOW", on_close)
+
+    search = tb.Frame(win, padding=10)
+    search.pack(fill="x")
+    tb.Label(search, text="Invoice ID:").pack(side="left")
+    invoice_var = tb.StringVar()
+    entry = tb.Entry(search, textvariable=invoice_var, width=30)
+    entry.pack(side="left", padx=5)
+
+    body = tb.Frame(win, padding=(10, 0, 10, 10))
+    body.pack(fill="both", expand=True)
+
+    # Today's receipts, newest first
+    recent = ttk.Treeview(body, columns=("invoice", "time", "total"), show="headings", height=18)
+    for col, text, width in (("invoice", "Invoice", 150), ("time", "Time", 140), ("total", "Total", 80)):
+        recent.heading(col, text=text)
+        recent.column(col, width=width, anchor="center")
+    recent.pack(side="left", fill="y")
+
+    text = tb.Text(body, font=("Courier", 10), width=46)
+    text.pack(side="left", fill="both", expand=True, padx=(10, 0))
+
+    printer = configured_printer()
+    shown = {"invoice_id": None, "text": None}
+
+    def show(invoice_id):
+        receipt = fetch_receipt(invoice_id)
+        text.delete("1.0", "end")
+        if receipt is None:
+            shown.update(invoice_id=None, text=None)
+            messagebox.showwarning("Not Found", f"No receipt for invoice {invoice_id}.", parent=win)
+            return
+        text.insert("1.0", receipt)
+        shown.update(invoice_id=invoice_id, text=receipt)
+
+    def find(event=None):
+        invoice_id = invoice_var.get().strip()
+        if invoice_id:
+            show(invoice_id)
+
+    def on_select(event):
+        selected = recent.selection()
+        if selected:
+            invoice_id = recent.item(selected[0])["values"][0]
+            invoice_var.set(invoice_id)
+            show(str(invoice_id))
+
+    def reprint():
+        if not shown["text"]:
+            messagebox.showwarning("No Receipt", "Find a receipt first.", parent=win)
+            return
+        try:
+            printer.print_receipts([shown["text"]])
+        except OSError as e:
+            messagebox.showerror("Printer Error", f"Could not print: {e}", parent=win)
+            return
+        messagebox.showinfo("Sent", f"Invoice {shown['invoice_id']} sent to the printer.", parent=win)
+
+    tb.Button(search, text="Find", width=8, bootstyle="primary", command=find).pack(side="left")
+    tb.Button(search, text="🖨️ Print", width=10, bootstyle="success", command=reprint,
+              state="normal" if printer else "disabled").pack(side="right")
+    entry.bind("<Return>", find)
+    recent.bind("<<TreeviewSelect>>", on_select)
+
+    today = datetime.date.today().isoformat()
+    for invoice_id, created_at, total in fetch_receipts_between(today, today + " 99"):
+        recent.insert("", "end", values=(invoice_id, created_at[11:], f"{total or 0:.2f}"))
+    entry.focus_set()
@@ -0,0 +1,96 @@
+"""Periodic inventory refresh that keeps database work off the Tk thread.
+
+A daemon thread wakes every `interval` seconds, builds a snapshot (queries
+and expiry classification) and puts it on a queue. The Tk thread drains the
+queue with `after()` and applies the snapshot to the widgets, so Tk is only
+ever touched from the thread that owns it. A cycle is skipped outright when
+neither the database (PRAGMA data_version plus our own commit counter) nor
+the calendar date has changed since the last refresh.
+"""
+import queue
+import threading
+import time
+from datetime import date
+
+from database.db_handler import data_change_token
+
+POLL_INTERVAL_MS = 250
+
+
+class RefreshWorker:
+    def __init__(self, widget, build_snapshot, apply_snapshot, interval, on_timing=None):
+        self.widget = widget                  # any Tk widget; used for after()
+        self.build_snapshot = build_snapshot  # worker thread: () -> snapshot
+        self.apply_snapshot = apply_snapshot  # Tk thread: snapshot -> None
+        self.interval = interval
+        self.on_timing = on_timing            # (build_seconds, apply_seconds) -> None
+        self._results = queue.Queue()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._last_token = None
+        self._thread = None
+        self._after_id = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inventory-refresh", daemon=True)
+            self._thread.start()
+            self._after_id = self.widget.after(POLL_INTERVAL_MS, self._drain)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def refresh_now(self, force=False):
+        # Wake the worker ahead of schedule; force also ignores change detection.
+        if force:
+            self._last_token = None
+        self._wake.set()
+
+    # ---------------- Worker Thread ---------------- #
+
+    def _current_token(self):
+        return data_change_token(), date.today()
+
+    def poll(self):
+        """Build a snapshot if anything changed; returns (snapshot, seconds) or None."""
+        token = self._current_token()
+        if token == self._last_token:
+            return None
+        start = time.perf_counter()
+        snapshot = self.build_snapshot()
+        self._last_token = token
+        return snapshot, time.perf_counter() - start
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                result = self.poll()
+            except Exception as e:
+                # A failed cycle (e.g. the database is locked) is retried on the next one.
+                print(f"⚠️ Background refresh failed: {e}")
+                continue
+            if result is not None:
+                self._results.put(result)
+
+    # ---------------- Tk Thread ---------------- #
+
+    def _drain(self):
+        try:
+            while True:
+                snapshot, build_seconds = self._results.get_nowait()
+                start = time.perf_counter()
+                self.apply_snapshot(snapshot)
+                if self.on_timing:
+                    self.on_timing(build_seconds, time.perf_counter() - start)
+        except queue.Empty:
+            pass
+        if not self._stopped.is_set():
+            self._after_id = self.widget.after(POLL_INTERVAL_MS, self._drain)
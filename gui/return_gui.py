@@ -4,12 +4,10 @@ from tkinter import messagebox, ttk
 import datetime
 
 from database.db_handler import (
+    ReturnQuantityError,
+    commit_return,
+    fetch_returnable_lines,
     fetch_sales_with_remaining_qty,
-    fetch_sales_by_invoice,
-    fetch_all_medicines,
-    update_medicine_by_id,
-    insert_return_record,
-    fetch_returns_by_invoice
 )
 
 # Reference to track if window is already open
@@ -103,26 +101,14 @@ def open_return_window(on_return_complete=None):
             messagebox.showwarning("Input Required", "Please enter an invoice ID.")
             return
 
-        rows = fetch_sales_by_invoice(invoice_id)
+        rows = fetch_returnable_lines(invoice_id)
         sales_tree.delete(*sales_tree.get_children())
         if not rows:
-            messagebox.showinfo("No Results", f"No records found for Invoice ID: {invoice_id}")
+            messagebox.showinfo("No Results", f"No returnable items found for Invoice ID: {invoice_id}")
             return
 
-        for row in rows:
-            try:
-                med_id, name = row[1], row[2]
-                qty = int(row[3])
-                price = float(row[4])
-                invoice_id = row[7]
-                previous_returns = fetch_returns_by_invoice(invoice_id)
-                total_returned = sum(r[3] for r in previous_returns if r[1] == med_id and r[7] == invoice_id)
-                net_qty = qty - total_returned
-                if net_qty > 0:
-                    new_subtotal = round(price * net_qty, 2)
-                    sales_tree.insert('', 'end', values=(med_id, name, net_qty, price, new_subtotal, invoice_id))
-            except Exception as e:
-                print(f"Skipping row due to error: {e}")
+        for med_id, name, _, _, remaining, price, invoice_id in rows:
+            sales_tree.insert('', 'end', values=(med_id, name, remaining, price, round(price * remaining, 2), invoice_id))
 
     def return_selected():
         selected = sales_tree.selection()
@@ -137,61 +123,43 @@ def open_return_window(on_return_complete=None):
 
         return_qty = int(return_qty_input)
 
+        lines = []
         for item_id in selected:
-            values = sales_tree.item(item_id)['values']
-            med_id, name, sold_qty, price, subtotal, invoice_id = values
-            sold_qty = int(sold_qty)
-            price = float(price)
-
-            remaining_returnable = sold_qty  # FIX: already net qty in the tree
-
-            if remaining_returnable <= 0:
-                messagebox.showwarning(
-                    "Already Returned",
-                    f"All quantity of '{name}' (Invoice: {invoice_id}) has already been returned."
-                )
-                continue
-
-            if return_qty > remaining_returnable:
+            med_id, name, remaining, price, _, invoice_id = sales_tree.item(item_id)['values']
+            if return_qty > int(remaining):
                 messagebox.showerror(
                     "Return Quantity Too High",
-                    f"Only {remaining_returnable} can be returned for '{name}'."
+                    f"Only {remaining} can be returned for '{name}'."
                 )
-                continue
-
-            medicines = fetch_all_medicines()
-            med = next((m for m in medicines if m[0] == med_id), None)
-            if not med:
-                messagebox.showerror("Medicine Not Found", f"Medicine ID {med_id} not found in inventory.")
-                continue
-
-            updated_qty = med[5] + return_qty
-            updated_data = (med[1], med[2], med[3], med[4], updated_qty, med[6], med[7])
-            update_medicine_by_id(updated_data, med_id)
-
-            refund_amount = price * return_qty
-            return_entry = (
-                med_id, name, return_qty, price, refund_amount,
-                datetime.datetime.now().strftime('%Y-%m-%d'), invoice_id
-            )
-            insert_return_record(return_entry)
-
-            messagebox.showinfo(
-                "Refunded",
-                f"Medicine '{name}' returned: {return_qty} units\nRefund: Rs. {refund_amount:.2f}"
-            )
-
-            new_remaining = remaining_returnable - return_qty
+                return
+            lines.append({"id": int(med_id), "name": name, "qty": return_qty,
+                          "price": float(price), "invoice_id": str(invoice_id)})
+
+        # All selected lines are restocked and recorded together, or not at all.
+        try:
+            refund = commit_return(lines)
+        except ReturnQuantityError as e:
+            messagebox.showerror("Return Quantity Too High", str(e))
+            return
+        except ValueError as e:
+            messagebox.showerror("Return Failed", str(e))
+            return
+
+        summary = "\n".join(f"'{line['name']}': {line['qty']} units" for line in lines)
+        messagebox.showinfo("Refunded", f"Medicines returned:\n{summary}\nRefund: Rs. {refund:.2f}")
+
+        for item_id in selected:
+            values = list(sales_tree.item(item_id)['values'])
+            new_remaining = int(values[2]) - return_qty
             if new_remaining <= 0:
                 sales_tree.delete(item_id)
             else:
-                new_values = list(values)
-                new_values[2] = new_remaining
-                new_values[4] = round(price * new_remaining, 2)
-                sales_tree.item(item_id, values=new_values)
+                values[2] = new_remaining
+                values[4] = round(float(values[3]) * new_remaining, 2)
+                sales_tree.item(item_id, values=values)
 
-            if on_return_complete:
-                on_return_complete()
+        if on_return_complete:
+            on_return_complete()
 
     tb.Button(win, text="↩️ Return Selected", command=return_selected, bootstyle="danger").pack(pady=10)
 
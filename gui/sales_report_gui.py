@@ -2,7 +2,7 @@ import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from database.db_handler import fetch_sales_report_with_returns
+from database.db_handler import REPORT_PAGE_SIZE, fetch_sales_report_page, fetch_sales_report_totals, fetch_top_sellers
 import datetime
 import csv
 
@@ -44,17 +44,31 @@ def open_sales_report_window():
 
     # Table columns
     columns = ("invoice_id", "name", "qty_sold", "qty_returned", "net_qty", "price", "subtotal", "returned_amount", "net_total", "date")
-    tree = ttk.Treeview(report_win, columns=columns, show="headings", height=15)
+    tree_frame = tb.Frame(report_win)
+    tree_frame.pack(pady=10, fill="both", expand=True)
+    tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=15)
+    scroll_y = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
 
     for col in columns:
         tree.heading(col, text=col.replace("_", " ").capitalize())
         tree.column(col, anchor="center", width=110)
 
-    tree.pack(pady=10, fill="both", expand=True)
+    tree.pack(side="left", fill="both", expand=True)
+    scroll_y.pack(side="right", fill="y")
+
+    # Rows arrive a page at a time; `report` tracks the range being shown and
+    # the keyset of the last loaded row.
+    report = {"range": None, "after": None, "done": True, "queued": False}
 
     # Totals display
-    totals_frame = tb.Frame(report_win)
-    totals_frame.pack(anchor="e", padx=20, pady=(5, 0))
+    summary_frame = tb.Frame(report_win)
+    summary_frame.pack(fill="x", padx=20, pady=(5, 0))
+
+    top_label = tb.Label(summary_frame, text="", font=("Segoe UI", 10), justify="left")
+    top_label.pack(side="left", anchor="n")
+
+    totals_frame = tb.Frame(summary_frame)
+    totals_frame.pack(side="right", anchor="e")
 
     total_label = tb.Label(totals_frame, text="Total Sales: Rs. 0.00", font=("Segoe UI", 11, "bold"))
     total_label.pack(anchor="e")
@@ -65,6 +79,31 @@ def open_sales_report_window():
     net_label = tb.Label(totals_frame, text="Net Revenue: Rs. 0.00", font=("Segoe UI", 12, "bold"), foreground="green")
     net_label.pack(anchor="e")
 
+    def format_row(row):
+        invoice_id, name, qty_sold, qty_returned, net_qty, price, subtotal, returned_amount, net_total, date, _ = row
+        return (invoice_id, name, qty_sold, qty_returned, net_qty, f"{price:.2f}", f"{subtotal:.2f}",
+                f"{returned_amount:.2f}", f"{net_total:.2f}", date)
+
+    def load_next_page():
+        report["queued"] = False
+        if report["done"]:
+            return
+        rows = fetch_sales_report_page(*report["range"], after=report["after"])
+        for row in rows:
+            tree.insert('', 'end', values=format_row(row))
+        if rows:
+            report["after"] = (rows[-1][9], rows[-1][10])
+        report["done"] = len(rows) < REPORT_PAGE_SIZE
+
+    def on_scroll(first, last):
+        scroll_y.set(first, last)
+        # Fetch the next page once the view gets close to the loaded end.
+        if float(last) > 0.9 and not report["done"] and not report["queued"]:
+            report["queued"] = True
+            tree.after_idle(load_next_page)
+
+    tree.configure(yscrollcommand=on_scroll)
+
     # Load Report
     def load_report():
         from_date = from_date_entry.get().strip()
@@ -77,38 +116,24 @@ def open_sales_report_window():
             messagebox.showerror("Invalid Date", "Please enter dates in YYYY-MM-DD format.")
             return
 
-        data = fetch_sales_report_with_returns(from_date, to_date)
         tree.delete(*tree.get_children())
+        report.update({"range": (from_date, to_date), "after": None, "done": False})
+        load_next_page()
 
-        total_sales = 0
-        total_returns = 0
-
-        for row in data:
-            tree.insert('', 'end', values=(
-                row["invoice_id"],
-                row["name"],
-                row["qty_sold"],
-                row["qty_returned"],
-                row["net_qty"],
-                f"{row['price']:.2f}",
-                f"{row['subtotal']:.2f}",
-                f"{row['returned_amount']:.2f}",
-                f"{row['net_total']:.2f}",
-                row["date"]
-            ))
-
-            total_sales += row["subtotal"]
-            total_returns += row["returned_amount"]
-
-        net_revenue = total_sales - total_returns
-
+        # Totals cover the whole range, not just the pages loaded so far.
+        total_sales, total_returns, net_revenue = fetch_sales_report_totals(from_date, to_date)
         total_label.config(text=f"Total Sales: Rs. {total_sales:.2f}")
         returned_label.config(text=f"Total Returned: Rs. {total_returns:.2f}")
         net_label.config(text=f"Net Revenue: Rs. {net_revenue:.2f}")
 
+        top = fetch_top_sellers(from_date, to_date, limit=5)
+        top_label.config(text="🏆 Top Sellers:\n" + "\n".join(
+            f"{rank}. {name} – {qty} sold" for rank, (_, name, qty, _) in enumerate(top, 1)
+        ) if top else "")
+
     # Export to CSV
     def export_to_csv():
-        if not tree.get_children():
+        if report["range"] is None:
             messagebox.showwarning("No Data", "Please load the report first before exporting.")
             return
 
@@ -120,11 +145,18 @@ def open_sales_report_window():
         if not file_path:
             return
 
+        # Read from the database page by page rather than from the widget, which
+        # only holds the pages scrolled into view.
         with open(file_path, mode='w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow([col.replace("_", " ").capitalize() for col in columns])
-            for child in tree.get_children():
-                writer.writerow(tree.item(child)['values'])
+            after = None
+            while True:
+                rows = fetch_sales_report_page(*report["range"], after=after)
+                writer.writerows(format_row(row) for row in rows)
+                if len(rows) < REPORT_PAGE_SIZE:
+                    break
+                after = (rows[-1][9], rows[-1][10])
 
         messagebox.showinfo("Exported", f"Report exported successfully to:\n{file_path}")
 
@@ -0,0 +1,99 @@
+"""Incremental Treeview updates keyed by item iid.
+
+TreeReconciler keeps a shadow copy of what it last put in the widget, so a
+refresh only costs Tcl calls for rows that were added, changed, removed or
+reordered instead of deleting and re-inserting the whole grid.
+"""
+from bisect import bisect_left
+
+
+def _longest_increasing_subsequence(seq):
+    # Indexes into seq of one longest strictly increasing run (patience sorting).
+    if all(a < b for a, b in zip(seq, seq[1:])):
+        return range(len(seq))
+    tails, tails_idx, parents = [], [], [-1] * len(seq)
+    for i, value in enumerate(seq):
+        pos = bisect_left(tails, value)
+        if pos:
+            parents[i] = tails_idx[pos - 1]
+        if pos == len(tails):
+            tails.append(value)
+            tails_idx.append(i)
+        else:
+            tails[pos] = value
+            tails_idx[pos] = i
+    result = []
+    i = tails_idx[-1] if tails_idx else -1
+    while i != -1:
+        result.append(i)
+        i = parents[i]
+    return result[::-1]
+
+
+class TreeReconciler:
+    def __init__(self, tree):
+        self.tree = tree
+        self._order = []    # iids currently shown, top to bottom
+        self._shadow = {}   # iid -> (values, tags) last written
+
+    def clear(self):
+        if self._order:
+            self.tree.delete(*self._order)
+        self._order = []
+        self._shadow = {}
+
+    def forget(self):
+        # The widget was emptied behind our back (e.g. by a legacy code path).
+        self._order = []
+        self._shadow = {}
+
+    def reconcile(self, items):
+        """Make the tree show items, a sequence of (iid, values, tags), in that order."""
+        tree = self.tree
+        new_order = []
+        new_shadow = {}
+        for iid, values, tags in items:
+            iid = str(iid)
+            new_order.append(iid)
+            new_shadow[iid] = (tuple(values), tuple(tags))
+
+        vanished = [iid for iid in self._order if iid not in new_shadow]
+        if vanished:
+            tree.delete(*vanished)
+
+        # Survivors whose relative order is unchanged stay put; only the rest move.
+        survivors = [iid for iid in self._order if iid in new_shadow]
+        new_position = {iid: i for i, iid in enumerate(new_order)}
+        positions = [new_position[iid] for iid in survivors]
+        stable = {survivors[i] for i in _longest_increasing_subsequence(positions)}
+
+        stable_after = sum(1 for iid in new_order if iid in stable)
+        previous = None
+        for iid in new_order:
+            values, tags = new_shadow[iid]
+            old = self._shadow.get(iid)
+
+            if iid in stable:
+                stable_after -= 1
+            elif stable_after == 0:
+                # Nothing stable below this point, so the tail can simply be appended.
+                if old is None:
+                    tree.insert('', 'end', iid=iid, values=values, tags=tags)
+                else:
+                    tree.move(iid, '', len(new_order))
+            else:
+                if old is not None:
+                    # Detach first so index(previous) is not skewed by the item itself.
+                    tree.detach(iid)
+                index = 0 if previous is None else tree.index(previous) + 1
+                if old is None:
+                    tree.insert('', index, iid=iid, values=values, tags=tags)
+                else:
+                    tree.move(iid, '', index)
+
+            if old is not None and old != (values, tags):
+                tree.item(iid, values=values, tags=tags)
+            previous = iid
+
+        self._order = new_order
+        self._shadow = new_shadow
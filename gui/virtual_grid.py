@@ -0,0 +1,222 @@
+"""Virtual scrolling for the main inventory Treeview.
+
+Only the rows that fit in the widget (plus a small overscan) are ever
+inserted into Tk. Rows are fetched from SQLite a page at a time with keyset
+pagination on the active sort column and filters, and the scrollbar is
+driven by hand so its thumb reflects the position within the matching rows.
+"""
+from collections import OrderedDict
+from tkinter import ttk
+
+from database.db_handler import count_medicines, fetch_medicines_page, fetch_medicine_keyset_at
+
+PAGE_SIZE = 200
+OVERSCAN = 5
+MAX_CACHED_PAGES = 16
+
+
+def fetch_page(number, keysets, sort_column, descending, filters, near_days):
+    # Rows of page `number`, recording the keyset of its last row in keysets.
+    # Database only, so it is also safe to call off the Tk thread.
+    if number == 0:
+        after = None
+    elif number - 1 in keysets:
+        after = keysets[number - 1]
+    else:
+        # Scrollbar jump: locate the keyset by walking the sort index only.
+        after = fetch_medicine_keyset_at(number * PAGE_SIZE - 1, sort_column, descending,
+                                         filters, near_days=near_days)
+
+    rows = fetch_medicines_page(sort_column, descending, after, PAGE_SIZE, filters, near_days=near_days)
+    if rows:
+        keysets[number] = (rows[-1][-1], rows[-1][0])
+    return rows
+
+
+class VirtualGrid:
+    def __init__(self, tree, scrollbar, reconciler, render_row, near_days=30):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.reconciler = reconciler
+        self.render_row = render_row    # grid row -> (iid, values, tags)
+        self.near_days = near_days
+        self.active = False
+        self.sort_column = None
+        self.descending = False
+        self.filters = {}
+        self.total = 0
+        self.first = 0
+        self.visible = 0                # rows that fit at the last render
+        self._pages = OrderedDict()     # page number -> rows, LRU
+        self._keysets = {}              # page number -> keyset of its last row
+
+        tree.bind("<Configure>", lambda e: self.active and self.render(), add="+")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(sequence, self._on_wheel, add="+")
+        for key, handler in (("<Up>", lambda e: self._on_arrow(-1)), ("<Down>", lambda e: self._on_arrow(1)),
+                             ("<Prior>", lambda e: self.scroll_pages(-1)), ("<Next>", lambda e: self.scroll_pages(1)),
+                             ("<Home>", lambda e: self.scroll_to(0)), ("<End>", lambda e: self.scroll_to(self.total))):
+            tree.bind(key, handler, add="+")
+
+    # ---------------- Mode Switching ---------------- #
+
+    def activate(self):
+        if not self.active:
+            self.active = True
+            self.scrollbar.configure(command=self._on_scrollbar)
+            self.tree.configure(yscrollcommand="")
+
+    def deactivate(self):
+        # Hand the widget back to Tk's native scrolling (search results).
+        if self.active:
+            self.active = False
+            self.scrollbar.configure(command=self.tree.yview)
+            self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+    def set_sort(self, sort_column, descending):
+        if (sort_column, descending) != (self.sort_column, self.descending):
+            self.sort_column = sort_column
+            self.descending = descending
+            self.first = 0
+            self.invalidate()
+
+    def set_filters(self, filters):
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+        if filters != self.filters:
+            self.filters = filters
+            self.first = 0
+            self.invalidate()
+
+    def invalidate(self):
+        self._pages.clear()
+        self._keysets.clear()
+
+    def refresh(self):
+        # Re-read the row count and the visible window, keeping the scroll position.
+        self.activate()
+        self.invalidate()
+        self.total = count_medicines(self.filters, near_days=self.near_days)
+        self.render()
+
+    # ---------------- Data Window ---------------- #
+
+    def _page(self, number):
+        if number in self._pages:
+            self._pages.move_to_end(number)
+            return self._pages[number]
+
+        rows = fetch_page(number, self._keysets, self.sort_column, self.descending, self.filters, self.near_days)
+        self._pages[number] = rows
+        if len(self._pages) > MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return rows
+
+    def _rows(self, start, count):
+        rows = []
+        end = min(start + count, self.total)
+        position = start
+        while position < end:
+            number, offset = divmod(position, PAGE_SIZE)
+            page = self._page(number)
+            chunk = page[offset:offset + end - position]
+            if not chunk:
+                break
+            rows += chunk
+            position += len(chunk)
+        # Strip the appended sort key before handing rows to the renderer.
+        return [row[:-1] for row in rows]
+
+    def fetch_window(self):
+        """Prefetch the current window off the Tk thread; see install()."""
+        view = (self.sort_column, self.descending, dict(self.filters))
+        total = count_medicines(view[2], near_days=self.near_days)
+        count = (self.visible or PAGE_SIZE) + OVERSCAN
+        first = max(0, min(self.first, total - count))
+        pages, keysets = {}, {}
+        for number in range(first // PAGE_SIZE, (first + count - 1) // PAGE_SIZE + 1):
+            pages[number] = fetch_page(number, keysets, *view, self.near_days)
+        return {"view": view, "total": total, "pages": pages, "keysets": keysets}
+
+    def install(self, window):
+        # Tk thread: adopt pages from fetch_window() and redraw. If the sort or
+        # filters changed while they were being fetched, fall back to a refresh.
+        if window["view"] != (self.sort_column, self.descending, self.filters):
+            self.refresh()
+            return
+        self.activate()
+        self.invalidate()
+        self.total = window["total"]
+        self._pages.update(window["pages"])
+        self._keysets.update(window["keysets"])
+        self.render()
+
+    def visible_count(self):
+        style = ttk.Style()
+        row_height = int(style.lookup(self.tree.cget("style") or "Treeview", "rowheight") or 20)
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree.cget("height") or 10)
+        # Leave room for the heading row.
+        return max(1, height // row_height - 1)
+
+    def render(self):
+        if not self.active:
+            return
+        visible = self.visible = self.visible_count()
+        self.first = max(0, min(self.first, self.total - visible))
+        rows = self._rows(self.first, visible + OVERSCAN)
+        self.reconciler.reconcile(self.render_row(row) for row in rows)
+        self.tree.yview_moveto(0)
+        if self.total:
+            self.scrollbar.set(self.first / self.total, min(1.0, (self.first + visible) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # ---------------- Scrolling ---------------- #
+
+    def scroll_to(self, first):
+        self.first = max(0, int(first))
+        self.render()
+        return "break"
+
+    def scroll_rows(self, delta):
+        return self.scroll_to(self.first + delta)
+
+    def scroll_pages(self, delta):
+        return self.scroll_rows(delta * max(1, self.visible_count() - 1))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total)
+        elif unit == "pages":
+            self.scroll_pages(int(amount))
+        else:
+            self.scroll_rows(int(amount))
+
+    def _on_wheel(self, event):
+        if not self.active:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            return self.scroll_rows(-3)
+        return self.scroll_rows(3)
+
+    def _on_arrow(self, step):
+        if not self.active:
+            return None
+        children = self.tree.get_children()
+        selection = self.tree.selection()
+        if not children or not selection:
+            return None
+        index = children.index(selection[0]) + step
+        visible = self.visible_count()
+        if 0 <= index < min(visible, len(children)):
+            return None  # Tk moves the selection within the window itself.
+
+        # Stepping past the window edge scrolls by one row and keeps the selection moving.
+        self.scroll_rows(step)
+        children = self.tree.get_children()
+        if children:
+            target = children[0] if step < 0 else children[min(visible, len(children)) - 1]
+            self.tree.selection_set(target)
+            self.tree.focus(target)
+        return "break"
@@ -1,7 +1,61 @@
+import time
+
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import sys  # noqa: E402
+
+from utils.startup_profile import StartupProfile  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MediTrack pharmacy inventory.")
+    parser.add_argument("--rebuild-sales-rollup", action="store_true",
+                        help="recompute the daily sales rollup from the full history and exit")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a per-phase start-up timing breakdown once the first page is shown, then exit")
+    parser.add_argument("--trace", type=float, metavar="SLOW_MS", nargs="?", const=50.0,
+                        help="time every database call and log calls slower than SLOW_MS (default 50); "
+                             "Ctrl+Shift+D shows the results")
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="run as a till of the service at HOST:PORT or unix:/path "
+                             "(see python -m database.service)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = StartupProfile(STARTED)
+
+    from database import db_handler
+    profile.mark("import database")
+    if args.trace is not None:
+        from database import tracing
+        tracing.enable(args.trace)
+    if args.connect:
+        # The service owns the schema, the writes and the backups.
+        from database.service import ServiceUnavailable, use_service
+        try:
+            use_service(args.connect)
+        except ServiceUnavailable as e:
+            print(f"❌ {e}")
+            return 1
+        profile.mark("connect service")
+    else:
+        # A single PRAGMA user_version read when the schema is already current.
+        db_handler.create_table()
+        profile.mark("schema check")
+
+    if args.rebuild_sales_rollup:
+        # Looked up on the module, so a till asks the service to rebuild.
+        print(f"✅ Sales rollup rebuilt: {db_handler.rebuild_sales_rollup():,} rows")
+        return 0
+
+    from gui.layout import build_gui
+    profile.mark("import gui")
+    build_gui(profile=profile, exit_after_start=args.profile_startup)
+    return 0
 
-from gui.layout import build_gui
-from database.db_handler import create_table
 
 if __name__ == "__main__":
-    create_table()
-    build_gui()
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Streaming inventory export to CSV (optionally gzip-compressed).
+
+Rows are read from the database a batch at a time, classified with
+classify_expiry_batch() and written straight out, so memory stays flat no
+matter how large the catalogue is. The GUI runs export_inventory() on a
+worker thread; scheduled exports use the same function headlessly:
+
+    python -m utils.csv_exporter inventory.csv.gz [--near-days 30]
+"""
+import argparse
+import csv
+import gzip
+import os
+import sys
+
+from database.db_handler import DEFAULT_LOW_STOCK_THRESHOLD, count_medicines, create_table, iter_medicine_batches
+from utils.expiry_checker import NEAR_EXPIRY_DAYS, STATUS_NAMES, classify_expiry_batch, describe_expiry
+
+EXPORT_HEADER = ["Name", "Batch", "Mfg Date", "Expiry Date", "Quantity", "Price", "Demand", "Status"]
+BATCH_SIZE = 2000
+WRITE_BUFFER = 1024 * 1024
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _open_output(path, compress):
+    if compress:
+        return gzip.open(path, "wt", newline="", encoding="utf-8", compresslevel=6)
+    return open(path, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER)
+
+
+def export_inventory(path, compress=None, progress=None, cancel=None, as_of=None,
+                     near_days=NEAR_EXPIRY_DAYS, low_stock_threshold=DEFAULT_LOW_STOCK_THRESHOLD):
+    """Write the inventory to path and return the number of rows written.
+
+    compress defaults to path ending in ".gz". progress(done, total) is called
+    after every batch; setting the threading.Event `cancel` stops the export
+    with ExportCancelled. Output goes to a temporary file that only replaces
+    path once complete, so a cancelled or failed export leaves nothing behind.
+    """
+    if compress is None:
+        compress = path.endswith(".gz")
+    total = count_medicines()
+    partial = path + ".part"
+    done = 0
+    try:
+        with _open_output(partial, compress) as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_HEADER)
+            for rows in iter_medicine_batches(BATCH_SIZE):
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+                statuses, days = classify_expiry_batch([row[4] for row in rows], as_of, near_days)
+                out = []
+                for row, status, remaining in zip(rows, statuses, days):
+                    label, days_info = describe_expiry(STATUS_NAMES[status], int(remaining))
+                    text = f"{label} ({days_info})"
+                    if row[5] is not None and row[5] < low_stock_threshold:
+                        text += " 🔔 Low Stock"
+                    out.append(row[1:] + (text,))
+                writer.writerows(out)
+                done += len(rows)
+                if progress:
+                    progress(done, max(total, done))
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the MediTrack inventory to CSV.")
+    parser.add_argument("path", help="output file; a .gz suffix compresses it")
+    parser.add_argument("--near-days", type=int, default=NEAR_EXPIRY_DAYS)
+    parser.add_argument("--as-of", help="classify expiry as of this YYYY-MM-DD date (default: today)")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        if not args.quiet:
+            print(f"\r{done:,}/{total:,} rows", end="", file=sys.stderr)
+
+    create_table()
+    written = export_inventory(args.path, progress=report, as_of=args.as_of, near_days=args.near_days)
+    if not args.quiet:
+        print(f"\n✅ Exported {written:,} rows to {args.path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,140 @@
-from datetime import datetime
+"""Expiry status of medicines, one date or a whole batch at a time.
 
-def check_expiry(expiry_date_str):
+classify_expiry_batch() is the engine behind the grid, the CSV export and
+check_expiry(): dates are parsed once (memoized across refreshes), days
+remaining are computed against a single `as_of` date, and NumPy vectorizes
+the arithmetic when it is installed.
+"""
+import threading
+from array import array
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure-Python path gives the same results.
+    np = None
+
+NEAR_EXPIRY_DAYS = 30
+
+# Compact status codes; STATUS_NAMES matches the expiry_status column computed in SQL.
+EXPIRED, NEAR_EXPIRY, VALID, INVALID = 0, 1, 2, 3
+STATUS_NAMES = ("expired", "near_expiry", "valid", "invalid")
+
+EXPIRY_LABELS = {
+    "expired": "❌ Expired",
+    "near_expiry": "⚠️ Near Expiry",
+    "valid": "✅ Valid",
+    "invalid": "⚠️ Invalid Date",
+}
+
+MAX_CACHED_DATES = 200_000
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_ordinals = {}  # expiry string -> proleptic ordinal (always >= 1), or 0 when not a valid date
+_ordinals_lock = threading.Lock()  # the grid, the refresh worker and the CSV export share the memo
+
+
+def _is_iso_shaped(value):
+    return (isinstance(value, str) and len(value) == 10 and value.isascii()
+            and value[4] == "-" and value[7] == "-"
+            and value[:4].isdigit() and value[5:7].isdigit() and value[8:].isdigit())
+
+
+def _parse_ordinal(value):
+    # Strict YYYY-MM-DD, the same rule as date(x) = x in SQL.
+    if not _is_iso_shaped(value):
+        return 0
     try:
-        expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%d").date()
-        today = datetime.today().date()
-        days_remaining = (expiry_date - today).days
-
-        if days_remaining < 0:
-            return "❌ Expired", f"{abs(days_remaining)} days ago"
-        elif days_remaining <= 30:
-            return "⚠️ Near Expiry", f"{days_remaining} days left"
+        return date.fromisoformat(value).toordinal()
+    except ValueError:
+        return 0
+
+
+def _parse_new(values):
+    if np is not None:
+        candidates = [value for value in values if _is_iso_shaped(value)]
+        try:
+            days = np.array(candidates, dtype="datetime64[D]").astype(np.int64)
+        except ValueError:
+            pass  # At least one malformed date; sort them out one by one below.
         else:
-            return "✅ Valid", f"{days_remaining} days left"
-    except:
-        return "⚠️ Invalid Date", "-"
+            parsed = dict.fromkeys(values, 0)
+            # NumPy accepts year 0, which date.fromisoformat (and date.toordinal) do not.
+            parsed.update((value, max(int(day) + _EPOCH_ORDINAL, 0)) for value, day in zip(candidates, days))
+            return parsed
+    return {value: _parse_ordinal(value) for value in values}
+
+
+def expiry_ordinals(dates):
+    """Date ordinals for the expiry strings, 0 for invalid ones. Memoized."""
+    # Answered from a local copy, so another thread clearing the memo cannot
+    # pull a value out from under this call; parsing runs outside the lock.
+    with _ordinals_lock:
+        parsed = {value: _ordinals.get(value) for value in set(dates)}
+    new = [value for value, ordinal in parsed.items() if ordinal is None]
+    if new:
+        parsed.update(_parse_new(new))
+        with _ordinals_lock:
+            if len(_ordinals) + len(new) > MAX_CACHED_DATES:
+                _ordinals.clear()
+            _ordinals.update((value, parsed[value]) for value in new)
+    return [parsed[value] for value in dates]
+
+
+def classify_expiry_batch(dates, as_of=None, near_days=NEAR_EXPIRY_DAYS):
+    """Classify many expiry dates against one reference date.
+
+    Returns (statuses, days): status codes (EXPIRED, NEAR_EXPIRY, VALID or
+    INVALID) and whole days remaining (0 for invalid dates), as int8/int32
+    NumPy arrays or, without NumPy, as compact array.array sequences.
+    `as_of` defaults to today; pass a date or ISO string for historical reports.
+    """
+    if as_of is None:
+        as_of = date.today()
+    elif isinstance(as_of, str):
+        as_of = date.fromisoformat(as_of)
+    today = as_of.toordinal()
+    ordinals = expiry_ordinals(dates)
+
+    if np is not None:
+        ordinals = np.array(ordinals, dtype=np.int64)
+        valid = ordinals > 0
+        days = np.where(valid, ordinals - today, 0).astype(np.int32)
+        statuses = np.where(days < 0, EXPIRED, np.where(days <= near_days, NEAR_EXPIRY, VALID))
+        statuses = np.where(valid, statuses, INVALID).astype(np.int8)
+        return statuses, days
+
+    statuses = array("b")
+    days = array("i")
+    for ordinal in ordinals:
+        if not ordinal:
+            statuses.append(INVALID)
+            days.append(0)
+            continue
+        remaining = ordinal - today
+        days.append(remaining)
+        if remaining < 0:
+            statuses.append(EXPIRED)
+        elif remaining <= near_days:
+            statuses.append(NEAR_EXPIRY)
+        else:
+            statuses.append(VALID)
+    return statuses, days
+
+
+def describe_expiry(status, days_remaining):
+    # (label, days text) for a status name, e.g. the expiry_status column computed in SQL.
+    if status == "invalid":
+        return EXPIRY_LABELS[status], "-"
+    if status == "expired":
+        return EXPIRY_LABELS[status], f"{abs(days_remaining)} days ago"
+    return EXPIRY_LABELS[status], f"{days_remaining} days left"
+
+
+def describe_expiry_batch(dates, as_of=None, near_days=NEAR_EXPIRY_DAYS):
+    # (label, days text) per date, classified in one pass.
+    statuses, days = classify_expiry_batch(dates, as_of, near_days)
+    return [describe_expiry(STATUS_NAMES[status], int(remaining)) for status, remaining in zip(statuses, days)]
+
+
+def check_expiry(expiry_date_str, as_of=None, near_days=NEAR_EXPIRY_DAYS):
+    return describe_expiry_batch([expiry_date_str], as_of, near_days)[0]
@@ -0,0 +1,248 @@
+"""Receipt rendering, journaling and printing.
+
+Receipts used to be one receipt_<timestamp>.txt per sale, written while the
+cashier waited. Now checkout renders the text from a cached template and
+hands it to a ReceiptSpooler. The spooler's thread appends receipts in
+batches to the receipts journal (a table keyed by invoice id; see
+db_handler.journal_receipts) and, when MEDITRACK_RECEIPT_PRINTER names a
+device or file, sends them there as ESC/POS.
+
+    python -m utils.receipts INVOICE_ID [--printer PATH]    reprint one receipt
+    python -m utils.receipts --import-legacy [FOLDER]        journal old receipt_*.txt files
+"""
+import argparse
+import atexit
+import datetime
+import functools
+import glob
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from database import db_handler
+from database.service import ServiceUnavailable
+
+RECEIPT_WIDTH = 42
+SHOP_ADDRESS = ("Shop No. 9, Shangrila Tower, Block 13", "Gulistan-e-Johar, Karachi, Pakistan")
+PRINTER_ENV = "MEDITRACK_RECEIPT_PRINTER"
+BATCH_SIZE = 200         # receipts per journal transaction
+RETRY_DELAY = 2.0        # seconds before retrying a failed journal write
+# Failures worth waiting out: a busy or locked database, a service that is restarting.
+TRANSIENT_ERRORS = (sqlite3.OperationalError, ServiceUnavailable)
+FLUSH_ON_EXIT = 5.0      # seconds to wait for queued receipts at interpreter exit
+
+# ESC/POS control sequences
+ESC_INIT = b"\x1b@"
+ESC_FEED = b"\x1bd\x04"     # print and feed 4 lines
+GS_CUT = b"\x1dV\x01"       # partial cut
+
+# ---------------- Rendering ---------------- #
+
+def _center(text, width):
+    return " " * ((width - len(text)) // 2) + text
+
+
+@functools.lru_cache(maxsize=4)
+def _template(width):
+    # Everything but the per-sale lines, built once per receipt width.
+    rule = "*" * width
+    header = "\n".join([
+        _center("PHARMACY RECEIPT", width),
+        *(_center(line, width) for line in SHOP_ADDRESS),
+        rule,
+        _center("CASH RECEIPT", width),
+        rule,
+    ])
+    footer = "\n".join([rule, _center("THANK YOU FOR VISITING!", width), rule])
+    return header, rule, footer
+
+
+def render_receipt(items, total, cash, change, invoice_id, when=None, width=RECEIPT_WIDTH):
+    """Receipt text for items of (name, qty, price)."""
+    header, rule, footer = _template(width)
+    when = when or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lines = [header, f"Date: {when}", f"Invoice ID: {invoice_id}", "", f"{'Description':<25}{'Price':>14}"]
+    for name, qty, price in items:
+        item_line = f"{name} x{qty}"
+        if len(item_line) > 25:
+            item_line = item_line[:22] + "..."
+        lines.append(f"{item_line:<25}{qty * price:>14.2f}")
+    lines += [
+        "",
+        rule,
+        f"{'Total':<25}Rs. {total:>12.2f}",
+        f"{'Cash':<25}Rs. {cash:>12.2f}",
+        f"{'Change':<25}Rs. {change:>12.2f}",
+        footer,
+    ]
+    return "\n".join(lines)
+
+# ---------------- Printing ---------------- #
+
+def escpos_bytes(text, encoding="cp437"):
+    # One receipt as an ESC/POS job: reset, text, feed past the tear bar, cut.
+    return ESC_INIT + text.encode(encoding, "replace") + b"\n" + ESC_FEED + GS_CUT
+
+
+class EscPosPrinter:
+    """ESC/POS printer behind a device node or spool file (/dev/usb/lp0, a plain file, ...).
+
+    Jobs are appended, so pointing it at an ordinary file gives a fake
+    printer whose output can be inspected.
+    """
+
+    def __init__(self, path, encoding="cp437"):
+        self.path = path
+        self.encoding = encoding
+
+    def print_receipts(self, texts):
+        with open(self.path, "ab") as device:
+            device.write(b"".join(escpos_bytes(text, self.encoding) for text in texts))
+
+
+def configured_printer():
+    path = os.environ.get(PRINTER_ENV)
+    return EscPosPrinter(path) if path else None
+
+# ---------------- Spooler ---------------- #
+
+class ReceiptSpooler:
+    """Journals and prints receipts on a background thread.
+
+    submit() only queues, so checkout never waits on the disk. A transient
+    journal failure is retried (journaling is idempotent); any other failure
+    drops the batch with a report, so it cannot hold up later receipts. A
+    failed print is reported and left to a reprint.
+    """
+
+    def __init__(self, printer=None, batch_size=BATCH_SIZE):
+        self.printer = printer
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="receipt-spooler", daemon=True)
+        self._thread.start()
+
+    def submit(self, invoice_id, text, total=None):
+        created_at = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+        with self._idle:
+            self._pending += 1
+        self._queue.put((invoice_id, created_at, total, text))
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is journaled; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            while True:
+                try:
+                    db_handler.journal_receipts(batch)
+                    break
+                except TRANSIENT_ERRORS as e:
+                    print(f"⚠️ Receipt journal write failed, retrying: {e}")
+                    time.sleep(RETRY_DELAY)
+                except Exception as e:
+                    invoices = ", ".join(str(invoice_id) for invoice_id, *_ in batch)
+                    print(f"❌ Receipt journal write failed, {len(batch)} receipts not journaled ({invoices}): {e}")
+                    break
+            if self.printer:
+                try:
+                    self.printer.print_receipts([text for *_, text in batch])
+                except OSError as e:
+                    print(f"⚠️ Receipt printer unavailable ({e}); reprint from the journal.")
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+
+_spooler = None
+_spooler_lock = threading.Lock()
+
+
+def get_spooler():
+    global _spooler
+    with _spooler_lock:
+        if _spooler is None:
+            _spooler = ReceiptSpooler(configured_printer())
+            atexit.register(_spooler.flush, FLUSH_ON_EXIT)
+        return _spooler
+
+# ---------------- Legacy Files ---------------- #
+
+LEGACY_PATTERN = "receipt_*.txt"
+_INVOICE_LINE = re.compile(r"^Invoice ID: (.+)$", re.M)
+_DATE_LINE = re.compile(r"^Date: (.+)$", re.M)
+_TOTAL_LINE = re.compile(r"^Total\s+Rs\.\s+([\d.]+)$", re.M)
+
+
+def import_legacy_receipts(folder=None, batch_size=1000):
+    """Journal receipt_*.txt files from before the journal; returns how many were new.
+
+    The files are left in place. Old invoice ids came from timestamps, so
+    two sales in the same second could share one; only the first file seen
+    for such an invoice is journaled.
+    """
+    folder = folder or db_handler.DATA_FOLDER
+    imported = 0
+    batch = []
+    for path in glob.iglob(os.path.join(folder, LEGACY_PATTERN)):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        invoice = _INVOICE_LINE.search(text)
+        if not invoice:
+            continue
+        date = _DATE_LINE.search(text)
+        total = _TOTAL_LINE.search(text)
+        batch.append((invoice.group(1).strip(), date.group(1).strip() if date else "",
+                      float(total.group(1)) if total else None, text))
+        if len(batch) >= batch_size:
+            imported += db_handler.journal_receipts(batch)
+            batch = []
+    if batch:
+        imported += db_handler.journal_receipts(batch)
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprint or import MediTrack receipts.")
+    parser.add_argument("invoice_id", nargs="?", help="invoice to reprint")
+    parser.add_argument("--printer", help="ESC/POS device or file (default: $%s, else stdout)" % PRINTER_ENV)
+    parser.add_argument("--import-legacy", nargs="?", const="", metavar="FOLDER",
+                        help="journal receipt_*.txt files (default folder: the data folder)")
+    args = parser.parse_args(argv)
+
+    db_handler.create_table()
+    if args.import_legacy is not None:
+        print(f"✅ Imported {import_legacy_receipts(args.import_legacy or None):,} receipts")
+        return 0
+    if not args.invoice_id:
+        parser.error("an invoice id or --import-legacy is required")
+
+    text = db_handler.fetch_receipt(args.invoice_id)
+    if text is None:
+        print(f"❌ No receipt for invoice {args.invoice_id}")
+        return 1
+    printer = EscPosPrinter(args.printer) if args.printer else configured_printer()
+    if printer:
+        printer.print_receipts([text])
+        print(f"✅ Sent {args.invoice_id} to {printer.path}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""Per-phase timing of application start-up (`python main.py --profile-startup`).
+
+Each mark() closes the phase that started at the previous mark, so the
+phases add up to the time from the first line of main.py to the first
+painted page of the inventory grid.
+"""
+import sys
+import time
+
+
+class StartupProfile:
+    def __init__(self, started=None):
+        self.started = self._last = started or time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+    def report(self, file=sys.stderr):
+        width = max((len(name) for name, _ in self.phases), default=0) + 2
+        print("⏱️ Startup profile", file=file)
+        for name, seconds in self.phases:
+            print(f"  {name:<{width}}{seconds * 1000:>9.1f} ms", file=file)
+        print(f"  {'total':<{width}}{self.total() * 1000:>9.1f} ms", file=file)
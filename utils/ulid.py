@@ -0,0 +1,43 @@
+"""Monotonic ULIDs: 48-bit millisecond timestamp + 80 random bits, Crockford base32.
+
+They sort by creation time and need no coordination, so a till can number
+things while it cannot reach the database. Within one millisecond (or if
+the clock steps back) the random part is incremented instead of redrawn,
+so the ids one process hands out are strictly increasing.
+"""
+import os
+import threading
+import time
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LENGTH = 26
+RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value):
+    chars = []
+    for _ in range(LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_ulid():
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+        else:
+            now_ms = _last_ms
+            _last_random += 1
+            if _last_random >> RANDOM_BITS:
+                # 2^80 ids in one millisecond: borrow the next one.
+                now_ms += 1
+                _last_random = 0
+        _last_ms = now_ms
+        return _encode((now_ms << RANDOM_BITS) | _last_random)